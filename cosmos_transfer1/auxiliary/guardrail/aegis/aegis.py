@@ -28,6 +28,8 @@ SAFE = misc.Color.green("SAFE")
 UNSAFE = misc.Color.red("UNSAFE")
 
 DEFAULT_CHECKPOINT_DIR = f"{GUARDRAIL_CHECKPOINT_PATH}/aegis"
+BASE_MODEL_ID = "meta-llama/LlamaGuard-7b"
+AEGIS_ADAPTER_ID = "nvidia/Aegis-AI-Content-Safety-LlamaGuard-Defensive-1.0"
 
 
 class Aegis(ContentSafetyGuardrail):
@@ -39,12 +41,29 @@ class Aegis(ContentSafetyGuardrail):
         self.checkpoint_dir = checkpoint_dir
         self.device = device
         self.dtype = torch.bfloat16
-        base_model_id = "meta-llama/LlamaGuard-7b"
-        aegis_adapter = "nvidia/Aegis-AI-Content-Safety-LlamaGuard-Defensive-1.0"
-        base_model = AutoModelForCausalLM.from_pretrained(base_model_id, cache_dir=self.checkpoint_dir)
-        self.tokenizer = AutoTokenizer.from_pretrained(base_model_id, cache_dir=self.checkpoint_dir)
-        self.model = PeftModel.from_pretrained(base_model, aegis_adapter, cache_dir=self.checkpoint_dir)
+        # Whether the last check failed and fell back to reporting the prompt as safe
+        self.last_check_failed = False
+        base_model = AutoModelForCausalLM.from_pretrained(BASE_MODEL_ID, cache_dir=self.checkpoint_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_ID, cache_dir=self.checkpoint_dir)
+        self.model = PeftModel.from_pretrained(base_model, AEGIS_ADAPTER_ID, cache_dir=self.checkpoint_dir)
         self.model.to(self.device, dtype=self.dtype).eval()
+        # Batched prompts are left-padded so that the next token logits of every prompt are at the last position
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.safe_token_ids = self._first_token_ids(["safe", " safe"])
+        self.unsafe_token_ids = self._first_token_ids(["unsafe", " unsafe"]) - self.safe_token_ids
+
+    def _first_token_ids(self, words: list[str]) -> set[int]:
+        """Ids of the first token of each of `words` when generated right after the moderation prompt."""
+        prompt_end = "[/INST]"
+        prefix = self.tokenizer.encode(prompt_end, add_special_tokens=False)
+        token_ids = set()
+        for word in words:
+            ids = self.tokenizer.encode(prompt_end + word, add_special_tokens=False)
+            if ids[: len(prefix)] == prefix and len(ids) > len(prefix):
+                token_ids.add(ids[len(prefix)])
+        return token_ids
 
     def get_moderation_prompt(self, user_prompt: str) -> str:
         """Create the moderation prompt for the Aegis model."""
@@ -84,26 +103,75 @@ class Aegis(ContentSafetyGuardrail):
 
     def filter_aegis_output(self, prompt: str) -> tuple[bool, str]:
         """Filter the Aegis model output and return the safety status and message."""
-        full_prompt = self.get_moderation_prompt(prompt)
-        inputs = self.tokenizer([full_prompt], add_special_tokens=False, return_tensors="pt").to(self.device)
-        output = self.model.generate(**inputs, max_new_tokens=100, pad_token_id=self.tokenizer.eos_token_id)
-        prompt_len = inputs["input_ids"].shape[-1]
-        moderation_output = self.tokenizer.decode(output[0][prompt_len:], skip_special_tokens=True)
+        return self.filter_aegis_output_batch([prompt])[0]
+
+    @torch.inference_mode()
+    def filter_aegis_output_batch(self, prompts: list[str], batch_size: int = 16) -> list[tuple[bool, str]]:
+        """Filter the Aegis model output of a batch of prompts and return their safety status and message.
+
+        The moderation prompts are scored in left-padded forwards of up to `batch_size` prompts. A prompt whose most
+        likely first output token starts "safe" is safe without generating further. Only the other prompts generate
+        the full moderation output, from which the safety status and blocked category are parsed as for one prompt.
 
-        if "unsafe" in moderation_output.lower():
-            block_msg = self.get_aegis_block_message(moderation_output)
-            return False, block_msg
-        else:
-            return True, ""
+        Args:
+            prompts (list[str]): Prompts to check.
+            batch_size (int): Maximum number of prompts per forward.
+
+        Returns:
+            list[tuple[bool, str]]: The safety status and message of each prompt.
+        """
+        results = []
+        for start in range(0, len(prompts), batch_size):
+            full_prompts = [self.get_moderation_prompt(prompt) for prompt in prompts[start : start + batch_size]]
+            inputs = self.tokenizer(full_prompts, add_special_tokens=False, padding=True, return_tensors="pt").to(
+                self.device
+            )
+            # Positions count from the first non-padding token, as in `generate`
+            position_ids = (inputs["attention_mask"].cumsum(-1) - 1).masked_fill(inputs["attention_mask"] == 0, 1)
+            logits = self.model(**inputs, position_ids=position_ids, use_cache=False).logits[:, -1]
+            first_tokens = logits.argmax(dim=-1).tolist()
+
+            batch_results = [(True, "")] * len(full_prompts)
+            to_generate = [i for i, token in enumerate(first_tokens) if token not in self.safe_token_ids]
+            if to_generate:
+                num_other = sum(first_tokens[i] not in self.unsafe_token_ids for i in to_generate)
+                if num_other:
+                    log.debug(f"Aegis first token is neither safe nor unsafe for {num_other} prompt(s)")
+                for i, moderation_output in zip(to_generate, self._generate([full_prompts[i] for i in to_generate])):
+                    if "unsafe" in moderation_output.lower():
+                        batch_results[i] = (False, self.get_aegis_block_message(moderation_output))
+            results += batch_results
+        return results
+
+    def _generate(self, full_prompts: list[str]) -> list[str]:
+        """Generate the moderation output of each of the moderation prompts."""
+        inputs = self.tokenizer(full_prompts, add_special_tokens=False, padding=True, return_tensors="pt").to(
+            self.device
+        )
+        output = self.model.generate(**inputs, max_new_tokens=100, pad_token_id=self.tokenizer.pad_token_id)
+        prompt_len = inputs["input_ids"].shape[-1]
+        return self.tokenizer.batch_decode(output[:, prompt_len:], skip_special_tokens=True)
 
     def is_safe(self, prompt: str) -> tuple[bool, str]:
         """Check if the input prompt is safe according to the Aegis model."""
+        self.last_check_failed = False
         try:
             return self.filter_aegis_output(prompt)
         except Exception as e:
             log.error(f"Unexpected error occurred when running Aegis guardrail: {e}")
+            self.last_check_failed = True
             return True, "Unexpected error occurred when running Aegis guardrail."
 
+    def is_safe_batch(self, prompts: list[str], batch_size: int = 16) -> list[tuple[bool, str]]:
+        """Check if each of the input prompts is safe according to the Aegis model."""
+        self.last_check_failed = False
+        try:
+            return self.filter_aegis_output_batch(prompts, batch_size=batch_size)
+        except Exception as e:
+            log.error(f"Unexpected error occurred when running Aegis guardrail: {e}")
+            self.last_check_failed = True
+            return [(True, "Unexpected error occurred when running Aegis guardrail.")] * len(prompts)
+
 
 def parse_args():
     parser = argparse.ArgumentParser()
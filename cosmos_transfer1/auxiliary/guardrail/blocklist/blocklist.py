@@ -22,6 +22,7 @@ from difflib import SequenceMatcher
 import nltk
 from better_profanity import profanity
 
+from cosmos_transfer1.auxiliary.guardrail.blocklist.matcher import WholeWordBlocklistIndex
 from cosmos_transfer1.auxiliary.guardrail.blocklist.utils import read_keyword_list_from_dir, to_ascii
 from cosmos_transfer1.auxiliary.guardrail.common.core import ContentSafetyGuardrail, GuardrailRunner
 from cosmos_transfer1.checkpoints import GUARDRAIL_CHECKPOINT_PATH
@@ -49,6 +50,10 @@ class Blocklist(ContentSafetyGuardrail):
         self.blocklist_words = read_keyword_list_from_dir(os.path.join(self.checkpoint_dir, "custom"))
         self.whitelist_words = read_keyword_list_from_dir(os.path.join(self.checkpoint_dir, "whitelist"))
         self.exact_match_words = read_keyword_list_from_dir(os.path.join(self.checkpoint_dir, "exact_match"))
+        self.whitelist_word_set = set(self.whitelist_words)
+        self.exact_match_index = WholeWordBlocklistIndex(
+            self.exact_match_words, guardrail_partial_match_min_chars, guardrail_partial_match_letter_count
+        )
 
         self.profanity.load_censor_words(custom_words=self.blocklist_words, whitelist_words=self.whitelist_words)
         log.debug(f"Loaded {len(self.blocklist_words)} words/phrases from blocklist")
@@ -59,9 +64,8 @@ class Blocklist(ContentSafetyGuardrail):
         """Explicitly uncensor words that are in the whitelist."""
         input_words = input_prompt.split()
         censored_words = censored_prompt.split()
-        whitelist_words = set(self.whitelist_words)
         for i, token in enumerate(input_words):
-            if token.strip(string.punctuation).lower() in whitelist_words:
+            if token.strip(string.punctuation).lower() in self.whitelist_word_set:
                 censored_words[i] = token
         censored_prompt = " ".join(censored_words)
         return censored_prompt
@@ -175,17 +179,14 @@ class Blocklist(ContentSafetyGuardrail):
         tokens = nltk.word_tokenize(input_prompt)
         lemmas = [self.lemmatizer.lemmatize(token) for token in tokens]
         lemmatized_prompt = " ".join(lemmas)
-        censored, message = self.censor_prompt(lemmatized_prompt)
-        if censored:
-            return False, message
-
-        # Check for exact match blocklist words
-        censored, message = self.check_against_whole_word_blocklist(
-            input_prompt,
-            self.exact_match_words,
-            self.guardrail_partial_match_min_chars,
-            self.guardrail_partial_match_letter_count,
-        )
+        # The full sentence already passed if lemmatization left it unchanged
+        if lemmatized_prompt != input_prompt:
+            censored, message = self.censor_prompt(lemmatized_prompt)
+            if censored:
+                return False, message
+
+        # Check for exact match blocklist words, same decisions as check_against_whole_word_blocklist
+        censored, message = self.exact_match_index.match(input_prompt)
         if censored:
             return False, message
 
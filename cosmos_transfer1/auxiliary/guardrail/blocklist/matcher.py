@@ -0,0 +1,175 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+WORD_CHARS = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize spaces and convert to lowercase."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class WholeWordBlocklistIndex:
+    """Blocklist matcher built once per blocklist, with the decisions of `Blocklist.check_against_whole_word_blocklist`.
+
+    Phrases that start and end with a word character match exactly where a span of the prompt from the start to the
+    end of a run of word characters equals the phrase, so they are looked up in a dict for each such span. Other
+    phrases fall back to their precompiled word boundary regex. Phrases long enough for partial matching are bucketed
+    by their number of words and characters, and only prompt windows whose length can reach the similarity threshold
+    of a bucket are compared with `SequenceMatcher`, after its cheaper upper bounds.
+
+    Args:
+        blocklist: List of words and phrases to block
+        guardrail_partial_match_min_chars: Minimum number of characters in a phrase to check for partial match
+        guardrail_partial_match_letter_count: Maximum allowed difference in characters for partial match
+    """
+
+    def __init__(
+        self,
+        blocklist: list[str],
+        guardrail_partial_match_min_chars: int = 6,
+        guardrail_partial_match_letter_count: float = 0.4,
+    ) -> None:
+        self.blocklist = list(blocklist)
+        self.exact_index: dict[str, int] = {}
+        self.exact_regexes: list[tuple[int, re.Pattern]] = []
+        self.max_exact_len = 0
+        # (number of words, number of characters) -> [(blocklist index, normalized phrase)]
+        self.partial_buckets: dict[tuple[int, int], list[tuple[int, str]]] = defaultdict(list)
+
+        for i, word in enumerate(self.blocklist):
+            normalized_word = normalize_text(word)
+            if normalized_word and WORD_CHARS.fullmatch(normalized_word[0] + normalized_word[-1]):
+                self.exact_index.setdefault(normalized_word, i)
+                self.max_exact_len = max(self.max_exact_len, len(normalized_word))
+            else:
+                self.exact_regexes.append((i, re.compile(r"\b" + re.escape(normalized_word) + r"\b")))
+            if len(normalized_word) >= guardrail_partial_match_min_chars:
+                bucket = (len(normalized_word.split()), len(normalized_word))
+                self.partial_buckets[bucket].append((i, normalized_word))
+
+        # Similarity ratio each bucket needs, computed as in `Blocklist.check_partial_match`
+        self.bucket_thresholds = {
+            (word_length, num_chars): (num_chars - float(guardrail_partial_match_letter_count)) / float(num_chars)
+            for word_length, num_chars in self.partial_buckets
+        }
+        # Buckets whose phrases only reach the threshold on identical windows, as with the default letter count
+        self.exact_only_buckets = {
+            bucket: {phrase: i for i, phrase in reversed(phrases)}
+            for bucket, phrases in self.partial_buckets.items()
+            if self._is_exact_only(bucket[1], self.bucket_thresholds[bucket])
+        }
+
+    @staticmethod
+    def _is_exact_only(num_chars: int, threshold: float) -> bool:
+        """Whether only a window equal to a phrase of `num_chars` characters can reach the similarity threshold.
+
+        The ratio of SequenceMatcher is 2.0 * matches / total length, at most 2.0 * min(lengths) / total length. Any
+        other window length or a single unmatched character must bring that below the threshold. From 200 characters
+        on, SequenceMatcher ignores popular characters and identical strings may not match.
+        """
+        if num_chars >= 200 or threshold <= 0 or 2.0 * (num_chars - 1) / (2 * num_chars) >= threshold:
+            return False
+        max_length = int(2 * num_chars / threshold) + 1
+        return not any(
+            2.0 * min(length, num_chars) / (length + num_chars) >= threshold
+            for length in range(1, max_length + 1)
+            if length != num_chars
+        )
+
+    def _first_exact_match(self, normalized_prompt: str) -> int:
+        """Index of the first blocklist phrase matching the prompt exactly, or the blocklist length if none does."""
+        first = len(self.blocklist)
+        runs = [(match.start(), match.end()) for match in WORD_CHARS.finditer(normalized_prompt)]
+        for a, (start, _) in enumerate(runs):
+            for _, end in runs[a:]:
+                if end - start > self.max_exact_len:
+                    break
+                first = min(first, self.exact_index.get(normalized_prompt[start:end], first))
+        for i, regex in self.exact_regexes:
+            if i >= first:
+                break
+            if regex.search(normalized_prompt):
+                return i
+        return first
+
+    def _first_partial_match(self, normalized_prompt: str, before: int) -> int:
+        """Index of the first blocklist phrase before `before` matching the prompt partially, or `before`."""
+        prompt_words = normalized_prompt.split()
+        # number of words -> number of characters -> windows of the prompt
+        windows: dict[int, dict[int, list[str]]] = {}
+        candidates = []
+        for (word_length, num_chars), phrases in self.partial_buckets.items():
+            if phrases[0][0] >= before or word_length > len(prompt_words):
+                continue
+            if word_length not in windows:
+                windows[word_length] = defaultdict(list)
+                for i in range(len(prompt_words) - word_length + 1):
+                    substring = " ".join(prompt_words[i : i + word_length])
+                    windows[word_length][len(substring)].append(substring)
+            if (word_length, num_chars) in self.exact_only_buckets:
+                phrase_index = self.exact_only_buckets[(word_length, num_chars)]
+                matches = [phrase_index[s] for s in windows[word_length].get(num_chars, []) if s in phrase_index]
+                if matches:
+                    before = min(before, *matches)
+                continue
+            # Same formula as SequenceMatcher.real_quick_ratio, an upper bound of the ratio
+            threshold = self.bucket_thresholds[(word_length, num_chars)]
+            substrings = [
+                substring
+                for length, substrings in windows[word_length].items()
+                if 2.0 * min(length, num_chars) / (length + num_chars) >= threshold
+                for substring in substrings
+            ]
+            if substrings:
+                candidates += [(i, phrase, threshold, substrings) for i, phrase in phrases]
+
+        for i, phrase, threshold, substrings in sorted(candidates, key=lambda candidate: candidate[0]):
+            if i >= before:
+                break
+            matcher = SequenceMatcher(None, b=phrase)
+            for substring in substrings:
+                matcher.set_seq1(substring)
+                if matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold:
+                    return i
+        return before
+
+    def match(self, prompt: str) -> tuple[bool, str]:
+        """Check if the prompt contains any whole words from the blocklist.
+
+        Args:
+            prompt: input prompt to check
+
+        Returns:
+            bool: True if a match is found, False otherwise
+            str: A message indicating why the prompt was blocked
+        """
+        normalized_prompt = normalize_text(prompt)
+        first_exact = self._first_exact_match(normalized_prompt)
+        first_partial = self._first_partial_match(normalized_prompt, before=first_exact)
+        if first_partial < first_exact:
+            normalized_word = normalize_text(self.blocklist[first_partial])
+            return (
+                True,
+                f"Prompt blocked by partial match blocklist: Prompt: {normalized_prompt}, Partial Match Word: {normalized_word}",
+            )
+        if first_exact < len(self.blocklist):
+            word = self.blocklist[first_exact]
+            return True, f"Prompt blocked by exact match blocklist: Prompt: {prompt}, Exact Match Word: {word}"
+        return False, ""
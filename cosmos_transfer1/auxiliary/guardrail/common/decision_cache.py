@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import unicodedata
+from typing import Optional, Tuple
+
+from cosmos_transfer1.auxiliary.guardrail.aegis.aegis import AEGIS_ADAPTER_ID, BASE_MODEL_ID
+from cosmos_transfer1.auxiliary.guardrail.aegis.categories import UNSAFE_CATEGORIES
+from cosmos_transfer1.utils.disk_cache import DiskCache, file_digest
+
+# Bump when a change to the text guardrails changes their decisions without changing their checkpoints
+TEXT_GUARDRAIL_VERSION = 2
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize the unicode form and whitespace of a prompt, which do not change the guardrail decisions."""
+    return " ".join(unicodedata.normalize("NFC", prompt).split())
+
+
+def _read_json(path: str) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class TextGuardrailCache(DiskCache):
+    """On-disk cache of text guardrail decisions, keyed by normalized prompt and the blocklist and Aegis versions.
+
+    Args:
+        cache_dir (str): Directory that holds the cache entries. It can be shared between runs.
+        checkpoint_dir (str): Directory of the guardrail checkpoints. The blocklist files are hashed, and the Aegis
+            model ids, categories and the config files and weight sizes of its checkpoint identify the Aegis model.
+        max_size_gb (float): Total size of the entries above which the least recently used ones are evicted.
+    """
+
+    name = "Text guardrail"
+
+    def __init__(self, cache_dir: str, checkpoint_dir: str, max_size_gb: float = 1.0):
+        super().__init__(cache_dir, max_size_gb=max_size_gb)
+        self.guardrail_fingerprint = self._fingerprint(checkpoint_dir)
+
+    @staticmethod
+    def _fingerprint(checkpoint_dir: str) -> str:
+        fields = {
+            "version": TEXT_GUARDRAIL_VERSION,
+            "aegis_models": [BASE_MODEL_ID, AEGIS_ADAPTER_ID],
+            "aegis_categories": UNSAFE_CATEGORIES,
+        }
+        for guardrail in ("blocklist", "aegis"):
+            guardrail_dir = os.path.join(checkpoint_dir, guardrail)
+            for root, _, files in os.walk(guardrail_dir):
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    rel_path = os.path.relpath(path, checkpoint_dir)
+                    # Hash the blocklists and configs, weights and other large files are identified by their size
+                    is_small = (guardrail == "blocklist" and "nltk_data" not in rel_path) or name.endswith(".json")
+                    fields[rel_path] = file_digest(path) if is_small else os.path.getsize(path)
+        return DiskCache.make_key(**fields)
+
+    def _key(self, prompt: str) -> str:
+        return self.make_key(prompt=normalize_prompt(prompt), guardrails=self.guardrail_fingerprint)
+
+    def get(self, prompt: str) -> Optional[Tuple[bool, str]]:
+        """Return the cached (is_safe, message) of `prompt`, or None on a miss."""
+        entry = self._read(self._path(self._key(prompt), ".json"), _read_json)
+        if entry is None:
+            return None
+        return entry["is_safe"], entry["message"]
+
+    def put(self, prompt: str, is_safe: bool, message: str) -> None:
+        """Store the guardrail decision of `prompt`."""
+        path = self._path(self._key(prompt), ".json")
+        tmp_path = self._tmp_path(path)
+        with open(tmp_path, "w") as f:
+            json.dump({"is_safe": is_safe, "message": message}, f)
+        os.replace(tmp_path, path)
+        self._evict(path)
@@ -14,12 +14,14 @@
 # limitations under the License.
 
 import os
+from typing import Callable
 
 import numpy as np
 
 from cosmos_transfer1.auxiliary.guardrail.aegis.aegis import Aegis
 from cosmos_transfer1.auxiliary.guardrail.blocklist.blocklist import Blocklist
 from cosmos_transfer1.auxiliary.guardrail.common.core import GuardrailRunner
+from cosmos_transfer1.auxiliary.guardrail.common.decision_cache import TextGuardrailCache
 from cosmos_transfer1.auxiliary.guardrail.face_blur_filter.face_blur_filter import RetinaFaceFilter
 from cosmos_transfer1.auxiliary.guardrail.video_content_safety_filter.video_content_safety_filter import (
     VideoContentSafetyFilter,
@@ -34,27 +36,67 @@ def create_text_guardrail_runner(checkpoint_dir: str) -> GuardrailRunner:
     return GuardrailRunner(safety_models=[Blocklist(blocklist_checkpoint_dir), Aegis(aegis_checkpoint_dir)])
 
 
-def create_video_guardrail_runner(checkpoint_dir: str) -> GuardrailRunner:
-    """Create the video guardrail runner."""
+def create_video_guardrail_runner(
+    checkpoint_dir: str,
+    face_blur_batch_size: int = 4,
+    face_blur_half_precision: bool = False,
+    safety_frame_stride: int = 1,
+) -> GuardrailRunner:
+    """Create the video guardrail runner.
+
+    Args:
+        checkpoint_dir: Directory of the guardrail checkpoints.
+        face_blur_batch_size: Number of frames RetinaFace detects faces in per forward. Kept small since the
+            upscaler generates 4K frames.
+        face_blur_half_precision: Whether to run RetinaFace in float16.
+        safety_frame_stride: Classify every `safety_frame_stride`-th generated frame for content safety, e.g. 12 to
+            sample a 24 fps video at 2 fps. 1 classifies every frame.
+    """
     video_filter_checkpoint_dir = os.path.join(checkpoint_dir, "video_content_safety_filter")
     retinaface_checkpoint_path = os.path.join(checkpoint_dir, "face_blur_filter/Resnet50_Final.pth")
     return GuardrailRunner(
-        safety_models=[VideoContentSafetyFilter(video_filter_checkpoint_dir)],
-        postprocessors=[RetinaFaceFilter(retinaface_checkpoint_path)],
+        safety_models=[VideoContentSafetyFilter(video_filter_checkpoint_dir, frame_stride=safety_frame_stride)],
+        postprocessors=[
+            RetinaFaceFilter(
+                retinaface_checkpoint_path,
+                batch_size=face_blur_batch_size,
+                half_precision=face_blur_half_precision,
+            )
+        ],
     )
 
 
-def run_text_guardrail(prompt: str, guardrail_runner: GuardrailRunner) -> bool:
+def run_text_guardrail(
+    prompt: str,
+    guardrail_runner: GuardrailRunner | None,
+    decision_cache: TextGuardrailCache | None = None,
+    load_guardrail_runner: Callable[[], GuardrailRunner] | None = None,
+) -> bool:
     """Run the text guardrail on the prompt, checking for content safety.
 
     Args:
         prompt: The text prompt.
-        guardrail_runner: The text guardrail runner.
+        guardrail_runner: The text guardrail runner. Only used if the decision for the prompt is not cached.
+        decision_cache: Optional cache of text guardrail decisions. Decisions of guardrails that failed and fell back
+            to safe are not cached.
+        load_guardrail_runner: Optional function that loads the text guardrail runner, called if guardrail_runner is
+            None and the decision for the prompt is not cached.
 
     Returns:
         bool: Whether the prompt is safe.
     """
-    is_safe, message = guardrail_runner.run_safety_check(prompt)
+    cached = decision_cache.get(prompt) if decision_cache else None
+    if cached is not None:
+        is_safe, message = cached
+    else:
+        if guardrail_runner is None and load_guardrail_runner is not None:
+            guardrail_runner = load_guardrail_runner()
+        if guardrail_runner is None:
+            raise ValueError("No text guardrail runner to check a prompt whose decision is not cached")
+        is_safe, message = guardrail_runner.run_safety_check(prompt)
+        failed = any(getattr(model, "last_check_failed", False) for model in guardrail_runner.safety_models or [])
+        if decision_cache and not failed:
+            decision_cache.put(prompt, is_safe, message)
     if not is_safe:
         log.critical(f"GUARDRAIL BLOCKED: {message}")
     return is_safe
@@ -15,6 +15,7 @@
 
 import cv2
 import numpy as np
+import torch
 
 
 def pixelate_face(face_img: np.ndarray, blocks: int = 5) -> np.ndarray:
@@ -33,3 +34,78 @@ def pixelate_face(face_img: np.ndarray, blocks: int = 5) -> np.ndarray:
     temp = cv2.resize(face_img, (blocks, blocks), interpolation=cv2.INTER_LINEAR)
     pixelated = cv2.resize(temp, (w, h), interpolation=cv2.INTER_NEAREST)
     return pixelated
+
+
+def _linear_sample_indices(
+    start: torch.Tensor, size: torch.Tensor, blocks: int
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Source pixels and weights of `cv2.resize` with INTER_LINEAR shrinking each region to `blocks` pixels.
+
+    Args:
+        start: First pixel of each region [N]
+        size: Number of pixels of each region [N]
+        blocks: Number of output pixels
+
+    Returns:
+        Left and right source pixels [N, blocks], and the weight of the right pixel [N, blocks]
+    """
+    scale = 1.0 / (blocks / size.double())
+    pos = (torch.arange(blocks, device=size.device, dtype=torch.float64) + 0.5) * scale[:, None] - 0.5
+    index = pos.floor()
+    weight = torch.where(index < 0, 0.0, pos - index)
+    index = index.clamp(min=0)
+    last = (size - 1).double()[:, None]
+    weight = torch.where(index >= last, 0.0, weight)
+    index = torch.minimum(index, last)
+    next_index = torch.minimum(index + 1, last)
+    return start[:, None] + index.long(), start[:, None] + next_index.long(), weight.float()
+
+
+def pixelate_faces(frames: torch.Tensor, frame_idx: torch.Tensor, boxes: torch.Tensor, blocks: int = 5) -> torch.Tensor:
+    """
+    Pixelate the face regions of a batch of frames in place.
+
+    Batched version of `pixelate_face` following the sampling positions of `cv2.resize`. The block colors of all
+    regions are sampled from the input frames, so where two regions overlap the later one covers the earlier one
+    instead of pixelating it a second time.
+
+    Args:
+        frames: Frames [B, H, W, C]
+        frame_idx: Index of the frame of each face region [N]
+        boxes: Integer face regions (x1, y1, x2, y2) [N, 4]. Clipped to the frames before pixelation
+        blocks: Number of blocks to divide each face into (in each dimension)
+
+    Returns:
+        Frames with pixelated face regions
+    """
+    B, H, W = frames.shape[:3]
+    x1, y1 = boxes[:, 0].clamp(min=0), boxes[:, 1].clamp(min=0)
+    x2, y2 = boxes[:, 2].clamp(max=W), boxes[:, 3].clamp(max=H)
+    keep = (x2 > x1) & (y2 > y1)
+    frame_idx, x1, y1, x2, y2 = frame_idx[keep], x1[keep], y1[keep], x2[keep], y2[keep]
+    if frame_idx.numel() == 0:
+        return frames
+    w, h = x2 - x1, y2 - y1
+
+    # Shrink each region to blocks x blocks with bilinear sampling
+    left, right, weight_x = _linear_sample_indices(x1, w, blocks)
+    top, bottom, weight_y = _linear_sample_indices(y1, h, blocks)
+    n = frame_idx[:, None, None]
+    weight_x = weight_x[:, None, :, None]
+    upper = frames[n, top[:, :, None], left[:, None, :]].float() * (1 - weight_x)
+    upper += frames[n, top[:, :, None], right[:, None, :]].float() * weight_x
+    lower = frames[n, bottom[:, :, None], left[:, None, :]].float() * (1 - weight_x)
+    lower += frames[n, bottom[:, :, None], right[:, None, :]].float() * weight_x
+    weight_y = weight_y[:, :, None, None]
+    block_colors = (upper * (1 - weight_y) + lower * weight_y).round().to(frames.dtype)  # [N, blocks, blocks, C]
+
+    # Scale back up with nearest-neighbor, later regions covering earlier ones
+    region = torch.full((B, H, W), -1, dtype=torch.long, device=frames.device)
+    for k, (f, r_x1, r_y1, r_x2, r_y2) in enumerate(zip(*(t.tolist() for t in (frame_idx, x1, y1, x2, y2)))):
+        region[f, r_y1:r_y2, r_x1:r_x2] = k
+    f, y, x = torch.nonzero(region >= 0, as_tuple=True)
+    k = region[f, y, x]
+    col = ((x - x1[k]).double() * (1.0 / (w[k].double() / blocks))).floor().long().clamp(max=blocks - 1)
+    row = ((y - y1[k]).double() * (1.0 / (h[k].double() / blocks))).floor().long().clamp(max=blocks - 1)
+    frames[f, y, x] = block_colors[k, row, col]
+    return frames
@@ -21,15 +21,14 @@ import torch
 from retinaface.data import cfg_re50
 from retinaface.layers.functions.prior_box import PriorBox
 from retinaface.models.retinaface import RetinaFace
-from torch.utils.data import DataLoader, TensorDataset
 from tqdm import tqdm
 
 from cosmos_transfer1.auxiliary.guardrail.common.core import GuardrailRunner, PostprocessingGuardrail
 from cosmos_transfer1.auxiliary.guardrail.common.io_utils import get_video_filepaths, read_video, save_video
-from cosmos_transfer1.auxiliary.guardrail.face_blur_filter.blur_utils import pixelate_face
+from cosmos_transfer1.auxiliary.guardrail.face_blur_filter.blur_utils import pixelate_faces
 from cosmos_transfer1.auxiliary.guardrail.face_blur_filter.retinaface_utils import (
     decode_batch,
-    filter_detected_boxes,
+    filter_detected_boxes_batch,
     load_model,
 )
 from cosmos_transfer1.checkpoints import GUARDRAIL_CHECKPOINT_PATH
@@ -50,6 +49,7 @@ class RetinaFaceFilter(PostprocessingGuardrail):
         batch_size: int = 1,
         confidence_threshold: float = 0.7,
         device="cuda" if torch.cuda.is_available() else "cpu",
+        half_precision: bool = False,
     ) -> None:
         """
         Initialize the RetinaFace model for face detection and blurring.
@@ -58,12 +58,13 @@ class RetinaFaceFilter(PostprocessingGuardrail):
             checkpoint: Path to the RetinaFace checkpoint file
             batch_size: Batch size for RetinaFace inference and processing
             confidence_threshold: Minimum confidence score to consider a face detection
+            half_precision: Whether to run RetinaFace in float16. Box decoding and NMS always run in float32
         """
         self.cfg = cfg_re50
         self.batch_size = batch_size
         self.confidence_threshold = confidence_threshold
         self.device = device
-        self.dtype = torch.float32
+        self.dtype = torch.float16 if half_precision else torch.float32
 
         # Disable loading ResNet pretrained weights
         self.cfg["pretrain"] = False
@@ -91,19 +92,17 @@ class RetinaFaceFilter(PostprocessingGuardrail):
             frames_tensor = frames_tensor - means  # Subtract mean BGR values for each channel
             return frames_tensor
 
-    def blur_detected_faces(
+    def detect_faces(
         self,
-        frames: np.ndarray,
         batch_loc: torch.Tensor,
         batch_conf: torch.Tensor,
         prior_data: torch.Tensor,
         scale: torch.Tensor,
         min_size: tuple[int] = (20, 20),
-    ) -> list[np.ndarray]:
-        """Blur detected faces in a batch of frames using RetinaFace predictions.
+    ) -> tuple[torch.Tensor, torch.Tensor]:
+        """Detect faces in a batch of frames from RetinaFace predictions.
 
         Args:
-            frames: Input frames
             batch_loc: Batched location predictions
             batch_conf: Batched confidence scores
             prior_data: Prior boxes for the video
@@ -111,84 +110,56 @@ class RetinaFaceFilter(PostprocessingGuardrail):
             min_size: Minimum size of a detected face region in pixels
 
         Returns:
-            Processed frames with pixelated faces
+            Index of the frame within the batch of each detected face, and the integer face boxes (x1, y1, x2, y2)
         """
         with torch.no_grad():
-            batch_boxes = decode_batch(batch_loc, prior_data, self.cfg["variance"])
+            batch_boxes = decode_batch(batch_loc.float(), prior_data, self.cfg["variance"])
             batch_boxes = batch_boxes * scale
-
-        blurred_frames = []
-        for i, boxes in enumerate(batch_boxes):
-            boxes = boxes.detach().cpu().numpy()
-            scores = batch_conf[i, :, 1].detach().cpu().numpy()
-
-            filtered_boxes = filter_detected_boxes(
-                boxes,
-                scores,
+            frame_idx, boxes = filter_detected_boxes_batch(
+                batch_boxes,
+                batch_conf[:, :, 1].float(),
                 confidence_threshold=self.confidence_threshold,
                 nms_threshold=NMS_THRESHOLD,
                 top_k=TOP_K,
                 keep_top_k=KEEP_TOP_K,
             )
 
-            frame = frames[i]
-            for box in filtered_boxes:
-                x1, y1, x2, y2 = map(int, box)
-                # Ignore bounding boxes smaller than the minimum size
-                if x2 - x1 < min_size[0] or y2 - y1 < min_size[1]:
-                    continue
-                max_h, max_w = frame.shape[:2]
-                face_roi = frame[max(y1, 0) : min(y2, max_h), max(x1, 0) : min(x2, max_w)]
-                blurred_face = pixelate_face(face_roi)
-                frame[max(y1, 0) : min(y2, max_h), max(x1, 0) : min(x2, max_w)] = blurred_face
-            blurred_frames.append(frame)
-
-        return blurred_frames
+        boxes = boxes.long()
+        # Ignore bounding boxes smaller than the minimum size
+        keep = (boxes[:, 2] - boxes[:, 0] >= min_size[0]) & (boxes[:, 3] - boxes[:, 1] >= min_size[1])
+        return frame_idx[keep], boxes[keep]
 
     def postprocess(self, frames: np.ndarray) -> np.ndarray:
         """Blur faces in a sequence of frames.
 
+        Faces are detected and pixelated in batches of `batch_size` frames on the device, and the frames are copied
+        back to host once at the end.
+
         Args:
             frames: Input frames
 
         Returns:
             Processed frames with pixelated faces
         """
-        # Create dataset and dataloader
-        frames_tensor = self.preprocess_frames(frames)
-        dataset = TensorDataset(frames_tensor)
-        dataloader = DataLoader(dataset, batch_size=self.batch_size, shuffle=False)
-        processed_frames, processed_batches = [], []
-
-        prior_data, scale = None, None
-        for i, batch in enumerate(dataloader):
-            batch = batch[0]
-            h, w = batch.shape[-2:]  # Batch shape: [C, H, W]
-
+        h, w = frames.shape[1:3]
+        with torch.no_grad():
+            # Generate priors for the video
+            priorbox = PriorBox(self.cfg, image_size=(h, w))
+            prior_data = priorbox.forward().to(self.device, dtype=torch.float32)
+            # Get scale for resizing detections
+            scale = torch.tensor([w, h, w, h], device=self.device, dtype=torch.float32)
+
+        frames_tensor = torch.from_numpy(frames).to(self.device)
+        for start_idx in range(0, len(frames), self.batch_size):
+            end_idx = min(start_idx + self.batch_size, len(frames))
+            batch = self.preprocess_frames(frames[start_idx:end_idx])
             with torch.no_grad():
-                # Generate priors for the video
-                if prior_data is None:
-                    priorbox = PriorBox(self.cfg, image_size=(h, w))
-                    priors = priorbox.forward()
-                    priors = priors.to(self.device, dtype=self.dtype)
-                    prior_data = priors.data
-
-                # Get scale for resizing detections
-                if scale is None:
-                    scale = torch.Tensor([w, h, w, h])
-                    scale = scale.to(self.device, dtype=self.dtype)
-
                 batch_loc, batch_conf, _ = self.net(batch)
+            frame_idx, boxes = self.detect_faces(batch_loc, batch_conf, prior_data, scale)
+            # Pixelate the faces of the batch in place on the device
+            pixelate_faces(frames_tensor[start_idx:end_idx], frame_idx, boxes)
 
-            # Blur detected faces in each batch of frames
-            start_idx = i * self.batch_size
-            end_idx = min(start_idx + self.batch_size, len(frames))
-            processed_batches.append(
-                self.blur_detected_faces(frames[start_idx:end_idx], batch_loc, batch_conf, prior_data, scale)
-            )
-
-        processed_frames = [frame for batch in processed_batches for frame in batch]
-        return np.array(processed_frames)
+        return frames_tensor.cpu().numpy()
 
 
 def parse_args():
@@ -201,6 +172,8 @@ def parse_args():
         help="Path to the RetinaFace checkpoint file",
         default=DEFAULT_RETINAFACE_CHECKPOINT,
     )
+    parser.add_argument("--batch_size", type=int, default=1, help="Number of frames per RetinaFace forward")
+    parser.add_argument("--half_precision", action="store_true", help="Run RetinaFace in float16")
     return parser.parse_args()
 
 
@@ -210,7 +183,9 @@ def main(args):
         log.error(f"No video files found in directory: {args.input_dir}")
         return
 
-    face_blur = RetinaFaceFilter(checkpoint=args.checkpoint)
+    face_blur = RetinaFaceFilter(
+        checkpoint=args.checkpoint, batch_size=args.batch_size, half_precision=args.half_precision
+    )
     postprocessing_runner = GuardrailRunner(postprocessors=[face_blur])
     os.makedirs(args.output_dir, exist_ok=True)
 
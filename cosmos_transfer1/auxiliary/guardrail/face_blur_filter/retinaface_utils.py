@@ -19,6 +19,11 @@ from retinaface.utils.nms.py_cpu_nms import py_cpu_nms
 
 from cosmos_transfer1.utils import log
 
+try:
+    from torchvision.ops import nms
+except ImportError:
+    nms = None
+
 
 # Adapted from https://github.com/biubug6/Pytorch_Retinaface/blob/master/detect.py
 def filter_detected_boxes(boxes, scores, confidence_threshold, nms_threshold, top_k, keep_top_k):
@@ -42,6 +47,78 @@ def filter_detected_boxes(boxes, scores, confidence_threshold, nms_threshold, to
     return boxes
 
 
+def batched_nms(boxes: torch.Tensor, scores: torch.Tensor, idxs: torch.Tensor, iou_threshold: float) -> torch.Tensor:
+    """Run non-maximum-suppression (NMS) on the boxes of several frames at once.
+
+    Boxes of different frames never suppress each other: as in torchvision's `batched_nms`, the boxes of each frame are
+    shifted to a disjoint coordinate range, in float64 so that the shift is exact. Overlaps are measured like
+    `py_cpu_nms`, which counts both end pixels of a box. Uses `torchvision.ops.nms` when available and falls back to
+    `py_cpu_nms` on the host otherwise.
+
+    Args:
+        boxes (tensor): Boxes (x1, y1, x2, y2). Shape: [num_boxes, 4]
+        scores (tensor): Confidence scores. Shape: [num_boxes]
+        idxs (tensor): Index of the frame of each box. Shape: [num_boxes]
+        iou_threshold (float): Boxes overlapping a higher scoring box of the same frame above this IoU are removed
+
+    Return:
+        Indices of the kept boxes, sorted by decreasing score
+    """
+    if boxes.numel() == 0:
+        return torch.empty(0, dtype=torch.long, device=boxes.device)
+    boxes = boxes.double()
+    boxes = boxes + (idxs.double() * (boxes.max() - boxes.min() + 2))[:, None]
+    if nms is not None:
+        return nms(boxes + boxes.new_tensor([0, 0, 1, 1]), scores.double(), iou_threshold)
+    dets = torch.cat((boxes, scores.double()[:, None]), dim=1).cpu().numpy()
+    keep = py_cpu_nms(dets, iou_threshold)
+    return torch.as_tensor(keep, dtype=torch.long, device=boxes.device)
+
+
+def filter_detected_boxes_batch(
+    batch_boxes: torch.Tensor,
+    batch_scores: torch.Tensor,
+    confidence_threshold: float,
+    nms_threshold: float,
+    top_k: int,
+    keep_top_k: int,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Batched version of `filter_detected_boxes` that keeps the detections of all frames on the device.
+
+    Args:
+        batch_boxes (tensor): Decoded boxes of each frame. Shape: [batch_size, num_priors, 4]
+        batch_scores (tensor): Face confidence scores of each frame. Shape: [batch_size, num_priors]
+        confidence_threshold (float): Minimum confidence score of a detection
+        nms_threshold (float): IoU threshold of the NMS
+        top_k (int): Number of detections per frame kept before the NMS
+        keep_top_k (int): Number of detections per frame kept after the NMS
+
+    Return:
+        Frame index of each kept box, shape [num_boxes], and the kept boxes, shape [num_boxes, 4], ordered by frame
+        and then by decreasing score
+    """
+    batch_size = batch_scores.shape[0]
+
+    # Keep the top K detections of each frame with confidence above threshold
+    batch_scores = batch_scores.masked_fill(batch_scores <= confidence_threshold, float("-inf"))
+    scores, order = batch_scores.topk(min(top_k, batch_scores.shape[1]), dim=1)
+    frame_idx, det_idx = torch.nonzero(scores > float("-inf"), as_tuple=True)
+    boxes = batch_boxes[frame_idx, order[frame_idx, det_idx]]
+    scores = scores[frame_idx, det_idx]
+
+    # Run NMS on all frames, then regroup the kept boxes by frame
+    keep = batched_nms(boxes, scores, frame_idx, nms_threshold)
+    keep = keep[torch.sort(frame_idx[keep], stable=True).indices]
+    frame_idx, boxes = frame_idx[keep], boxes[keep]
+
+    # Keep the top K detections of each frame after NMS
+    counts = torch.bincount(frame_idx, minlength=batch_size)
+    starts = torch.cumsum(counts, dim=0) - counts
+    rank = torch.arange(frame_idx.shape[0], device=frame_idx.device) - starts[frame_idx]
+    keep = rank < keep_top_k
+    return frame_idx[keep], boxes[keep]
+
+
 # Adapted from https://github.com/biubug6/Pytorch_Retinaface/blob/master/utils/box_utils.py to handle batched inputs
 def decode_batch(loc, priors, variances):
     """Decode batched locations from predictions using priors and variances.
@@ -14,12 +14,13 @@
 # limitations under the License.
 
 import argparse
+import itertools
 import json
 import os
 from typing import Iterable, Tuple, Union
 
+import numpy as np
 import torch
-from PIL import Image
 
 from cosmos_transfer1.auxiliary.guardrail.common.core import ContentSafetyGuardrail, GuardrailRunner
 from cosmos_transfer1.auxiliary.guardrail.common.io_utils import get_video_filepaths, read_video
@@ -40,15 +41,32 @@ CLASS_IDX_TO_NAME = {
     6: "Self-Harm",
 }
 
+# Minimum ratio of safe frames for generated frames to be considered safe
+SAFE_FRAME_RATIO = 0.95
+
 
 class VideoContentSafetyFilter(ContentSafetyGuardrail):
     def __init__(
         self,
         checkpoint_dir: str = DEFAULT_CHECKPOINT_DIR,
         device="cuda" if torch.cuda.is_available() else "cpu",
+        batch_size: int = 16,
+        frame_stride: int = 1,
     ) -> None:
+        """
+        Initialize the SigLIP encoder and the safety classifier.
+
+        Args:
+            checkpoint_dir: Path to the Video Content Safety Filter checkpoint folder
+            device: Device to run the models on
+            batch_size: Number of frames classified per forward
+            frame_stride: Classify every `frame_stride`-th of the generated frames. 12 samples a 24 fps video at 2 fps,
+                like `is_safe_file` does
+        """
         self.device = device
         self.dtype = torch.float32
+        self.batch_size = batch_size
+        self.frame_stride = frame_stride
 
         # Initialize the SigLIP encoder
         self.encoder = SigLIPEncoder(checkpoint_dir=checkpoint_dir, device=device, dtype=self.dtype)
@@ -64,13 +82,14 @@ class VideoContentSafetyFilter(ContentSafetyGuardrail):
         self.model.to(self.device, dtype=self.dtype).eval()
 
     @torch.inference_mode()
-    def __infer(self, pil_image: Image.Image) -> int:
-        """Infer the class of the image."""
-        image_embs = self.encoder.encode_image(pil_image)
+    def __infer(self, frames: np.ndarray) -> list[int]:
+        """Infer the class of each frame of a batch of uint8 frames [B, H, W, C]."""
+        frames_tensor = torch.from_numpy(np.ascontiguousarray(frames)).to(self.device)
+        image_embs = self.encoder.encode_frames(frames_tensor)
         logits = self.model.network(image_embs)
         probabilities = torch.nn.functional.softmax(logits, dim=-1)
-        predicted_class = torch.argmax(probabilities, dim=-1).item()
-        return predicted_class
+        predicted_classes = torch.argmax(probabilities, dim=-1).tolist()
+        return predicted_classes
 
     def is_safe_file(self, filepath: str) -> bool:
         """Check if the video file is safe."""
@@ -84,11 +103,17 @@ class VideoContentSafetyFilter(ContentSafetyGuardrail):
         is_safe = True
         frame_scores = []
 
-        for frame_number in frame_numbers:
+        for i in range(0, len(frame_numbers), self.batch_size):
+            batch_frame_numbers = frame_numbers[i : i + self.batch_size]
             try:
-                frame = video_data.frames[frame_number]
-                pil_image = Image.fromarray(frame)
-                predicted_class = self.__infer(pil_image)
+                predicted_classes = self.__infer(video_data.frames[batch_frame_numbers])
+            except Exception as e:
+                log.warning(
+                    f"Warning: Failed to run safety classifier on frame_numbers {batch_frame_numbers}. Exception: {e}"
+                )
+                continue
+
+            for frame_number, predicted_class in zip(batch_frame_numbers, predicted_classes):
                 class_name = CLASS_IDX_TO_NAME.get(predicted_class, "Safe")
                 frame_scores.append({"frame_number": frame_number, "class": class_name})
 
@@ -97,9 +122,8 @@ class VideoContentSafetyFilter(ContentSafetyGuardrail):
                     is_safe = False
                     break
 
-            except Exception as e:
-                log.warning(f"Warning: Failed to run safety classifier on frame_number {frame_number}. Exception: {e}")
-                continue
+            if not is_safe:
+                break
 
         # Prepare data for JSON
         video_data = {
@@ -115,30 +139,43 @@ class VideoContentSafetyFilter(ContentSafetyGuardrail):
         return is_safe
 
     def is_safe_frames(self, frames: Iterable) -> bool:
-        """Check if the generated video frames are safe."""
+        """Check if the generated video frames are safe.
+
+        Every `frame_stride`-th frame is classified, `batch_size` frames per forward. For frames with a known length,
+        classification stops as soon as enough unsafe frames are found that the safe frame ratio can no longer be met.
+        """
         frame_scores = []
         total_frames = 0
         safe_frames = 0
+        num_frames = (len(frames) - 1) // self.frame_stride + 1 if hasattr(frames, "__len__") else None
 
-        for frame_number, frame in enumerate(frames):
+        sampled_frames = itertools.islice(enumerate(frames), 0, None, self.frame_stride)
+        while batch := list(itertools.islice(sampled_frames, self.batch_size)):
+            frame_numbers = [frame_number for frame_number, _ in batch]
+            total_frames += len(batch)
             try:
-                total_frames += 1
-                pil_image = Image.fromarray(frame)
-                predicted_class = self.__infer(pil_image)
+                predicted_classes = self.__infer(np.stack([frame for _, frame in batch]))
+            except Exception as e:
+                log.warning(
+                    f"Warning: Failed to run safety classifier on frame_numbers {frame_numbers}. Exception: {e}"
+                )
+                continue
+
+            for frame_number, predicted_class in zip(frame_numbers, predicted_classes):
                 class_name = CLASS_IDX_TO_NAME.get(predicted_class, "Safe")
                 frame_scores.append({"frame_number": frame_number, "class": class_name})
 
                 if class_name == "Safe":
                     safe_frames += 1
 
-            except Exception as e:
-                log.warning(f"Warning: Failed to run safety classifier on frame_number {frame_number}. Exception: {e}")
-                continue
+            # Stop early once the remaining frames cannot make the video safe
+            if num_frames and (safe_frames + num_frames - total_frames) / num_frames < SAFE_FRAME_RATIO:
+                break
 
         # Decide if the video is safe based on the ratio of safe frames
         is_safe = False
         if total_frames > 0:
-            is_safe = (safe_frames / total_frames) >= 0.95
+            is_safe = (safe_frames / total_frames) >= SAFE_FRAME_RATIO
 
         video_data = {
             "is_safe": is_safe,
@@ -166,6 +203,14 @@ def parse_args():
         help="Path to the Video Content Safety Filter checkpoint folder",
         default=DEFAULT_CHECKPOINT_DIR,
     )
+    parser.add_argument("--batch_size", type=int, default=16, help="Number of frames classified per forward")
+    parser.add_argument(
+        "--frame_stride",
+        type=int,
+        default=None,
+        help="Classify every frame_stride-th decoded frame, as for generated frames. By default video files are "
+        "sampled at 2 fps",
+    )
     return parser.parse_args()
 
 
@@ -175,12 +220,17 @@ def main(args):
         log.error(f"No video files found in directory: {args.input_dir}")
         return
 
-    video_filter = VideoContentSafetyFilter(checkpoint_dir=args.checkpoint_dir)
+    video_filter = VideoContentSafetyFilter(
+        checkpoint_dir=args.checkpoint_dir, batch_size=args.batch_size, frame_stride=args.frame_stride or 1
+    )
     runner = GuardrailRunner(safety_models=[video_filter], generic_safe_msg="Video is safe")
 
     for filepath in filepaths:
         with misc.timer("video content safety filter"):
-            _ = runner.run_safety_check(filepath)
+            if args.frame_stride:
+                _ = runner.run_safety_check(read_video(filepath).frames)
+            else:
+                _ = runner.run_safety_check(filepath)
 
 
 if __name__ == "__main__":
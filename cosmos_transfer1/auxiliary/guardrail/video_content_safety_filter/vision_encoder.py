@@ -14,6 +14,7 @@
 # limitations under the License.
 
 import torch
+import torch.nn.functional as F
 from PIL import Image
 from transformers import SiglipModel, SiglipProcessor
 
@@ -46,3 +47,23 @@ class SigLIPEncoder(torch.nn.Module):
             image_features = self.model.get_image_features(**inputs)
             image_features /= image_features.norm(dim=-1, keepdim=True)
         return image_features
+
+    @torch.inference_mode()
+    def encode_frames(self, frames: torch.Tensor) -> torch.Tensor:
+        """Encode a batch of uint8 frames [B, H, W, C] into feature vectors.
+
+        The frames are resized and normalized like the SigLIP image processor does, but in torch on the frames' device
+        instead of through PIL.
+        """
+        image_processor = self.processor.image_processor
+        size = (image_processor.size["height"], image_processor.size["width"])
+        pixel_values = frames.permute(0, 3, 1, 2).float()
+        pixel_values = F.interpolate(pixel_values, size=size, mode="bicubic", align_corners=False, antialias=True)
+        # PIL resizes in uint8
+        pixel_values = pixel_values.round().clamp(0, 255) * image_processor.rescale_factor
+        mean = torch.tensor(image_processor.image_mean, device=frames.device).view(1, -1, 1, 1)
+        std = torch.tensor(image_processor.image_std, device=frames.device).view(1, -1, 1, 1)
+        pixel_values = ((pixel_values - mean) / std).to(self.device, dtype=self.dtype)
+        image_features = self.model.get_image_features(pixel_values=pixel_values)
+        image_features /= image_features.norm(dim=-1, keepdim=True)
+        return image_features
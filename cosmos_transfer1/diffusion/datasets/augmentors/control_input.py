@@ -13,9 +13,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
-from typing import Any, Optional
+from typing import Any, Callable, Iterable, Optional
 
 import cv2
 import matplotlib.colors as mcolors
@@ -81,6 +83,42 @@ VIDEO_RES_SIZE_INFO: dict[str, tuple[int, int]] = {
 }
 
 
+# Number of threads used to process video frames in parallel. cv2 releases the GIL, so per-frame calls scale with
+# threads. Can be overridden with the COSMOS_NUM_FRAME_WORKERS environment variable or set_num_frame_workers().
+_num_frame_workers = int(os.getenv("COSMOS_NUM_FRAME_WORKERS", min(8, os.cpu_count() or 1)))
+_frame_executor: Optional[ThreadPoolExecutor] = None
+
+
+def set_num_frame_workers(num_workers: int) -> None:
+    """Set the number of threads used by map_frames. 1 processes frames sequentially."""
+    global _num_frame_workers, _frame_executor
+    if num_workers < 1:
+        raise ValueError(f"num_workers must be positive, got {num_workers}")
+    if num_workers != _num_frame_workers and _frame_executor is not None:
+        _frame_executor.shutdown(wait=True)
+        _frame_executor = None
+    _num_frame_workers = num_workers
+
+
+def map_frames(fn: Callable[[np.ndarray], np.ndarray], frames: Iterable[np.ndarray]) -> list[np.ndarray]:
+    """Apply fn to every frame in parallel and return the results in frame order.
+
+    Args:
+        fn (Callable): Per-frame function, e.g. a cv2 filter.
+        frames (Iterable[np.ndarray]): Frames, e.g. a THWC array.
+
+    Returns:
+        list[np.ndarray]: fn(frame) for every frame.
+    """
+    global _frame_executor
+    frames = list(frames)
+    if _num_frame_workers <= 1 or len(frames) <= 1:
+        return [fn(frame) for frame in frames]
+    if _frame_executor is None:
+        _frame_executor = ThreadPoolExecutor(max_workers=_num_frame_workers, thread_name_prefix="frame_worker")
+    return list(_frame_executor.map(fn, frames))
+
+
 class Augmentor:
     def __init__(self, input_keys: list, output_keys: Optional[list] = None, args: Optional[dict] = None) -> None:
         r"""Base augmentor class
@@ -116,9 +154,10 @@ def resize_frames(frames, is_image, data_dict):
     scaling_ratio = min((new_W / W), (new_H / H))
     if scaling_ratio < 1:
         W, H = int(scaling_ratio * W + 0.5), int(scaling_ratio * H + 0.5)
-        frames = [
-            cv2.resize(_image_np, (W, H), interpolation=cv2.INTER_AREA) for _image_np in frames.transpose((1, 2, 3, 0))
-        ]
+        frames = map_frames(
+            lambda _image_np: cv2.resize(_image_np, (W, H), interpolation=cv2.INTER_AREA),
+            frames.transpose((1, 2, 3, 0)),
+        )
         frames = np.stack(frames).transpose((3, 0, 1, 2))
     if need_reshape:  # CTHW -> HWC
         frames = frames[:, 0].transpose((1, 2, 0))
@@ -129,9 +168,9 @@ def resize_frames(frames, is_image, data_dict):
 def apply_gaussian_blur(frames: np.ndarray, ksize: int = 5, sigmaX: float = 1.0) -> np.ndarray:
     if ksize % 2 == 0:
         ksize += 1  # ksize must be odd
-    blurred_image = [
-        cv2.GaussianBlur(_image_np, (ksize, ksize), sigmaX=sigmaX) for _image_np in frames.transpose((1, 2, 3, 0))
-    ]
+    blurred_image = map_frames(
+        lambda _image_np: cv2.GaussianBlur(_image_np, (ksize, ksize), sigmaX=sigmaX), frames.transpose((1, 2, 3, 0))
+    )
     blurred_image = np.stack(blurred_image).transpose((3, 0, 1, 2))
     return blurred_image
 
@@ -152,10 +191,10 @@ class GaussianBlur:
 
 
 def apply_guided_filter(frames: np.ndarray, radius: int, eps: float, scale: float) -> np.ndarray:
-    blurred_image = [
-        FastGuidedFilter(_image_np, radius, eps, scale).filter(_image_np)
-        for _image_np in frames.transpose((1, 2, 3, 0))
-    ]
+    blurred_image = map_frames(
+        lambda _image_np: FastGuidedFilter(_image_np, radius, eps, scale).filter(_image_np),
+        frames.transpose((1, 2, 3, 0)),
+    )
     blurred_image = np.stack(blurred_image).transpose((3, 0, 1, 2))
     return blurred_image
 
@@ -184,12 +223,13 @@ def apply_bilateral_filter(
     sigma_space: float = 75,
     iter: int = 1,
 ) -> np.ndarray:
-    blurred_image = []
-    for _image_np in frames.transpose((1, 2, 3, 0)):
+
+    def _filter(_image_np: np.ndarray) -> np.ndarray:
         for _ in range(iter):
             _image_np = cv2.bilateralFilter(_image_np, d, sigma_color, sigma_space)
-        blurred_image += [_image_np]
+        return _image_np
 
+    blurred_image = map_frames(_filter, frames.transpose((1, 2, 3, 0)))
     blurred_image = np.stack(blurred_image).transpose((3, 0, 1, 2))
     return blurred_image
 
@@ -217,7 +257,7 @@ class BilateralFilter:
 def apply_median_blur(frames: np.ndarray, ksize=5) -> np.ndarray:
     if ksize % 2 == 0:
         ksize += 1  # ksize must be odd
-    blurred_image = [cv2.medianBlur(_image_np, ksize) for _image_np in frames.transpose((1, 2, 3, 0))]
+    blurred_image = map_frames(lambda _image_np: cv2.medianBlur(_image_np, ksize), frames.transpose((1, 2, 3, 0)))
     blurred_image = np.stack(blurred_image).transpose((3, 0, 1, 2))
     return blurred_image
 
@@ -255,8 +295,7 @@ def apply_laplacian_of_gaussian(
     if ksize % 2 == 0:
         ksize += 1  # ksize must be odd
 
-    edge_frames = []
-    for frame in frames.transpose((1, 2, 3, 0)):  # (T, H, W, C)
+    def _edge_map(frame: np.ndarray) -> np.ndarray:
         # Convert to grayscale if the image is in color
         if frame.shape[-1] == 3:
             gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
@@ -273,8 +312,9 @@ def apply_laplacian_of_gaussian(
             edge_map = normalized
 
         # Expand dimensions to match input shape
-        edge_map = np.repeat(edge_map[..., np.newaxis], frames.shape[0], axis=-1)
-        edge_frames.append(edge_map)
+        return np.repeat(edge_map[..., np.newaxis], frames.shape[0], axis=-1)
+
+    edge_frames = map_frames(_edge_map, frames.transpose((1, 2, 3, 0)))  # (T, H, W, C)
     return np.stack(edge_frames).transpose((3, 0, 1, 2))  # (C, T, H, W)
 
 
@@ -315,9 +355,9 @@ def apply_anisotropic_diffusion(frames: np.ndarray, alpha: float, K: float, nite
     Returns:
     np.ndarray: Anisotropic-diffused frames with shape (C, T, H, W).
     """
-    blurred_image = [
-        cv2.ximgproc.anisotropicDiffusion(_image_np, alpha, K, niters) for _image_np in frames.transpose((1, 2, 3, 0))
-    ]
+    blurred_image = map_frames(
+        lambda _image_np: cv2.ximgproc.anisotropicDiffusion(_image_np, alpha, K, niters), frames.transpose((1, 2, 3, 0))
+    )
     blurred_image = np.stack(blurred_image).transpose((3, 0, 1, 2))
 
     return blurred_image
@@ -391,20 +431,22 @@ class Blur:
         H, W = frames.shape[2], frames.shape[3]
         downscale_factor = random.choice(self.downscale_factor)
         if downscale_factor > 1:
-            frames = [
-                cv2.resize(_image_np, (W // downscale_factor, H // downscale_factor), interpolation=cv2.INTER_AREA)
-                for _image_np in frames.transpose((1, 2, 3, 0))
-            ]
+            frames = map_frames(
+                lambda _image_np: cv2.resize(
+                    _image_np, (W // downscale_factor, H // downscale_factor), interpolation=cv2.INTER_AREA
+                ),
+                frames.transpose((1, 2, 3, 0)),
+            )
             frames = np.stack(frames).transpose((3, 0, 1, 2))
 
         for ins in blur_instances:
             frames = ins(frames)
 
         if downscale_factor > 1:
-            frames = [
-                cv2.resize(_image_np, (W, H), interpolation=cv2.INTER_LINEAR)
-                for _image_np in frames.transpose((1, 2, 3, 0))
-            ]
+            frames = map_frames(
+                lambda _image_np: cv2.resize(_image_np, (W, H), interpolation=cv2.INTER_LINEAR),
+                frames.transpose((1, 2, 3, 0)),
+            )
             frames = np.stack(frames).transpose((3, 0, 1, 2))
         return frames
 
@@ -472,17 +514,19 @@ class AddControlInputBlurDownUp(Augmentor):
         else:
             scale_factor = self.downup_preset
         if self.downsize_before_blur:
-            frames = [
-                cv2.resize(_image_np, (W // scale_factor, H // scale_factor), interpolation=cv2.INTER_AREA)
-                for _image_np in frames.transpose((1, 2, 3, 0))
-            ]
+            frames = map_frames(
+                lambda _image_np: cv2.resize(
+                    _image_np, (W // scale_factor, H // scale_factor), interpolation=cv2.INTER_AREA
+                ),
+                frames.transpose((1, 2, 3, 0)),
+            )
             frames = np.stack(frames).transpose((3, 0, 1, 2))
         frames = self.blur(frames)
         if self.downsize_before_blur:
-            frames = [
-                cv2.resize(_image_np, (W, H), interpolation=cv2.INTER_LINEAR)
-                for _image_np in frames.transpose((1, 2, 3, 0))
-            ]
+            frames = map_frames(
+                lambda _image_np: cv2.resize(_image_np, (W, H), interpolation=cv2.INTER_LINEAR),
+                frames.transpose((1, 2, 3, 0)),
+            )
             frames = np.stack(frames).transpose((3, 0, 1, 2))
         if is_image:
             frames = frames[:, 0]
@@ -557,7 +601,7 @@ class AddControlInputEdge(Augmentor):
         if is_image:
             edge_maps = cv2.Canny(frames, t_lower, t_upper)[None, None]
         else:
-            edge_maps = [cv2.Canny(img, t_lower, t_upper) for img in frames.transpose((1, 2, 3, 0))]
+            edge_maps = map_frames(lambda img: cv2.Canny(img, t_lower, t_upper), frames.transpose((1, 2, 3, 0)))
             edge_maps = np.stack(edge_maps)[None]
         edge_maps = torch.from_numpy(edge_maps).expand(3, -1, -1, -1)
         if is_image:
@@ -0,0 +1,82 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content-addressed on-disk caches for preprocessed control inputs and their VAE latents.
+
+Entries are keyed by a hash of the input file contents and every setting that affects the result (hint key, preset
+strengths, resolution, augmentor config, frame window, tokenizer), so reusing the same video with a different prompt
+or seed hits the cache while any change to the inputs or settings misses it. Control tensors are stored as uint8
+`.npy` files, generated control videos / weight maps as copies of the preprocessor outputs and latents as `.pt`
+files.
+"""
+
+import os
+import shutil
+from typing import Optional
+
+import numpy as np
+import torch
+
+from cosmos_transfer1.utils.disk_cache import DiskCache
+
+
+class ControlInputCache(DiskCache):
+    """On-disk cache of preprocessed control tensors and generated control videos."""
+
+    name = "Control input"
+
+    def get_array(self, key: str) -> Optional[np.ndarray]:
+        """Return the cached array for `key`, or None on a miss."""
+        return self._read(self._path(key, ".npy"), np.load)
+
+    def put_array(self, key: str, array: np.ndarray) -> None:
+        """Store a uint8 array under `key`."""
+        path = self._path(key, ".npy")
+        tmp_path = self._tmp_path(path)
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(array, dtype=np.uint8))
+        os.replace(tmp_path, path)
+        self._evict(path)
+
+    def get_file(self, key: str, suffix: str, out_path: str) -> bool:
+        """Copy the cached file for `key` to `out_path`. Returns False on a miss."""
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        return self._read(self._path(key, suffix), lambda path: shutil.copyfile(path, out_path)) is not None
+
+    def put_file(self, key: str, suffix: str, src_path: str) -> None:
+        """Store a copy of `src_path` under `key`."""
+        path = self._path(key, suffix)
+        tmp_path = self._tmp_path(path)
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+        self._evict(path)
+
+
+class LatentCache(DiskCache):
+    """On-disk cache of tokenizer latents of input videos and control inputs."""
+
+    name = "Latent"
+
+    def get_tensor(self, key: str, device: str = "cuda") -> Optional[torch.Tensor]:
+        """Return the cached tensor for `key` on `device`, or None on a miss."""
+        return self._read(self._path(key, ".pt"), lambda path: torch.load(path, map_location=device, weights_only=True))
+
+    def put_tensor(self, key: str, tensor: torch.Tensor) -> None:
+        """Store a copy of `tensor` under `key`."""
+        path = self._path(key, ".pt")
+        tmp_path = self._tmp_path(path)
+        torch.save(tensor.detach().cpu(), tmp_path)
+        os.replace(tmp_path, path)
+        self._evict(path)
@@ -16,8 +16,11 @@
 import importlib
 import json
 import os
+import queue
+import threading
 from contextlib import contextmanager
-from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from functools import lru_cache, partial
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 import cv2
 import einops
@@ -37,12 +40,16 @@ from cosmos_transfer1.checkpoints import (
     VIS2WORLD_CONTROLNET_7B_CHECKPOINT_PATH,
 )
 from cosmos_transfer1.diffusion.config.transfer.augmentors import BilateralOnlyBlurAugmentorConfig
-from cosmos_transfer1.diffusion.datasets.augmentors.control_input import get_augmentor_for_eval
+from cosmos_transfer1.diffusion.datasets.augmentors.control_input import get_augmentor_for_eval, map_frames
+from cosmos_transfer1.diffusion.inference.control_cache import ControlInputCache
 from cosmos_transfer1.diffusion.model.model_t2w import DiffusionT2WModel
 from cosmos_transfer1.diffusion.model.model_v2w import DiffusionV2WModel
 from cosmos_transfer1.utils import log
+from cosmos_transfer1.utils.checkpoint import load_checkpoint
 from cosmos_transfer1.utils.config_helper import get_config_module, override
-from cosmos_transfer1.utils.io import load_from_fileobj
+from cosmos_transfer1.utils.disk_cache import file_digest
+from cosmos_transfer1.utils.io import VideoFrameStream, load_from_fileobj
+from cosmos_transfer1.utils.lazy_config import instantiate as lazy_instantiate
 
 TORCH_VERSION: Tuple[int, ...] = tuple(int(x) for x in torch.__version__.split(".")[:2])
 if TORCH_VERSION >= (1, 11):
@@ -196,11 +203,36 @@ def load_model_by_config(
 def load_network_model(model: DiffusionT2WModel, ckpt_path: str):
     with skip_init_linear():
         model.set_up_model()
-    net_state_dict = torch.load(ckpt_path, map_location="cpu", weights_only=False)  # , weights_only=True)
+    net_state_dict = load_checkpoint(ckpt_path)
     non_strict_load_model(model.model, net_state_dict)
     model.cuda()
 
 
+def load_ctrl_encoder(model: DiffusionT2WModel, ckpt_path: str) -> torch.nn.Module:
+    """Build a ControlNet encoder that shares the base model and tokenizer of an already loaded `model`.
+
+    Only the encoder network is constructed. As in `VideoDiffusionModelWithCtrl.build_model`, it is initialized from
+    the base DiT weights, after which only the `net.` keys of the checkpoint are loaded into it.
+
+    Args:
+        model (DiffusionT2WModel): Loaded ControlNet model whose config and base model are reused
+        ckpt_path (str): Path to the ControlNet checkpoint
+
+    Returns:
+        torch.nn.Module: The encoder, on the same device and in the same precision as `model`
+    """
+    with skip_init_linear():
+        net = lazy_instantiate(model.config.net_ctrl)
+    net = net.to(**model.tensor_kwargs)
+    net.load_state_dict(model.model.base_model.net.state_dict(), strict=False)
+
+    ckpt_state_dict = load_checkpoint(ckpt_path)
+    net_state_dict = {k: v for k, v in ckpt_state_dict.items() if k.startswith("net.")}
+    del ckpt_state_dict
+    non_strict_load_model(torch.nn.ModuleDict({"net": net}), net_state_dict)
+    return net
+
+
 def load_tokenizer_model(model: DiffusionT2WModel, tokenizer_dir: str):
     with skip_init_linear():
         model.set_up_tokenizer(tokenizer_dir)
@@ -299,8 +331,11 @@ def resize_video(video_np, h, w, interpolation=cv2.INTER_AREA):
     video_np = video_np[0].transpose((1, 2, 3, 0))  # Convert to T x H x W x C
     t = video_np.shape[0]
     resized_video = np.zeros((t, h, w, 3), dtype=np.uint8)
-    for i in range(t):
+
+    def _resize(i: int) -> None:
         resized_video[i] = cv2.resize(video_np[i], (w, h), interpolation=interpolation)
+
+    map_frames(_resize, range(t))
     return resized_video.transpose((3, 0, 1, 2))[None]  # Convert back to B x C x T x H x W
 
 
@@ -331,117 +366,309 @@ def get_upscale_size(orig_size: tuple[int], aspect_ratio: str, upscale_factor: i
     return target_w, target_h
 
 
-def read_and_resize_input(input_control_path, num_total_frames, h, w, interpolation):
-    control_input, fps = read_video_or_image_into_frames_BCTHW(
-        input_control_path,
-        normalize=False,  # s.t. output range is [0, 255]
-        max_frames=num_total_frames,
-        also_return_fps=True,
-    )  # BCTHW
-    aspect_ratio = detect_aspect_ratio((control_input.shape[-1], control_input.shape[-2]))
-    control_input = resize_video(control_input, h, w, interpolation=interpolation)  # BCTHW, range [0, 255]
-    control_input = torch.from_numpy(control_input[0])  # CTHW, range [0, 255]
-    return control_input, fps, aspect_ratio
+def _resize_frames(frames_np: np.ndarray, h: int, w: int, interpolation: int) -> np.ndarray:
+    """Resize frames [T,H,W,C] to the specified height and width."""
+    return np.stack(map_frames(lambda frame: cv2.resize(frame, (w, h), interpolation=interpolation), frames_np))
 
 
-def get_ctrl_batch(
-    model, data_batch, num_video_frames, input_video_path, control_inputs, blur_strength, canny_threshold
-):
-    """Prepare complete input batch for video generation including latent dimensions.
+class CtrlClipStream:
+    """Streams the model inputs of a control-to-world generation one clip window at a time.
+
+    The input video and the control videos are decoded, resized, turned into control inputs and normalized lazily
+    per clip, so host memory scales with the clip length instead of the video length. Iterating yields
+    `(start_frame, end_frame, input_video, control_input)` for every clip, where consecutive clips overlap by
+    `num_input_frames` frames and the last clip is padded by repeating the last frame. If a video holds fewer frames
+    than its container reports, `num_frames` and the number of clips shrink once decoding reaches its end.
 
     Args:
         model: Diffusion model instance
-
-    Returns:
-        - data_batch (dict): Complete model input batch
+        data_batch (dict): Batch returned by `get_video_batch`. The static control keys (`hint_key`,
+            `control_weight`, `target_h`, `target_w`) are added to it.
+        num_video_frames (int): Number of frames per clip
+        num_input_frames (int): Number of frames each clip is conditioned on from the previous clip
+        input_video_path (str): Path to the input video, may be empty
+        control_inputs (dict): Validated controlnet specs
+        blur_strength (str): Preset strength of the vis control blur
+        canny_threshold (str): Preset threshold of the edge control
+        cache (ControlInputCache, optional): Cache of preprocessed control inputs, keyed by the input file contents
+            and the preprocessing settings of every clip window
     """
-    state_shape = model.state_shape
 
-    H, W = (
-        state_shape[-2] * model.tokenizer.spatial_compression_factor,
-        state_shape[-1] * model.tokenizer.spatial_compression_factor,
-    )
+    def __init__(
+        self,
+        model,
+        data_batch,
+        num_video_frames,
+        num_input_frames,
+        input_video_path,
+        control_inputs,
+        blur_strength,
+        canny_threshold,
+        cache: Optional[ControlInputCache] = None,
+    ):
+        state_shape = model.state_shape
+        self.H, self.W = (
+            state_shape[-2] * model.tokenizer.spatial_compression_factor,
+            state_shape[-1] * model.tokenizer.spatial_compression_factor,
+        )
+        self.num_video_frames = num_video_frames
+        self.num_input_frames = num_input_frames
+        self.control_inputs = control_inputs
+        # Augmentors see the same extra keys as the model batch, as when the whole video was processed at once
+        self.base_dict = {k: v for k, v in data_batch.items()}
+
+        num_total_frames = NUM_MAX_FRAMES
+        aspect_ratio = None
+        self.input_stream = None
+        if input_video_path:
+            self.input_stream = VideoFrameStream(
+                input_video_path,
+                max_frames=num_total_frames,
+                transform=partial(_resize_frames, h=self.H, w=self.W, interpolation=cv2.INTER_AREA),
+            )
+            num_total_frames = self.input_stream.num_frames
+            aspect_ratio = detect_aspect_ratio(self.input_stream.frame_size)
+        self.target_w, self.target_h = self.W, self.H
+
+        self.control_streams = {}
+        control_weights = []
+        for hint_key, control_info in control_inputs.items():
+            if "input_control" in control_info:
+                in_file = control_info["input_control"]
+                interpolation = cv2.INTER_NEAREST if hint_key == "seg" else cv2.INTER_LINEAR
+                log.info(f"reading control input {in_file} for hint {hint_key}")
+                self.control_streams[hint_key] = VideoFrameStream(
+                    in_file,
+                    max_frames=num_total_frames,
+                    transform=partial(_resize_frames, h=self.H, w=self.W, interpolation=interpolation),
+                )
+                num_total_frames = min(num_total_frames, self.control_streams[hint_key].num_frames)
+                aspect_ratio = detect_aspect_ratio(self.control_streams[hint_key].frame_size)
+            if hint_key == "upscale":
+                self.target_w, self.target_h = get_upscale_size((self.W, self.H), aspect_ratio, upscale_factor=3)
+            control_weights.append(control_info["control_weight"])
+
+        if self.input_stream is None and not self.control_streams:
+            raise ValueError("Either an input video or an input control video is required")
+        # Trim all control videos and input video to be the same length.
+        log.info(f"Making all control and input videos to be length of {num_total_frames} frames.")
+        self._set_num_frames(num_total_frames)
+
+        self.hint_key = "control_input_" + "_".join(control_inputs.keys())
+
+        # Add augmentor for processing inputs based on blur strength
+        self.add_control_input = get_augmentor_for_eval(
+            input_key="video",
+            output_key=self.hint_key,
+            preset_blur_strength=blur_strength,
+            preset_canny_threshold=canny_threshold,
+            blur_config=BilateralOnlyBlurAugmentorConfig[blur_strength],
+        )
 
-    # Initialize control input dictionary
-    control_input_dict = {k: v for k, v in data_batch.items()}
-    num_total_frames = NUM_MAX_FRAMES
-    if input_video_path:
-        input_frames, fps, aspect_ratio = read_and_resize_input(
-            input_video_path, num_total_frames=num_total_frames, h=H, w=W, interpolation=cv2.INTER_AREA
+        control_weight = load_spatial_temporal_weights(
+            control_weights, B=1, T=num_video_frames, H=self.target_h, W=self.target_w, patch_h=self.H, patch_w=self.W
         )
-        num_total_frames = input_frames.shape[1]
-        control_input_dict["video"] = input_frames.numpy()  # CTHW
-        data_batch["input_video"] = input_frames.bfloat16()[None] / 255 * 2 - 1  # BCTHW
-    else:
-        data_batch["input_video"] = None
-    target_w, target_h = W, H
-
-    control_weights = []
-    for hint_key, control_info in control_inputs.items():
-        if "input_control" in control_info:
-            in_file = control_info["input_control"]
-            interpolation = cv2.INTER_NEAREST if hint_key == "seg" else cv2.INTER_LINEAR
-            log.info(f"reading control input {in_file} for hint {hint_key}")
-            control_input_dict[f"control_input_{hint_key}"], fps, aspect_ratio = read_and_resize_input(
-                in_file, num_total_frames=num_total_frames, h=H, w=W, interpolation=interpolation
-            )  # CTHW
-            num_total_frames = min(num_total_frames, control_input_dict[f"control_input_{hint_key}"].shape[1])
-        if hint_key == "upscale":
-            orig_size = (W, H)
-            target_w, target_h = get_upscale_size(orig_size, aspect_ratio, upscale_factor=3)
+        if control_weight.ndim > 5 and self.num_frames_with_padding > control_weight.shape[3]:
+            pad_t = self.num_frames_with_padding - control_weight.shape[3]
+            pad_weight = control_weight[:, :, :, -1:].repeat(1, 1, 1, pad_t, 1, 1)
+            control_weight = torch.cat([control_weight, pad_weight], dim=3)
+        data_batch["control_weight"] = control_weight
+
+        if len(control_inputs) > 1:  # Multicontrol enabled
+            data_batch["hint_key"] = "control_input_multi"
+        else:  # Single-control case
+            data_batch["hint_key"] = self.hint_key
+        data_batch["target_h"], data_batch["target_w"] = self.target_h // 8, self.target_w // 8
+
+        self.cache = cache
+        self.input_video_path = input_video_path
+        self.blur_strength = blur_strength
+        self.canny_threshold = canny_threshold
+        self._content_fields = None
+
+    def _set_num_frames(self, num_frames: int) -> None:
+        self.num_frames = num_frames
+        # Pad duplicate frames at the end so that the last clip is full
+        num_new_generated_frames = self.num_video_frames - self.num_input_frames
+        self.num_frames_with_padding = self.num_frames
+        if (self.num_frames - self.num_input_frames) % num_new_generated_frames != 0:
+            self.num_frames_with_padding += num_new_generated_frames - (
+                (self.num_frames - self.num_input_frames) % num_new_generated_frames
+            )
+        self.num_clips = (self.num_frames_with_padding - self.num_input_frames) // num_new_generated_frames
+
+    def _update_num_frames(self) -> None:
+        """Shorten the video to the frames the streams could decode, when a container reported too many frames."""
+        streams = list(self.control_streams.values())
+        if self.input_stream is not None:
+            streams.append(self.input_stream)
+        num_frames = min([self.num_frames] + [stream.num_frames for stream in streams])
+        if num_frames < self.num_frames:
+            log.warning(
+                f"Only {num_frames} of the {self.num_frames} frames reported by the video containers could be decoded, "
+                f"generating {num_frames} frames"
+            )
+            self._set_num_frames(num_frames)
+
+    def clip_key_fields(self, start_frame: int, end_frame: int) -> Dict[str, Any]:
+        """Fields that identify the inputs of a clip window: input file contents and all preprocessing settings."""
+        if self._content_fields is None:
+            self._content_fields = dict(
+                input_video=file_digest(self.input_video_path) if self.input_video_path else None,
+                input_controls={
+                    hint_key: file_digest(self.control_inputs[hint_key]["input_control"])
+                    for hint_key in self.control_streams
+                },
+                hint_key=self.hint_key,
+                blur_strength=self.blur_strength,
+                canny_threshold=self.canny_threshold,
+                blur_config=BilateralOnlyBlurAugmentorConfig[self.blur_strength],
+                size=(self.H, self.W, self.target_h, self.target_w),
+                num_frames=self.num_frames,
+            )
+        return dict(start_frame=start_frame, end_frame=end_frame, **self._content_fields)
+
+    def get_clip(self, start_frame: int, end_frame: int) -> Tuple[Optional[torch.Tensor], torch.Tensor]:
+        """Build the model inputs for frames [start_frame, end_frame).
+
+        Returns:
+            tuple: Input video [B,C,T,H,W] in [-1,1] or None, and control input [B,C,T,H,W] in [-1,1]
+        """
+        control_input = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(**self.clip_key_fields(start_frame, end_frame))
+            control_input = self.cache.get_array(cache_key)
+
+        control_input_dict = {k: v for k, v in self.base_dict.items()}
+        input_video = None
+        if self.input_stream is not None:
+            input_frames = torch.from_numpy(self.input_stream.read(start_frame, end_frame).transpose(3, 0, 1, 2))
+            control_input_dict["video"] = input_frames.numpy()  # CTHW
+            input_video = input_frames.bfloat16()[None] / 255 * 2 - 1  # BCTHW
+        if control_input is None:
+            for hint_key, stream in self.control_streams.items():
+                control_input_dict[f"control_input_{hint_key}"] = torch.from_numpy(
+                    stream.read(start_frame, end_frame).transpose(3, 0, 1, 2)
+                )  # CTHW
+        if "upscale" in self.control_inputs:
             input_resized = resize_video(
                 input_frames[None].numpy(),
-                target_h,
-                target_w,
+                self.target_h,
+                self.target_w,
                 interpolation=cv2.INTER_LINEAR,
             )  # BCTHW
             control_input_dict["control_input_upscale"] = split_video_into_patches(
-                torch.from_numpy(input_resized), H, W
+                torch.from_numpy(input_resized), self.H, self.W
             )
-            data_batch["input_video"] = control_input_dict["control_input_upscale"].bfloat16() / 255 * 2 - 1
-        control_weights.append(control_info["control_weight"])
-
-    # Trim all control videos and input video to be the same length.
-    log.info(f"Making all control and input videos to be length of {num_total_frames} frames.")
-    if len(control_inputs) > 1:
-        for hint_key in control_inputs.keys():
-            cur_key = f"control_input_{hint_key}"
-            if cur_key in control_input_dict:
-                control_input_dict[cur_key] = control_input_dict[cur_key][:, :num_total_frames]
-    if input_video_path:
-        control_input_dict["video"] = control_input_dict["video"][:, :num_total_frames]
-        data_batch["input_video"] = data_batch["input_video"][:, :, :num_total_frames]
-
-    hint_key = "control_input_" + "_".join(control_inputs.keys())
-
-    # Add augmentor for processing inputs based on blur strength
-    add_control_input = get_augmentor_for_eval(
-        input_key="video",
-        output_key=hint_key,
-        preset_blur_strength=blur_strength,
-        preset_canny_threshold=canny_threshold,
-        blur_config=BilateralOnlyBlurAugmentorConfig[blur_strength],
-    )
-
-    if len(control_input_dict):
-        control_input = add_control_input(control_input_dict)[hint_key]
-        if control_input.ndim == 4:
-            control_input = control_input[None]
+            input_video = control_input_dict["control_input_upscale"].bfloat16() / 255 * 2 - 1
+
+        if control_input is None:
+            control_input = self.add_control_input(control_input_dict)[self.hint_key]
+            if control_input.ndim == 4:
+                control_input = control_input[None]
+            if self.cache is not None:
+                self.cache.put_array(cache_key, control_input.numpy())
+        else:
+            control_input = torch.from_numpy(control_input)
         control_input = control_input.bfloat16() / 255 * 2 - 1
-        control_weights = load_spatial_temporal_weights(
-            control_weights, B=1, T=num_video_frames, H=target_h, W=target_w, patch_h=H, patch_w=W
-        )
-        data_batch["control_weight"] = control_weights
+        self._update_num_frames()
+        return input_video, control_input
+
+    def __len__(self) -> int:
+        return self.num_clips
+
+    def __iter__(self) -> Iterator[Tuple[int, int, Optional[torch.Tensor], torch.Tensor]]:
+        num_new_generated_frames = self.num_video_frames - self.num_input_frames
+        i_clip = 0
+        # The number of clips shrinks if decoding finds fewer frames than the containers reported
+        while i_clip < self.num_clips:
+            start_frame = num_new_generated_frames * i_clip
+            end_frame = num_new_generated_frames * (i_clip + 1) + self.num_input_frames
+            clip = self.get_clip(start_frame, end_frame)
+            if i_clip >= self.num_clips:
+                break
+            yield (start_frame, end_frame, *clip)
+            i_clip += 1
+
+    def close(self) -> None:
+        if self.input_stream is not None:
+            self.input_stream.close()
+        for stream in self.control_streams.values():
+            stream.close()
+
+
+def pin_memory(tensor: Optional[torch.Tensor]) -> Optional[torch.Tensor]:
+    """Return a page-locked copy of a host tensor so that it can be uploaded asynchronously. None is passed through."""
+    return None if tensor is None else tensor.pin_memory()
+
+
+def prefetch_iterator(iterable: Iterable, num_prefetch: int = 1) -> Iterator:
+    """Iterate `iterable` in a background thread, keeping up to `num_prefetch` items ready ahead of the consumer.
+
+    Used to overlap host-side work (video decoding, control preprocessing) with GPU work on the main thread.
+    Exceptions raised while producing an item are re-raised in the consumer. Close the returned generator when the
+    consumer stops early, to stop the background thread.
+    """
+    items = queue.Queue(maxsize=num_prefetch)
+    stop = threading.Event()
+    end_of_items = object()
 
-        if len(control_inputs) > 1:  # Multicontrol enabled
-            data_batch["hint_key"] = "control_input_multi"
-            data_batch["control_input_multi"] = control_input
-        else:  # Single-control case
-            data_batch["hint_key"] = hint_key
-            data_batch[hint_key] = control_input
+    def _put(entry) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put((item, None)):
+                    return
+        except Exception as e:
+            _put((end_of_items, e))
+            return
+        _put((end_of_items, None))
+
+    producer = threading.Thread(target=_produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is end_of_items:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        # Closing the iterator waits for the item in progress, so that the caller can release what it reads from
+        producer.join()
 
-    data_batch["target_h"], data_batch["target_w"] = target_h // 8, target_w // 8
 
+def get_ctrl_batch(
+    model, data_batch, num_video_frames, input_video_path, control_inputs, blur_strength, canny_threshold
+):
+    """Prepare complete input batch for video generation including latent dimensions.
+
+    The whole video is held in memory. Use `CtrlClipStream` to process long videos clip by clip.
+
+    Args:
+        model: Diffusion model instance
+
+    Returns:
+        - data_batch (dict): Complete model input batch
+    """
+    stream = CtrlClipStream(
+        model, data_batch, num_video_frames, 0, input_video_path, control_inputs, blur_strength, canny_threshold
+    )
+    input_video, control_input = stream.get_clip(0, stream.num_frames)
+    # Drop the repeated last frames read past the end of videos whose containers reported too many frames
+    data_batch["input_video"] = None if input_video is None else input_video[:, :, : stream.num_frames]
+    data_batch[data_batch["hint_key"]] = control_input[:, :, : stream.num_frames]
+    stream.close()
     return data_batch
 
 
@@ -457,6 +684,8 @@ def generate_world_from_control(
     num_input_frames: int,
     sigma_max: float,
     x_sigma_max=None,
+    batch_cfg: bool = False,
+    patch_batch_size: int = 1,
 ) -> Tuple[np.array, list, list]:
     """Generate video using a conditioning video/image input.
 
@@ -470,6 +699,8 @@ def generate_world_from_control(
         seed (int): Random seed for generation
         condition_latent (torch.Tensor): Latent tensor from conditioning video/image file
         num_input_frames (int): Number of input frames
+        batch_cfg (bool): Run condition and uncondition in a single network forward per sampling step
+        patch_batch_size (int): Max number of upscaler patches stacked along the batch dimension per network forward
 
     Returns:
         np.array: Generated video frames in shape [T,H,W,C], range [0,255]
@@ -505,6 +736,8 @@ def generate_world_from_control(
         target_w=data_batch["target_w"],
         patch_h=h,
         patch_w=w,
+        batch_cfg=batch_cfg,
+        patch_batch_size=patch_batch_size,
     )
     return sample
 
@@ -794,54 +1027,107 @@ def load_spatial_temporal_weights(weight_paths, B, T, H, W, patch_h, patch_w):
     return weights
 
 
-def split_video_into_patches(tensor, patch_h, patch_w):
-    h, w = tensor.shape[-2:]
-    n_img_w = (w - 1) // patch_w + 1
-    n_img_h = (h - 1) // patch_h + 1
-    overlap_size_h = overlap_size_w = 0
-    if n_img_w > 1:
-        overlap_size_w = (n_img_w * patch_w - w) // (n_img_w - 1)  # 512 for n=2, 320 for n=4
-        assert n_img_w * patch_w - overlap_size_w * (n_img_w - 1) == w
-    if n_img_h > 1:
-        overlap_size_h = (n_img_h * patch_h - h) // (n_img_h - 1)
-        assert n_img_h * patch_h - overlap_size_h * (n_img_h - 1) == h
-    p_h = patch_h - overlap_size_h
-    p_w = patch_w - overlap_size_w
+class PatchGeometry:
+    """Overlapping spatial patches of a video, as used by `split_video_into_patches` and `merge_patches_into_video`.
 
-    patches = []
-    for i in range(n_img_h):
-        for j in range(n_img_w):
-            patches += [tensor[:, :, :, p_h * i : (p_h * i + patch_h), p_w * j : (p_w * j + patch_w)]]
-    return torch.cat(patches)
+    The flat pixel indices of every patch and the linear blending weights are computed once, so that splitting is a
+    single gather and merging a single scatter-add on the device of the video. Use `get_patch_geometry` to reuse the
+    geometry of a layout across calls.
 
+    Args:
+        patch_h (int): Height of a patch
+        patch_w (int): Width of a patch
+        n_img_h (int): Number of patches along the height
+        n_img_w (int): Number of patches along the width
+        overlap_size_h (int): Number of rows shared by vertically adjacent patches
+        overlap_size_w (int): Number of columns shared by horizontally adjacent patches
+        device (str): Device of the index and weight tensors
+    """
 
-def merge_patches_into_video(imgs, overlap_size_h, overlap_size_w, n_img_h, n_img_w):
-    b, c, t, h, w = imgs.shape
-    imgs = rearrange(imgs, "(b m n) c t h w -> m n b c t h w", m=n_img_h, n=n_img_w)
-    H = n_img_h * h - (n_img_h - 1) * overlap_size_h
-    W = n_img_w * w - (n_img_w - 1) * overlap_size_w
-    img_sum = torch.zeros((b // (n_img_h * n_img_w), c, t, H, W)).to(imgs)
-    mask_sum = torch.zeros((H, W)).to(imgs)
-
-    # Create a linear mask for blending.
-    def create_linear_gradient_tensor(H, W, overlap_size_h, overlap_size_w):
+    def __init__(
+        self,
+        patch_h: int,
+        patch_w: int,
+        n_img_h: int,
+        n_img_w: int,
+        overlap_size_h: int,
+        overlap_size_w: int,
+        device: str = "cpu",
+    ):
+        self.patch_h, self.patch_w = patch_h, patch_w
+        self.n_img_h, self.n_img_w = n_img_h, n_img_w
+        self.overlap_size_h, self.overlap_size_w = overlap_size_h, overlap_size_w
+        self.H = n_img_h * patch_h - (n_img_h - 1) * overlap_size_h
+        self.W = n_img_w * patch_w - (n_img_w - 1) * overlap_size_w
+        self.num_patches = n_img_h * n_img_w
+
+        # Flat index into H * W of every pixel of every patch in row-major patch order [num_patches, patch_h * patch_w]
+        local_index = (torch.arange(patch_h)[:, None] * self.W + torch.arange(patch_w)[None, :]).flatten()
+        starts = [
+            i * (patch_h - overlap_size_h) * self.W + j * (patch_w - overlap_size_w)
+            for i in range(n_img_h)
+            for j in range(n_img_w)
+        ]
+        self.index = (torch.tensor(starts)[:, None] + local_index[None, :]).to(device)
+
+        # Linear blending weights that fade out towards the patch borders, and their sum over patches per pixel
         y, x = torch.meshgrid(
-            torch.minimum(torch.arange(H), H - torch.arange(H)) / (overlap_size_h + 1e-6),
-            torch.minimum(torch.arange(W), W - torch.arange(W)) / (overlap_size_w + 1e-6),
+            torch.minimum(torch.arange(patch_h), patch_h - torch.arange(patch_h)) / (overlap_size_h + 1e-6),
+            torch.minimum(torch.arange(patch_w), patch_w - torch.arange(patch_w)) / (overlap_size_w + 1e-6),
+            indexing="ij",
+        )
+        self.weight = (torch.clamp(y, 0.01, 1) * torch.clamp(x, 0.01, 1)).flatten().to(device)
+        self.weight_sum = torch.zeros(self.H * self.W, device=device).index_add_(
+            0, self.index.flatten(), self.weight.repeat(self.num_patches)
         )
-        return torch.clamp(y, 0.01, 1) * torch.clamp(x, 0.01, 1)
 
-    mask_ij = create_linear_gradient_tensor(h, w, overlap_size_h, overlap_size_w).to(imgs)
+    def split(self, video: torch.Tensor) -> torch.Tensor:
+        """Split a video [B, C, T, H, W] into patches [(num_patches B), C, T, patch_h, patch_w]."""
+        patches = video.flatten(-2)[..., self.index.to(video.device)]  # [B, C, T, num_patches, patch_h * patch_w]
+        return rearrange(patches, "b c t n (h w) -> (n b) c t h w", h=self.patch_h)
+
+    def merge(self, patches: torch.Tensor) -> torch.Tensor:
+        """Blend patches [(B num_patches), C, T, patch_h, patch_w] into a video [B, C, T, H, W]."""
+        patches = rearrange(patches, "(b n) c t h w -> b c t n (h w)", n=self.num_patches)
+        weighted = (patches * self.weight.to(patches)).flatten(-2)
+        index = self.index.to(patches.device).flatten().expand(weighted.shape)
+        video = torch.zeros(*weighted.shape[:-1], self.H * self.W, dtype=patches.dtype, device=patches.device)
+        video.scatter_add_(-1, index, weighted)
+        video = video / (self.weight_sum.to(video) + 1e-6)
+        return video.unflatten(-1, (self.H, self.W))
+
+
+@lru_cache(maxsize=32)
+def _cached_patch_geometry(
+    patch_h: int, patch_w: int, n_img_h: int, n_img_w: int, overlap_size_h: int, overlap_size_w: int, device: str
+) -> PatchGeometry:
+    return PatchGeometry(patch_h, patch_w, n_img_h, n_img_w, overlap_size_h, overlap_size_w, device=device)
+
+
+def get_patch_geometry(H: int, W: int, patch_h: int, patch_w: int, device: str = "cpu") -> PatchGeometry:
+    """Cached geometry of the fewest evenly overlapping patch_h x patch_w patches that cover a H x W video."""
+    patch_h, patch_w = min(patch_h, H), min(patch_w, W)
+    n_img_w = (W - 1) // patch_w + 1
+    n_img_h = (H - 1) // patch_h + 1
+    overlap_size_h = overlap_size_w = 0
+    if n_img_w > 1:
+        overlap_size_w = (n_img_w * patch_w - W) // (n_img_w - 1)  # 512 for n=2, 320 for n=4
+        assert n_img_w * patch_w - overlap_size_w * (n_img_w - 1) == W
+    if n_img_h > 1:
+        overlap_size_h = (n_img_h * patch_h - H) // (n_img_h - 1)
+        assert n_img_h * patch_h - overlap_size_h * (n_img_h - 1) == H
+    return _cached_patch_geometry(patch_h, patch_w, n_img_h, n_img_w, overlap_size_h, overlap_size_w, str(device))
+
+
+def split_video_into_patches(tensor, patch_h, patch_w):
+    h, w = tensor.shape[-2:]
+    return get_patch_geometry(h, w, patch_h, patch_w, device=tensor.device).split(tensor)
 
-    for i in range(n_img_h):
-        for j in range(n_img_w):
-            h_start = i * (h - overlap_size_h)
-            w_start = j * (w - overlap_size_w)
-            img_sum[:, :, :, h_start : h_start + h, w_start : w_start + w] += (
-                imgs[i, j] * mask_ij[None, None, None, :, :]
-            )
-            mask_sum[h_start : h_start + h, w_start : w_start + w] += mask_ij
-    return img_sum / (mask_sum[None, None, None, :, :] + 1e-6)
+
+def merge_patches_into_video(imgs, overlap_size_h, overlap_size_w, n_img_h, n_img_w):
+    h, w = imgs.shape[-2:]
+    geometry = _cached_patch_geometry(h, w, n_img_h, n_img_w, overlap_size_h, overlap_size_w, str(imgs.device))
+    return geometry.merge(imgs)
 
 
 valid_hint_keys = {"vis", "seg", "edge", "depth", "upscale", "hdmap", "lidar"}
@@ -850,7 +1136,11 @@ valid_hint_keys = {"vis", "seg", "edge", "depth", "upscale", "hdmap", "lidar"}
 def load_controlnet_specs(cfg) -> Dict[str, Any]:
     with open(cfg.controlnet_specs, "r") as f:
         controlnet_specs_in = json.load(f)
+    return parse_controlnet_specs(controlnet_specs_in)
+
 
+def parse_controlnet_specs(controlnet_specs_in: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Split a controlnet specs dict into per-hint configs and top-level arguments (prompt, input_video_path, ...)."""
     controlnet_specs = {}
     args = {}
 
@@ -15,16 +15,75 @@
 
 import json
 import os
+from typing import Any, Dict, List, Optional
+
+from huggingface_hub import snapshot_download
+from huggingface_hub.utils import LocalEntryNotFoundError
 
 from cosmos_transfer1.auxiliary.depth_anything.model.depth_anything import DepthAnythingModel
 from cosmos_transfer1.auxiliary.sam2.sam2_model import VideoSegmentationModel
+from cosmos_transfer1.checkpoints import (
+    DEPTH_ANYTHING_MODEL_CHECKPOINT,
+    GROUNDING_DINO_MODEL_CHECKPOINT,
+    SAM2_MODEL_CHECKPOINT,
+)
+from cosmos_transfer1.diffusion.inference.control_cache import ControlInputCache
 from cosmos_transfer1.utils import log
 
+# Checkpoints of the models that generate the control videos of each hint key
+PREPROCESSOR_CHECKPOINTS = {
+    "depth": [DEPTH_ANYTHING_MODEL_CHECKPOINT],
+    "seg": [SAM2_MODEL_CHECKPOINT, GROUNDING_DINO_MODEL_CHECKPOINT],
+}
+
+
+def checkpoint_fingerprint(repo_ids: List[str]) -> Optional[str]:
+    """Identify the downloaded versions of Hugging Face checkpoints, or None if one is not downloaded yet.
+
+    Files in the Hugging Face cache link to blobs named by their content hash, so the blob names identify the
+    checkpoint files without hashing the weights.
+    """
+    fields = {}
+    for repo_id in repo_ids:
+        try:
+            snapshot_dir = snapshot_download(repo_id, local_files_only=True)
+        except LocalEntryNotFoundError:
+            return None
+        for root, _, files in os.walk(snapshot_dir):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, snapshot_dir)
+                fields[f"{repo_id}/{rel_path}"] = os.path.basename(os.path.realpath(path))
+    return ControlInputCache.make_key(**fields)
+
 
 class Preprocessors:
-    def __init__(self):
+    def __init__(self, cache: Optional[ControlInputCache] = None):
         self.depth_model = None
         self.seg_model = None
+        # Generated control videos and weight maps are reused for the same input video, settings and preprocessor
+        # checkpoints
+        self.cache = cache
+        self._fingerprints: Dict[str, str] = {}
+
+    def _cache_key(self, preprocessor: str, input_video: str, **fields: Any) -> Optional[str]:
+        """Cache key of an output of the `preprocessor` ("depth" or "seg") models for the contents of `input_video`.
+
+        None if the cache is disabled or the checkpoints are not downloaded yet, in which case the output can only be
+        cached after the models are loaded.
+        """
+        if self.cache is None:
+            return None
+        if preprocessor not in self._fingerprints:
+            fingerprint = checkpoint_fingerprint(PREPROCESSOR_CHECKPOINTS[preprocessor])
+            if fingerprint is None:
+                return None
+            self._fingerprints[preprocessor] = fingerprint
+        return self.cache.make_key(
+            input_video=self.cache.file_digest(input_video),
+            preprocessor_checkpoints=self._fingerprints[preprocessor],
+            **fields,
+        )
 
     def __call__(self, input_video, input_prompt, control_inputs, output_folder):
         for hint_key in control_inputs:
@@ -40,12 +99,21 @@ class Preprocessors:
             # Everything else will be treated as background and have control weight 0 at those locations.
             if control_input.get("control_weight_prompt", None) is not None:
                 prompt = control_input["control_weight_prompt"]
-                log.info(f"{hint_key}: generating control weight tensor with SAM using {prompt=}")
                 out_tensor = os.path.join(output_folder, f"{hint_key}_control_weight.pt")
                 out_video = os.path.join(output_folder, f"{hint_key}_control_weight.mp4")
                 weight_scaler = (
                     control_input["control_weight"] if isinstance(control_input["control_weight"], float) else 1.0
                 )
+                key_fields = dict(kind="control_weight", prompt=prompt, weight_scaler=weight_scaler)
+                cache_key = self._cache_key("seg", input_video, **key_fields)
+                if (
+                    cache_key is not None
+                    and self.cache.get_file(cache_key, ".pt", out_tensor)
+                    and self.cache.get_file(cache_key, ".mp4", out_video)
+                ):
+                    log.info(f"{hint_key}: reusing cached control weight tensor")
+                    continue
+                log.info(f"{hint_key}: generating control weight tensor with SAM using {prompt=}")
                 self.segmentation(
                     in_video=input_video,
                     out_tensor=out_tensor,
@@ -54,6 +122,11 @@ class Preprocessors:
                     weight_scaler=weight_scaler,
                     binarize_video=True,
                 )
+                # The checkpoints are downloaded once the model is loaded
+                cache_key = cache_key or self._cache_key("seg", input_video, **key_fields)
+                if cache_key is not None:
+                    self.cache.put_file(cache_key, ".pt", out_tensor)
+                    self.cache.put_file(cache_key, ".mp4", out_video)
         return control_inputs
 
     def gen_input_control(self, in_video, in_prompt, hint_key, control_input, output_folder):
@@ -62,9 +135,16 @@ class Preprocessors:
         if control_input.get("input_control", None) is None:
             out_video = os.path.join(output_folder, f"{hint_key}_input_control.mp4")
             control_input["input_control"] = out_video
+            prompt = None
             if hint_key == "seg":
                 prompt = control_input.get("input_control_prompt", in_prompt)
                 prompt = " ".join(prompt.split()[:128])
+            key_fields = dict(kind="input_control", hint_key=hint_key, prompt=prompt)
+            cache_key = self._cache_key(hint_key, in_video, **key_fields)
+            if cache_key is not None and self.cache.get_file(cache_key, ".mp4", out_video):
+                log.info(f"no input_control provided for {hint_key}. reusing cached input control video")
+                return
+            if hint_key == "seg":
                 log.info(
                     f"no input_control provided for {hint_key}. generating input control video with SAM using {prompt=}"
                 )
@@ -81,6 +161,10 @@ class Preprocessors:
                     in_video=in_video,
                     out_video=out_video,
                 )
+            # The checkpoints are downloaded once the model is loaded
+            cache_key = cache_key or self._cache_key(hint_key, in_video, **key_fields)
+            if cache_key is not None:
+                self.cache.put_file(cache_key, ".mp4", out_video)
 
     def depth(self, in_video, out_video):
         if self.depth_model is None:
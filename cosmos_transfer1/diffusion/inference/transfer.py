@@ -21,10 +21,12 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"  # Workaround to suppress MP warn
 
 import sys
 from io import BytesIO
+from typing import Optional
 
 import torch
 
 from cosmos_transfer1.checkpoints import BASE_7B_CHECKPOINT_AV_SAMPLE_PATH, BASE_7B_CHECKPOINT_PATH
+from cosmos_transfer1.diffusion.datasets.augmentors.control_input import set_num_frame_workers
 from cosmos_transfer1.diffusion.inference.inference_utils import load_controlnet_specs, validate_controlnet_specs
 from cosmos_transfer1.diffusion.inference.preprocessors import Preprocessors
 from cosmos_transfer1.diffusion.inference.world_generation_pipeline import DiffusionControl2WorldGenerationPipeline
@@ -35,7 +37,7 @@ torch.enable_grad(False)
 torch.serialization.add_safe_globals([BytesIO])
 
 
-def parse_arguments() -> argparse.Namespace:
+def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Control to world generation demo script", conflict_handler="resolve")
 
     # Add transfer specific arguments
@@ -116,11 +118,80 @@ def parse_arguments() -> argparse.Namespace:
     )
     parser.add_argument("--num_steps", type=int, default=35, help="Number of diffusion sampling steps")
     parser.add_argument("--guidance", type=float, default=5, help="Classifier-free guidance scale value")
+    parser.add_argument(
+        "--batch_cfg",
+        action="store_true",
+        help="Run the conditional and unconditional guidance branches in a single batched forward pass",
+    )
+    parser.add_argument(
+        "--patch_batch_size",
+        type=int,
+        default=1,
+        help="Max number of spatial patches of the 4K upscaler stacked along the batch dimension per network forward. "
+        "Halved automatically when a forward runs out of GPU memory",
+    )
+    parser.add_argument(
+        "--max_dec_batch_size",
+        type=int,
+        default=0,
+        help="Max number of spatial patches of the 4K upscaler decoded per tokenizer call, with stitching and resizing "
+        "on the GPU. 0 decodes the patches one by one and stitches them on CPU",
+    )
+    parser.add_argument(
+        "--float_condition",
+        action="store_true",
+        help="Condition each clip of a long video on the previous clip's decoded frames in float precision",
+    )
     parser.add_argument("--height", type=int, default=704, help="Height of video to sample")
     parser.add_argument("--width", type=int, default=1280, help="Width of video to sample")
     parser.add_argument("--fps", type=int, default=24, help="FPS of the sampled video")
     parser.add_argument("--seed", type=int, default=1, help="Random seed")
     parser.add_argument("--num_gpus", type=int, default=1, help="Number of GPUs used to run inference in parallel.")
+    parser.add_argument(
+        "--control_cache_dir",
+        type=str,
+        default=None,
+        help="Directory of an on-disk cache of preprocessed control inputs, reused across runs with the same "
+        "input videos and control settings. Disabled if not set",
+    )
+    parser.add_argument(
+        "--control_cache_size_gb",
+        type=float,
+        default=50.0,
+        help="Size above which the least recently used control cache entries are evicted",
+    )
+    parser.add_argument(
+        "--latent_cache_dir",
+        type=str,
+        default=None,
+        help="Directory of an on-disk cache of tokenizer latents of the input video and control inputs, keyed by the "
+        "input contents, frame range, hint key and tokenizer checkpoint. Disabled if not set",
+    )
+    parser.add_argument(
+        "--latent_cache_size_gb",
+        type=float,
+        default=50.0,
+        help="Size above which the least recently used latent cache entries are evicted",
+    )
+    parser.add_argument(
+        "--validate_latent_cache",
+        action="store_true",
+        help="Re-encode on every latent cache hit and log the difference to the cached latent",
+    )
+    parser.add_argument(
+        "--text_embedding_cache_dir",
+        type=str,
+        default=None,
+        help="Directory of an on-disk cache of T5 prompt embeddings. With --offload_text_encoder_model, T5 is only "
+        "loaded when a prompt misses the cache. Disabled if not set",
+    )
+    parser.add_argument(
+        "--num_frame_workers",
+        type=int,
+        default=None,
+        help="Number of threads used for per-frame control input preprocessing (blur, canny, resize). "
+        "Defaults to COSMOS_NUM_FRAME_WORKERS or min(8, cpu count)",
+    )
     parser.add_argument(
         "--offload_diffusion_transformer",
         action="store_true",
@@ -131,12 +202,37 @@ def parse_arguments() -> argparse.Namespace:
         action="store_true",
         help="Offload text encoder model after inference",
     )
+    parser.add_argument(
+        "--stream_text_encoder",
+        action="store_true",
+        help="Keep the T5 encoder blocks in pinned host memory and stream them to the GPU one block ahead of "
+        "execution, so that only about two blocks occupy GPU memory",
+    )
     parser.add_argument(
         "--offload_guardrail_models",
         action="store_true",
         help="Offload guardrail models after inference",
     )
+    parser.add_argument(
+        "--text_guardrail_cache_dir",
+        type=str,
+        default=None,
+        help="Directory of an on-disk cache of Blocklist and Aegis decisions, keyed by normalized prompt and guardrail "
+        "versions. Disabled if not set",
+    )
+    parser.add_argument(
+        "--guardrail_frame_stride",
+        type=int,
+        default=1,
+        help="Classify every guardrail_frame_stride-th generated frame with the video content safety filter, e.g. 12 "
+        "to sample a 24 fps video at 2 fps",
+    )
+    return parser
+
 
+def parse_arguments(parser: Optional[argparse.ArgumentParser] = None) -> argparse.Namespace:
+    if parser is None:
+        parser = get_parser()
     cmd_args = parser.parse_args()
 
     # Load and parse JSON input
@@ -156,6 +252,52 @@ def parse_arguments() -> argparse.Namespace:
     return cmd_args, control_inputs
 
 
+def build_pipeline(cfg, control_inputs) -> DiffusionControl2WorldGenerationPipeline:
+    """Initialize the transfer generation model pipeline from the parsed configuration.
+
+    Args:
+        cfg (argparse.Namespace): Configuration namespace returned by `parse_arguments`.
+        control_inputs (dict): Validated controlnet specs. Determines which ControlNet branches are loaded.
+
+    Returns:
+        DiffusionControl2WorldGenerationPipeline: The loaded pipeline.
+    """
+    if cfg.num_frame_workers is not None:
+        set_num_frame_workers(cfg.num_frame_workers)
+    checkpoint = BASE_7B_CHECKPOINT_AV_SAMPLE_PATH if cfg.is_av_sample else BASE_7B_CHECKPOINT_PATH
+    return DiffusionControl2WorldGenerationPipeline(
+        checkpoint_dir=cfg.checkpoint_dir,
+        checkpoint_name=checkpoint,
+        offload_network=cfg.offload_diffusion_transformer,
+        offload_text_encoder_model=cfg.offload_text_encoder_model,
+        offload_guardrail_models=cfg.offload_guardrail_models,
+        guidance=cfg.guidance,
+        num_steps=cfg.num_steps,
+        height=cfg.height,
+        width=cfg.width,
+        fps=cfg.fps,
+        seed=cfg.seed,
+        num_input_frames=cfg.num_input_frames,
+        control_inputs=control_inputs,
+        sigma_max=cfg.sigma_max,
+        blur_strength=cfg.blur_strength,
+        canny_threshold=cfg.canny_threshold,
+        batch_cfg=cfg.batch_cfg,
+        patch_batch_size=cfg.patch_batch_size,
+        max_dec_batch_size=cfg.max_dec_batch_size,
+        float_condition=cfg.float_condition,
+        control_cache_dir=cfg.control_cache_dir,
+        control_cache_size_gb=cfg.control_cache_size_gb,
+        latent_cache_dir=cfg.latent_cache_dir,
+        latent_cache_size_gb=cfg.latent_cache_size_gb,
+        validate_latent_cache=cfg.validate_latent_cache,
+        text_embedding_cache_dir=cfg.text_embedding_cache_dir,
+        stream_text_encoder=cfg.stream_text_encoder,
+        text_guardrail_cache_dir=cfg.text_guardrail_cache_dir,
+        guardrail_frame_stride=cfg.guardrail_frame_stride,
+    )
+
+
 def demo(cfg, control_inputs):
     """Run control-to-world generation demo.
 
@@ -196,28 +338,9 @@ def demo(cfg, control_inputs):
 
         device_rank = distributed.get_rank(process_group)
 
-    preprocessors = Preprocessors()
-    checkpoint = BASE_7B_CHECKPOINT_AV_SAMPLE_PATH if cfg.is_av_sample else BASE_7B_CHECKPOINT_PATH
-
     # Initialize transfer generation model pipeline
-    pipeline = DiffusionControl2WorldGenerationPipeline(
-        checkpoint_dir=cfg.checkpoint_dir,
-        checkpoint_name=checkpoint,
-        offload_network=cfg.offload_diffusion_transformer,
-        offload_text_encoder_model=cfg.offload_text_encoder_model,
-        offload_guardrail_models=cfg.offload_guardrail_models,
-        guidance=cfg.guidance,
-        num_steps=cfg.num_steps,
-        height=cfg.height,
-        width=cfg.width,
-        fps=cfg.fps,
-        seed=cfg.seed,
-        num_input_frames=cfg.num_input_frames,
-        control_inputs=control_inputs,
-        sigma_max=cfg.sigma_max,
-        blur_strength=cfg.blur_strength,
-        canny_threshold=cfg.canny_threshold,
-    )
+    pipeline = build_pipeline(cfg, control_inputs)
+    preprocessors = Preprocessors(cache=pipeline.control_cache)
 
     if cfg.num_gpus > 1:
         pipeline.model.net.enable_context_parallel(process_group)
@@ -0,0 +1,258 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Data-parallel batch runner for the control-to-world transfer pipeline.
+
+Every process group of `--num_gpus` ranks holds its own pipeline (context parallel across the group when
+`--num_gpus > 1`) and pulls prompts from the `--batch_input_path` JSONL through a shared work queue. Launched with
+`torchrun --nproc_per_node=8 ... --num_gpus 4`, this runs 2 jobs at a time with 4-way context parallelism each.
+
+The work queue is a directory of claim files next to the outputs, so it also works across nodes on a shared
+filesystem. Jobs whose video already exists (or that were blocked by the guardrail) are skipped, so an interrupted
+run can be resumed by launching the same command again. Every job writes `<index>.json` with its status, and the
+first rank collects them into `batch_summary.jsonl` at the end.
+"""
+
+import copy
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from cosmos_transfer1.diffusion.inference.inference_utils import validate_controlnet_specs
+from cosmos_transfer1.diffusion.inference.preprocessors import Preprocessors
+from cosmos_transfer1.diffusion.inference.transfer import build_pipeline, get_parser, parse_arguments
+from cosmos_transfer1.utils import log, misc
+from cosmos_transfer1.utils.io import read_prompts_from_file, save_video
+
+CLAIM_FOLDER = ".batch_claims"
+SUMMARY_FILE = "batch_summary.jsonl"
+
+
+class BatchRunner:
+    """Runs the prompts of a JSONL file on data-parallel groups of context-parallel ranks.
+
+    Args:
+        cfg (argparse.Namespace): Configuration namespace returned by `parse_arguments`. `cfg.num_gpus` is the
+            number of ranks that work on one job.
+        control_inputs (dict): Controlnet specs shared by all jobs.
+    """
+
+    def __init__(self, cfg, control_inputs: Dict[str, Any]):
+        self.cfg = cfg
+        self.control_inputs = validate_controlnet_specs(cfg, control_inputs)
+        self.world_size = int(os.getenv("WORLD_SIZE", 1))
+        self.rank = 0
+        self.group_ranks = [0]  # global ranks that work on the same jobs, the first one claims them
+        self.job_group = None
+        self.world_job_group = None
+        self.process_group = None
+
+        if self.world_size % cfg.num_gpus != 0:
+            raise ValueError(f"World size {self.world_size} is not divisible by --num_gpus {cfg.num_gpus}")
+        run_id = uuid.uuid4().hex
+        if self.world_size > 1:
+            import torch.distributed as dist
+            from megatron.core import parallel_state
+
+            from cosmos_transfer1.utils import distributed
+
+            distributed.init()
+            parallel_state.initialize_model_parallel(context_parallel_size=cfg.num_gpus)
+            self.rank = dist.get_rank()
+            self.process_group = parallel_state.get_context_parallel_group()
+            self.group_ranks = parallel_state.get_context_parallel_global_ranks()
+
+            # Jobs are handed out on CPU groups so that waiting for the next job does not hold NCCL.
+            world_job_group = dist.new_group(backend="gloo")
+            all_group_ranks = [None] * self.world_size
+            dist.all_gather_object(all_group_ranks, list(self.group_ranks), group=world_job_group)
+            for ranks in sorted(set(tuple(ranks) for ranks in all_group_ranks)):
+                group = dist.new_group(ranks=list(ranks), backend="gloo")  # every rank has to create every group
+                if self.rank in ranks:
+                    self.job_group = group
+            objects = [run_id]
+            dist.broadcast_object_list(objects, src=0, group=world_job_group)
+            run_id = objects[0]
+            self.world_job_group = world_job_group
+        self.is_group_leader = self.rank == self.group_ranks[0]
+        self.claim_dir = os.path.join(cfg.video_save_folder, CLAIM_FOLDER, run_id)
+
+        self.pipeline = build_pipeline(cfg, self.control_inputs)
+        self.preprocessors = Preprocessors(cache=self.pipeline.control_cache)
+        if cfg.num_gpus > 1:
+            self.pipeline.model.net.enable_context_parallel(self.process_group)
+
+    def _output_paths(self, index: int) -> Dict[str, str]:
+        folder = self.cfg.video_save_folder
+        return {
+            "video": os.path.join(folder, f"{index}.mp4"),
+            "prompt": os.path.join(folder, f"{index}.txt"),
+            "summary": os.path.join(folder, f"{index}.json"),
+            "controls": os.path.join(folder, f"{index}_controls"),
+        }
+
+    def _is_done(self, index: int) -> bool:
+        paths = self._output_paths(index)
+        if os.path.exists(paths["video"]):
+            return True
+        if os.path.exists(paths["summary"]):
+            with open(paths["summary"], "r") as f:
+                return json.load(f).get("status") == "blocked"
+        return False
+
+    def _claim(self, index: int) -> bool:
+        """Atomically claim a job for this group. Returns False if another group claimed it first."""
+        try:
+            fd = os.open(os.path.join(self.claim_dir, str(index)), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.write(fd, str(self.rank).encode("utf-8"))
+        os.close(fd)
+        return True
+
+    def _next_job(self, prompts: list) -> Optional[int]:
+        """Claim the next pending job on the group leader and hand it to the other ranks of the group."""
+        index = None
+        if self.is_group_leader:
+            while self._cursor < len(prompts):
+                candidate = self._cursor
+                self._cursor += 1
+                if not self._is_done(candidate) and self._claim(candidate):
+                    index = candidate
+                    break
+        if self.job_group is not None:
+            import torch.distributed as dist
+
+            objects = [index]
+            dist.broadcast_object_list(objects, src=self.group_ranks[0], group=self.job_group)
+            index = objects[0]
+        return index
+
+    def run_job(self, index: int, input_dict: Dict[str, Any]) -> Dict[str, Any]:
+        """Run preprocessing and generation for one prompt and save its outputs on the group leader."""
+        paths = self._output_paths(index)
+        summary = {
+            "index": index,
+            "prompt": input_dict.get("prompt", None),
+            "visual_input": input_dict.get("visual_input", None),
+            "video_path": paths["video"],
+            "rank": self.rank,
+            "status": "running",
+            "error": None,
+            "started_at": time.time(),
+        }
+        log.info(f"Rank {self.rank} running job {index}", rank0_only=False)
+        try:
+            # Reset the seed per job so that results do not depend on which group runs a job
+            misc.set_random_seed(self.cfg.seed)
+            control_inputs = copy.deepcopy(self.control_inputs)
+            os.makedirs(paths["controls"], exist_ok=True)
+
+            # if control inputs are not provided, run respective preprocessor
+            self.preprocessors(summary["visual_input"], summary["prompt"], control_inputs, paths["controls"])
+
+            generated_output = self.pipeline.generate(
+                prompt=summary["prompt"],
+                video_path=summary["visual_input"],
+                negative_prompt=self.cfg.negative_prompt,
+                control_inputs=control_inputs,
+            )
+            if generated_output is None:
+                log.critical(f"Guardrail blocked generation for job {index}.", rank0_only=False)
+                summary["status"] = "blocked"
+            else:
+                video, prompt = generated_output
+                if self.is_group_leader:
+                    save_video(
+                        video=video,
+                        fps=self.cfg.fps,
+                        H=video.shape[1],
+                        W=video.shape[2],
+                        video_save_quality=5,
+                        video_save_path=paths["video"],
+                    )
+                    with open(paths["prompt"], "wb") as f:
+                        f.write(prompt.encode("utf-8"))
+                    log.info(f"Saved video to {paths['video']}", rank0_only=False)
+                summary["status"] = "succeeded"
+        except Exception as e:
+            log.error(f"Job {index} failed: {e}", rank0_only=False)
+            summary["status"] = "failed"
+            summary["error"] = str(e)
+        summary["finished_at"] = time.time()
+        summary["duration"] = summary["finished_at"] - summary["started_at"]
+
+        if self.is_group_leader:
+            with open(paths["summary"], "w") as f:
+                json.dump(summary, f, indent=4)
+        return summary
+
+    def _write_summary(self, num_prompts: int) -> None:
+        summaries = []
+        for index in range(num_prompts):
+            path = self._output_paths(index)["summary"]
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    summaries.append(json.load(f))
+        summary_path = os.path.join(self.cfg.video_save_folder, SUMMARY_FILE)
+        with open(summary_path, "w") as f:
+            for summary in summaries:
+                f.write(json.dumps(summary) + "\n")
+        num_succeeded = sum(summary["status"] == "succeeded" for summary in summaries)
+        log.info(f"{num_succeeded}/{num_prompts} jobs succeeded, summary saved to {summary_path}")
+
+    def run(self) -> None:
+        """Process all prompts of `cfg.batch_input_path` and write the batch summary."""
+        log.info(f"Reading batch inputs from path: {self.cfg.batch_input_path}")
+        prompts = read_prompts_from_file(self.cfg.batch_input_path)
+        os.makedirs(self.claim_dir, exist_ok=True)
+        self._cursor = 0
+
+        try:
+            while True:
+                index = self._next_job(prompts)
+                if index is None:
+                    break
+                self.run_job(index, prompts[index])
+
+            if self.world_size > 1:
+                import torch.distributed as dist
+
+                dist.barrier(group=self.world_job_group)
+            if self.rank == 0:
+                self._write_summary(len(prompts))
+        finally:
+            if self.world_size > 1:
+                import torch.distributed as dist
+                from megatron.core import parallel_state
+
+                parallel_state.destroy_model_parallel()
+                dist.destroy_process_group()
+
+
+def parse_batch_arguments():
+    parser = get_parser()
+    parser.description = "Data-parallel batch control to world generation"
+    args, control_inputs = parse_arguments(parser)
+    if not args.batch_input_path:
+        parser.error("--batch_input_path is required in batch mode")
+    return args, control_inputs
+
+
+if __name__ == "__main__":
+    args, control_inputs = parse_batch_arguments()
+    BatchRunner(args, control_inputs).run()
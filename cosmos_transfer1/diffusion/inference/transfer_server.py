@@ -0,0 +1,325 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Long-lived server mode for the control-to-world transfer pipeline.
+
+The pipeline (base model, ControlNet branches, T5, tokenizer and guardrails) is loaded once at startup. Jobs are then
+submitted over a local HTTP endpoint and processed one at a time, so per-job latency is only preprocessing + sampling.
+
+Endpoints:
+    POST /jobs          Submit a job. Body is a controlnet spec in the same format as the `--controlnet_specs` JSON
+                        file (hint keys plus optional `prompt`, `negative_prompt`, `input_video_path`,
+                        `video_save_name`). Returns the job record.
+    GET  /jobs          List all job records.
+    GET  /jobs/<job_id> Return a single job record (status, result paths, error).
+    GET  /health        Liveness check.
+
+The hint keys of every job must match the ones given in `--controlnet_specs` at startup, since those decide which
+ControlNet branches are loaded. Per-hint settings such as `control_weight` or `input_control` may differ per job.
+"""
+
+import copy
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from cosmos_transfer1.diffusion.inference.inference_utils import parse_controlnet_specs, validate_controlnet_specs
+from cosmos_transfer1.diffusion.inference.preprocessors import Preprocessors
+from cosmos_transfer1.diffusion.inference.transfer import build_pipeline, get_parser, parse_arguments
+from cosmos_transfer1.utils import log, misc
+from cosmos_transfer1.utils.io import save_video
+
+# Interval at which rank 0 wakes idle context-parallel workers, well below the process group timeout.
+IDLE_HEARTBEAT_SECONDS = 60
+
+
+@dataclass
+class TransferJob:
+    job_id: str
+    prompt: str
+    negative_prompt: str
+    input_video_path: str
+    control_inputs: Dict[str, Any]
+    video_save_path: str
+    prompt_save_path: str
+    status: str = "queued"  # queued | running | succeeded | blocked | failed
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class JobQueue:
+    """Thread-safe FIFO of transfer jobs that keeps every submitted job for status queries."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._jobs: Dict[str, TransferJob] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job: TransferJob) -> TransferJob:
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._queue.put(job.job_id)
+        return job
+
+    def get(self, job_id: str) -> Optional[TransferJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> list[Dict[str, Any]]:
+        with self._lock:
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def next(self, timeout: Optional[float] = None) -> Optional[TransferJob]:
+        try:
+            job_id = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return self.get(job_id)
+
+    def update(self, job: TransferJob, **kwargs) -> None:
+        with self._lock:
+            for key, value in kwargs.items():
+                setattr(job, key, value)
+
+
+class TransferServer:
+    """Holds a loaded `DiffusionControl2WorldGenerationPipeline` and runs queued jobs against it.
+
+    Args:
+        cfg (argparse.Namespace): Configuration namespace returned by `parse_arguments`.
+        control_inputs (dict): Controlnet specs given at startup. They decide which ControlNet branches are loaded.
+    """
+
+    def __init__(self, cfg, control_inputs: Dict[str, Any]):
+        self.cfg = cfg
+        self.control_inputs = validate_controlnet_specs(cfg, control_inputs)
+        self.jobs = JobQueue()
+        self.device_rank = 0
+        self.process_group = None
+        self.job_group = None
+
+        if cfg.num_gpus > 1:
+            import torch.distributed as dist
+            from megatron.core import parallel_state
+
+            from cosmos_transfer1.utils import distributed
+
+            distributed.init()
+            parallel_state.initialize_model_parallel(context_parallel_size=cfg.num_gpus)
+            self.process_group = parallel_state.get_context_parallel_group()
+            self.device_rank = distributed.get_rank(self.process_group)
+            # Jobs are handed from rank 0 to the other ranks on a CPU group so that idle waits do not hold NCCL.
+            self.job_group = dist.new_group(backend="gloo")
+
+        self.pipeline = build_pipeline(cfg, self.control_inputs)
+        self.preprocessors = Preprocessors(cache=self.pipeline.control_cache)
+        if cfg.num_gpus > 1:
+            self.pipeline.model.net.enable_context_parallel(self.process_group)
+
+    def create_job(self, request: Dict[str, Any]) -> TransferJob:
+        """Validate a job request and turn it into a `TransferJob`. Raises ValueError on invalid requests."""
+        control_inputs, args = parse_controlnet_specs(request)
+        if set(control_inputs) != set(self.control_inputs):
+            raise ValueError(
+                f"Job hint keys {sorted(control_inputs)} do not match the loaded controlnets {sorted(self.control_inputs)}"
+            )
+
+        job_cfg = copy.copy(self.cfg)
+        for key in ("prompt", "negative_prompt", "input_video_path"):
+            if key in args:
+                setattr(job_cfg, key, args[key])
+        control_inputs = validate_controlnet_specs(job_cfg, control_inputs)
+        for hint_key, spec in control_inputs.items():
+            if spec["ckpt_path"] != self.control_inputs[hint_key]["ckpt_path"]:
+                raise ValueError(
+                    f"Job ckpt_path {spec['ckpt_path']} for {hint_key} does not match the loaded "
+                    f"{self.control_inputs[hint_key]['ckpt_path']}"
+                )
+
+        job_id = uuid.uuid4().hex
+        video_save_name = str(args.get("video_save_name", self.cfg.video_save_name))
+        # Outputs must stay inside the job folder
+        if (
+            not video_save_name
+            or video_save_name in (".", "..")
+            or os.path.basename(video_save_name) != video_save_name
+            or (os.path.altsep is not None and os.path.altsep in video_save_name)
+        ):
+            raise ValueError(f"Invalid video_save_name {video_save_name!r}, it must be a file name without a path")
+        job_folder = os.path.join(self.cfg.video_save_folder, job_id)
+        return TransferJob(
+            job_id=job_id,
+            prompt=job_cfg.prompt,
+            negative_prompt=job_cfg.negative_prompt,
+            input_video_path=job_cfg.input_video_path,
+            control_inputs=control_inputs,
+            video_save_path=os.path.join(job_folder, f"{video_save_name}.mp4"),
+            prompt_save_path=os.path.join(job_folder, f"{video_save_name}.txt"),
+        )
+
+    def run_job(self, job: TransferJob) -> None:
+        """Run preprocessing and generation for one job and save its outputs on rank 0."""
+        self.jobs.update(job, status="running", started_at=time.time())
+        log.info(f"Running job {job.job_id}")
+        try:
+            # Reset the seed per job so that results do not depend on the order in which jobs arrive.
+            misc.set_random_seed(self.cfg.seed)
+            control_inputs = copy.deepcopy(job.control_inputs)
+            job_folder = os.path.dirname(job.video_save_path)
+            os.makedirs(job_folder, exist_ok=True)
+
+            # if control inputs are not provided, run respective preprocessor
+            self.preprocessors(job.input_video_path, job.prompt, control_inputs, job_folder)
+
+            generated_output = self.pipeline.generate(
+                prompt=job.prompt,
+                video_path=job.input_video_path,
+                negative_prompt=job.negative_prompt,
+                control_inputs=control_inputs,
+            )
+            if generated_output is None:
+                log.critical(f"Guardrail blocked generation for job {job.job_id}.")
+                self.jobs.update(job, status="blocked", error="Guardrail blocked generation.")
+                return
+            video, prompt = generated_output
+
+            if self.device_rank == 0:
+                save_video(
+                    video=video,
+                    fps=self.cfg.fps,
+                    H=video.shape[1],
+                    W=video.shape[2],
+                    video_save_quality=5,
+                    video_save_path=job.video_save_path,
+                )
+                with open(job.prompt_save_path, "wb") as f:
+                    f.write(prompt.encode("utf-8"))
+                log.info(f"Saved video to {job.video_save_path}")
+                log.info(f"Saved prompt to {job.prompt_save_path}")
+            self.jobs.update(job, status="succeeded")
+        except Exception as e:
+            log.error(f"Job {job.job_id} failed: {e}")
+            self.jobs.update(job, status="failed", error=str(e))
+        finally:
+            self.jobs.update(job, finished_at=time.time())
+
+    def _broadcast_job(self, job: Optional[TransferJob]) -> Optional[TransferJob]:
+        if self.job_group is None:
+            return job
+        import torch.distributed as dist
+
+        objects = [job]
+        dist.broadcast_object_list(objects, src=0, group=self.job_group)
+        return objects[0]
+
+    def serve_forever(self, host: str, port: int) -> None:
+        """Start the HTTP endpoint on rank 0 and process jobs on all ranks until interrupted."""
+        httpd = None
+        if self.device_rank == 0:
+            httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            log.info(f"Transfer server listening on http://{host}:{port}")
+
+        # Sampling stays on the main thread, where autograd is disabled and the CUDA context was set up.
+        try:
+            while True:
+                job = self.jobs.next(timeout=IDLE_HEARTBEAT_SECONDS) if self.device_rank == 0 else None
+                job = self._broadcast_job(job)
+                if job is not None:
+                    self.run_job(job)
+        except KeyboardInterrupt:
+            log.info("Shutting down transfer server.")
+        finally:
+            if httpd is not None:
+                httpd.shutdown()
+            if self.cfg.num_gpus > 1:
+                import torch.distributed as dist
+                from megatron.core import parallel_state
+
+                parallel_state.destroy_model_parallel()
+                dist.destroy_process_group()
+
+
+def _make_handler(server: TransferServer) -> type:
+    class TransferRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, code: int, payload: Any) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.rstrip("/")
+            if path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif path == "/jobs":
+                self._send_json(200, server.jobs.list_jobs())
+            elif path.startswith("/jobs/"):
+                job = server.jobs.get(path[len("/jobs/") :])
+                if job is None:
+                    self._send_json(404, {"error": "job not found"})
+                else:
+                    self._send_json(200, job.to_dict())
+            else:
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(request, dict):
+                    raise ValueError("Job request must be a JSON object")
+                job = server.create_job(request)
+            except (ValueError, KeyError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            server.jobs.submit(job)
+            log.info(f"Queued job {job.job_id}")
+            self._send_json(202, job.to_dict())
+
+        def log_message(self, format, *args):
+            log.debug(f"{self.address_string()} - {format % args}")
+
+    return TransferRequestHandler
+
+
+def parse_server_arguments():
+    parser = get_parser()
+    parser.description = "Control to world generation server"
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host address the job endpoint binds to")
+    parser.add_argument("--port", type=int, default=8000, help="Port the job endpoint listens on")
+    return parse_arguments(parser)
+
+
+if __name__ == "__main__":
+    args, control_inputs = parse_server_arguments()
+    server = TransferServer(args, control_inputs)
+    server.serve_forever(args.host, args.port)
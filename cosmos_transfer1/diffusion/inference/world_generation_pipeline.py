@@ -13,7 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Optional
+import os
+from typing import Callable, Dict, Optional
 
 import numpy as np
 import torch
@@ -31,22 +32,30 @@ from cosmos_transfer1.checkpoints import (
     UPSCALER_CONTROLNET_7B_CHECKPOINT_PATH,
     VIS2WORLD_CONTROLNET_7B_CHECKPOINT_PATH,
 )
+from cosmos_transfer1.diffusion.inference.control_cache import ControlInputCache, LatentCache
 from cosmos_transfer1.diffusion.inference.inference_utils import (
+    CtrlClipStream,
     detect_aspect_ratio,
     generate_world_from_control,
-    get_ctrl_batch,
     get_upscale_size,
     get_video_batch,
+    load_ctrl_encoder,
     load_model_by_config,
     load_network_model,
     load_tokenizer_model,
     merge_patches_into_video,
     non_strict_load_model,
+    pin_memory,
+    prefetch_iterator,
     split_video_into_patches,
 )
 from cosmos_transfer1.diffusion.model.model_ctrl import VideoDiffusionModelWithCtrl, VideoDiffusionT2VModelWithCtrl
+from cosmos_transfer1.diffusion.module.attention import clear_kv_cache
+from cosmos_transfer1.diffusion.networks.general_dit_ctrl_enc import downsample_control_weight
 from cosmos_transfer1.utils import log
 from cosmos_transfer1.utils.base_world_generation_pipeline import BaseWorldGenerationPipeline
+from cosmos_transfer1.utils.checkpoint import load_checkpoint
+from cosmos_transfer1.utils.disk_cache import file_digest
 
 MODEL_NAME_DICT = {
     BASE_7B_CHECKPOINT_PATH: "CTRL_7Bv1pt3_lvg_tp_121frames_control_input_edge_block3",
@@ -71,6 +80,9 @@ MODEL_CLASS_DICT = {
     LIDAR2WORLD_CONTROLNET_7B_CHECKPOINT_PATH: VideoDiffusionT2VModelWithCtrl,
 }
 
+# Max abs difference between a cached and a freshly encoded latent that --validate_latent_cache accepts
+LATENT_CACHE_TOLERANCE = 1e-2
+
 
 class DiffusionControl2WorldGenerationPipeline(BaseWorldGenerationPipeline):
     def __init__(
@@ -94,6 +106,19 @@ class DiffusionControl2WorldGenerationPipeline(BaseWorldGenerationPipeline):
         sigma_max: float = 70.0,
         blur_strength: str = "medium",
         canny_threshold: str = "medium",
+        batch_cfg: bool = False,
+        patch_batch_size: int = 1,
+        max_dec_batch_size: int = 0,
+        float_condition: bool = False,
+        control_cache_dir: Optional[str] = None,
+        control_cache_size_gb: float = 50.0,
+        latent_cache_dir: Optional[str] = None,
+        latent_cache_size_gb: float = 50.0,
+        validate_latent_cache: bool = False,
+        text_embedding_cache_dir: Optional[str] = None,
+        stream_text_encoder: bool = False,
+        text_guardrail_cache_dir: Optional[str] = None,
+        guardrail_frame_stride: int = 1,
     ):
         """Initialize diffusion world generation pipeline.
 
@@ -113,12 +138,48 @@ class DiffusionControl2WorldGenerationPipeline(BaseWorldGenerationPipeline):
             num_video_frames: Number of frames to generate
             seed: Random seed for sampling
             num_input_frames: Number of latent conditions
+            batch_cfg: Whether to run the conditional and unconditional CFG branches in a single batched forward
+            patch_batch_size: Max number of spatial patches of the upscaler stacked along the batch dimension per
+                network forward. Halved automatically when a forward runs out of GPU memory
+            max_dec_batch_size: Max number of spatial patches of the upscaler decoded per tokenizer call. Patches are
+                then stitched and resized on the GPU and only the final frames are copied to host. 0 decodes the
+                patches one by one and stitches them on CPU
+            float_condition: Whether to condition each clip on the previous clip's decoded frames in float precision
+                instead of their uint8-quantized values
+            control_cache_dir: Directory of the on-disk cache of preprocessed control inputs. None disables the cache
+            control_cache_size_gb: Size above which the least recently used control cache entries are evicted
+            latent_cache_dir: Directory of the on-disk cache of tokenizer latents of the input video and control
+                inputs. None disables the cache
+            latent_cache_size_gb: Size above which the least recently used latent cache entries are evicted
+            validate_latent_cache: Whether to re-encode on every latent cache hit and report the difference to the
+                cached latent. The fresh latent is used for generation
+            text_embedding_cache_dir: Directory of the on-disk cache of T5 prompt embeddings. None disables the cache
+            stream_text_encoder: Whether to stream the T5 encoder blocks from pinned host memory to the GPU block by
+                block instead of keeping the whole encoder on the GPU
+            text_guardrail_cache_dir: Directory of the on-disk cache of Blocklist and Aegis decisions on prompts. None
+                disables the cache
+            guardrail_frame_stride: Classify every guardrail_frame_stride-th generated frame with the video content
+                safety filter. 1 classifies every frame
         """
         self.num_input_frames = num_input_frames
         self.control_inputs = control_inputs
         self.sigma_max = sigma_max
         self.blur_strength = blur_strength
         self.canny_threshold = canny_threshold
+        self.batch_cfg = batch_cfg
+        self.patch_batch_size = patch_batch_size
+        self.max_dec_batch_size = max_dec_batch_size
+        self.float_condition = float_condition
+        self.control_cache = (
+            ControlInputCache(control_cache_dir, max_size_gb=control_cache_size_gb) if control_cache_dir else None
+        )
+        self.latent_cache = (
+            LatentCache(latent_cache_dir, max_size_gb=latent_cache_size_gb) if latent_cache_dir else None
+        )
+        self.validate_latent_cache = validate_latent_cache
+        self._tokenizer_digest = None
+        # Side stream of the device-to-host copies of generated frames, created on first use
+        self._copy_stream = None
 
         self.model_name = MODEL_NAME_DICT[checkpoint_name]
         self.model_class = MODEL_CLASS_DICT[checkpoint_name]
@@ -138,6 +199,10 @@ class DiffusionControl2WorldGenerationPipeline(BaseWorldGenerationPipeline):
             offload_tokenizer=offload_tokenizer,
             offload_text_encoder_model=offload_text_encoder_model,
             offload_guardrail_models=offload_guardrail_models,
+            text_embedding_cache_dir=text_embedding_cache_dir,
+            stream_text_encoder=stream_text_encoder,
+            text_guardrail_cache_dir=text_guardrail_cache_dir,
+            guardrail_frame_stride=guardrail_frame_stride,
         )
 
     def _load_model(self):
@@ -152,24 +217,14 @@ class DiffusionControl2WorldGenerationPipeline(BaseWorldGenerationPipeline):
     def _load_network(self):
         load_network_model(self.model, f"{self.checkpoint_dir}/{self.checkpoint_name}")
         if len(self.control_inputs) > 1:
+            # Only the encoder of each control is built; the base DiT and tokenizer of self.model are shared
             hint_encoders = torch.nn.ModuleList([])
             for _, spec in self.control_inputs.items():
-                model = load_model_by_config(
-                    config_job_name=self.model_name,
-                    config_file="cosmos_transfer1/diffusion/config/transfer/config.py",
-                    model_class=self.model_class,
-                    base_checkpoint_dir=self.checkpoint_dir,
-                )
-                load_network_model(model, spec["ckpt_path"])
-                hint_encoders.append(model.model.net)
-                del model
-                torch.cuda.empty_cache()
+                hint_encoders.append(load_ctrl_encoder(self.model, spec["ckpt_path"]))
             self.model.hint_encoders = hint_encoders
         else:
             for _, spec in self.control_inputs.items():
-                net_state_dict = torch.load(
-                    spec["ckpt_path"], map_location="cpu", weights_only=False
-                )  # , weights_only=True)
+                net_state_dict = load_checkpoint(spec["ckpt_path"])
                 non_strict_load_model(self.model.model, net_state_dict)
 
     def _load_tokenizer(self):
@@ -185,14 +240,29 @@ class DiffusionControl2WorldGenerationPipeline(BaseWorldGenerationPipeline):
             np.ndarray: Decoded video frames as uint8 numpy array [T, H, W, C]
                         with values in range [0, 255]
         """
+        video = self._decode_to_float(sample)
+        return (video[0].permute(1, 2, 3, 0) * 255).to(torch.uint8).cpu().numpy()
+
+    def _decode_to_float(self, sample: torch.Tensor) -> torch.Tensor:
+        """Decode latent samples to video frames [1, C, T, H, W] in range [0, 1].
+
+        The frames are left on the device the decoder produced them on. A batch of several samples holds the spatial
+        patches of the upscaler, which are decoded, stitched and resized to the upscaled resolution. With
+        `max_dec_batch_size` set, up to that many patches are decoded per call and stitching and resizing stay on the
+        GPU; otherwise each patch is decoded on its own and moved to CPU before stitching.
+        """
         # Decode video
         if sample.shape[0] == 1:
             video = (1.0 + self.model.decode(sample)).clamp(0, 2) / 2  # [B, 3, T, H, W]
         else:
-            # Do decoding for each batch sequentially to prevent OOM.
             samples = []
-            for sample_i in sample:
-                samples += [self.model.decode(sample_i.unsqueeze(0)).cpu()]
+            if self.max_dec_batch_size > 0:
+                for i in range(0, sample.shape[0], self.max_dec_batch_size):
+                    samples += [self.model.decode(sample[i : i + self.max_dec_batch_size])]
+            else:
+                # Do decoding for each batch sequentially to prevent OOM.
+                for sample_i in sample:
+                    samples += [self.model.decode(sample_i.unsqueeze(0)).cpu()]
             samples = (torch.cat(samples) + 1).clamp(0, 2) / 2
 
             # Stitch the patches together to form the final video.
@@ -211,10 +281,53 @@ class DiffusionControl2WorldGenerationPipeline(BaseWorldGenerationPipeline):
             video = torch.nn.functional.interpolate(video[0], size=(patch_h * 3, patch_w * 3), mode="bicubic")[None]
             video = video.clamp(0, 1)
 
-        video = (video[0].permute(1, 2, 3, 0) * 255).to(torch.uint8).cpu().numpy()
-
         return video
 
+    def _get_tokenizer_digest(self) -> str:
+        """Digest of the tokenizer checkpoint files, so that cached latents are invalidated when they change."""
+        if self._tokenizer_digest is None:
+            tokenizer_dir = f"{self.checkpoint_dir}/{COSMOS_TOKENIZER_CHECKPOINT}"
+            files = sorted(f for f in os.listdir(tokenizer_dir) if os.path.isfile(os.path.join(tokenizer_dir, f)))
+            self._tokenizer_digest = LatentCache.make_key(
+                **{f: file_digest(os.path.join(tokenizer_dir, f)) for f in files if not f.startswith(".")}
+            )
+        return self._tokenizer_digest
+
+    def _encode_with_cache(
+        self, key_fields: Optional[Dict], name: str, encode_fn: Callable[[], torch.Tensor]
+    ) -> torch.Tensor:
+        """Encode a clip input with the tokenizer, reusing the latent from the latent cache if there is one.
+
+        Args:
+            key_fields: Fields that identify the clip inputs, see `CtrlClipStream.clip_key_fields`. None skips the cache
+            name: Name of the encoded input, part of the cache key
+            encode_fn: Function that encodes the input and returns its latent
+
+        Returns:
+            torch.Tensor: Latent of the input
+        """
+        if key_fields is None:
+            return encode_fn()
+        key = self.latent_cache.make_key(
+            name=name, tokenizer=self._get_tokenizer_digest(), model=self.model_name, **key_fields
+        )
+        latent = self.latent_cache.get_tensor(key)
+        if latent is None:
+            latent = encode_fn()
+            self.latent_cache.put_tensor(key, latent)
+        elif self.validate_latent_cache:
+            fresh_latent = encode_fn()
+            max_diff = (latent.float() - fresh_latent.float()).abs().max().item()
+            if latent.shape != fresh_latent.shape or max_diff > LATENT_CACHE_TOLERANCE:
+                log.warning(
+                    f"Cached {name} latent differs from a fresh encode: max abs diff {max_diff:.4g}, "
+                    f"shapes {tuple(latent.shape)} / {tuple(fresh_latent.shape)}"
+                )
+            else:
+                log.info(f"Cached {name} latent matches a fresh encode (max abs diff {max_diff:.4g})")
+            latent = fresh_latent
+        return latent
+
     def _run_model_with_offload(
         self,
         prompt_embedding: torch.Tensor,
@@ -281,114 +394,159 @@ class DiffusionControl2WorldGenerationPipeline(BaseWorldGenerationPipeline):
             fps=self.fps,
             num_video_frames=self.num_video_frames,
         )
-        data_batch = get_ctrl_batch(
+        # Inputs are decoded and preprocessed clip by clip, so host memory does not grow with the video length
+        clip_stream = CtrlClipStream(
             self.model,
             data_batch,
             self.num_video_frames,
+            self.num_input_frames,
             video_path,
             control_inputs,
             self.blur_strength,
             self.canny_threshold,
+            cache=self.control_cache,
         )
 
         hint_key = data_batch["hint_key"]
-        input_video = data_batch["input_video"]
-        control_input = data_batch[hint_key]
         control_weight = data_batch["control_weight"]
-        num_new_generated_frames = self.num_video_frames - self.num_input_frames
-        B, C, T, H, W = control_input.shape
-        if (T - self.num_input_frames) % num_new_generated_frames != 0:  # pad duplicate frames at the end
-            pad_t = num_new_generated_frames - ((T - self.num_input_frames) % num_new_generated_frames)
-            pad_frames = control_input[:, :, -1:].repeat(1, 1, pad_t, 1, 1)
-            control_input = torch.cat([control_input, pad_frames], dim=2)
-            if input_video is not None:
-                pad_video = input_video[:, :, -1:].repeat(1, 1, pad_t, 1, 1)
-                input_video = torch.cat([input_video, pad_video], dim=2)
-            num_total_frames_with_padding = control_input.shape[2]
-            if (
-                isinstance(control_weight, torch.Tensor)
-                and control_weight.ndim > 5
-                and num_total_frames_with_padding > control_weight.shape[3]
-            ):
-                pad_t = num_total_frames_with_padding - control_weight.shape[3]
-                pad_weight = control_weight[:, :, :, -1:].repeat(1, 1, 1, pad_t, 1, 1)
-                control_weight = torch.cat([control_weight, pad_weight], dim=3)
-        else:
-            num_total_frames_with_padding = T
-        N_clip = (num_total_frames_with_padding - self.num_input_frames) // num_new_generated_frames
+        H, W = clip_stream.H, clip_stream.W
 
+        # Decoding and preprocessing of the next clip run in a background thread while the current clip is sampled.
+        # Decoded frames stay on the GPU as the next condition and are copied to the host on a side stream.
+        clips = prefetch_iterator(
+            (start, end, pin_memory(input_video), pin_memory(control_input))
+            for start, end, input_video, control_input in clip_stream
+        )
         video = []
-        for i_clip in tqdm(range(N_clip)):
-            data_batch_i = {k: v for k, v in data_batch.items()}
-            start_frame = num_new_generated_frames * i_clip
-            end_frame = num_new_generated_frames * (i_clip + 1) + self.num_input_frames
-
-            if input_video is not None:
-                x_sigma_max = []
-                for b in range(B):
-                    input_frames = input_video[b : b + 1, :, start_frame:end_frame].cuda()
-                    x0 = self.model.encode(input_frames).contiguous()
-                    x_sigma_max.append(self.model.get_x_from_clean(x0, self.sigma_max, seed=(self.seed + i_clip)))
-                x_sigma_max = torch.cat(x_sigma_max)
-            else:
-                x_sigma_max = None
-
-            data_batch_i[hint_key] = control_input[:, :, start_frame:end_frame].cuda()
-            latent_hint = []
-            for b in range(B):
-                data_batch_p = {k: v for k, v in data_batch_i.items()}
-                data_batch_p[hint_key] = data_batch_i[hint_key][b : b + 1]
-                if len(control_inputs) > 1:
-                    latent_hint_i = []
-                    for idx in range(0, data_batch_p[hint_key].size(1), 3):
-                        x_rgb = data_batch_p[hint_key][:, idx : idx + 3]
-                        latent_hint_i.append(self.model.encode(x_rgb))
-                    latent_hint.append(torch.cat(latent_hint_i).unsqueeze(0))
+        try:
+            for i_clip, (start_frame, end_frame, input_video, control_input) in enumerate(
+                tqdm(clips, total=len(clip_stream))
+            ):
+                data_batch_i = {k: v for k, v in data_batch.items()}
+                B = control_input.shape[0]
+
+                key_fields = None
+                if self.latent_cache is not None:
+                    key_fields = clip_stream.clip_key_fields(start_frame, end_frame)
+
+                if input_video is not None:
+
+                    def encode_input_video():
+                        return torch.cat(
+                            [
+                                self.model.encode(input_video[b : b + 1].cuda(non_blocking=True)).contiguous()
+                                for b in range(B)
+                            ]
+                        )
+
+                    x0 = self._encode_with_cache(key_fields, "input_video", encode_input_video)
+                    x_sigma_max = torch.cat(
+                        [
+                            self.model.get_x_from_clean(x0[b : b + 1], self.sigma_max, seed=(self.seed + i_clip))
+                            for b in range(B)
+                        ]
+                    )
                 else:
-                    latent_hint.append(self.model.encode_latent(data_batch_p))
-            data_batch_i["latent_hint"] = latent_hint = torch.cat(latent_hint)
-
-            if isinstance(control_weight, torch.Tensor) and control_weight.ndim > 4:
-                data_batch_i["control_weight"] = control_weight[..., start_frame:end_frame, :, :].cuda()
-
-            if i_clip == 0:
-                num_input_frames = 0
-                latent_tmp = latent_hint if latent_hint.ndim == 5 else latent_hint[:, 0]
-                condition_latent = torch.zeros_like(latent_tmp)
-            else:
-                num_input_frames = self.num_input_frames
-                prev_frames = split_video_into_patches(prev_frames, control_input.shape[-2], control_input.shape[-1])
-                condition_latent = []
-                for b in range(B):
-                    input_frames = prev_frames[b : b + 1].cuda().bfloat16() / 255.0 * 2 - 1
-                    condition_latent += [self.model.encode(input_frames).contiguous()]
-                condition_latent = torch.cat(condition_latent)
-
-            # Generate video frames
-            latents = generate_world_from_control(
-                model=self.model,
-                state_shape=self.model.state_shape,
-                is_negative_prompt=True,
-                data_batch=data_batch_i,
-                guidance=self.guidance,
-                num_steps=self.num_steps,
-                seed=(self.seed + i_clip),
-                condition_latent=condition_latent,
-                num_input_frames=num_input_frames,
-                sigma_max=self.sigma_max if x_sigma_max is not None else None,
-                x_sigma_max=x_sigma_max,
-            )
-            frames = self._run_tokenizer_decoding(latents)
-            frames = torch.from_numpy(frames).permute(3, 0, 1, 2)[None]
-
-            if i_clip == 0:
-                video.append(frames)
-            else:
-                video.append(frames[:, :, self.num_input_frames :])
-            prev_frames = torch.zeros_like(frames)
-            prev_frames[:, :, : self.num_input_frames] = frames[:, :, -self.num_input_frames :]
-
-        video = torch.cat(video, dim=2)[:, :, :T]
+                    x_sigma_max = None
+
+                data_batch_i[hint_key] = control_input.cuda(non_blocking=True)
+
+                def encode_control_input():
+                    latent_hint = []
+                    for b in range(B):
+                        data_batch_p = {k: v for k, v in data_batch_i.items()}
+                        data_batch_p[hint_key] = data_batch_i[hint_key][b : b + 1]
+                        if len(control_inputs) > 1:
+                            latent_hint_i = []
+                            for idx in range(0, data_batch_p[hint_key].size(1), 3):
+                                x_rgb = data_batch_p[hint_key][:, idx : idx + 3]
+                                latent_hint_i.append(self.model.encode(x_rgb))
+                            latent_hint.append(torch.cat(latent_hint_i).unsqueeze(0))
+                        else:
+                            latent_hint.append(self.model.encode_latent(data_batch_p))
+                    return torch.cat(latent_hint)
+
+                latent_hint = self._encode_with_cache(key_fields, "control_input", encode_control_input)
+                data_batch_i["latent_hint"] = latent_hint
+
+                if isinstance(control_weight, torch.Tensor) and control_weight.ndim > 4:
+                    # Bring spatial-temporal weight maps to the token grid once per clip instead of in every DiT forward
+                    data_batch_i["control_weight"] = downsample_control_weight(
+                        control_weight[..., start_frame:end_frame, :, :].cuda(),
+                        self.model.state_shape[1] // self.model.net.patch_temporal,
+                        latent_hint.shape[-2] // self.model.net.patch_spatial,
+                        latent_hint.shape[-1] // self.model.net.patch_spatial,
+                    )
+
+                if i_clip == 0:
+                    num_input_frames = 0
+                    latent_tmp = latent_hint if latent_hint.ndim == 5 else latent_hint[:, 0]
+                    condition_latent = torch.zeros_like(latent_tmp)
+                else:
+                    num_input_frames = self.num_input_frames
+                    prev_frames = split_video_into_patches(prev_frames, H, W)
+                    condition_latent = []
+                    for b in range(B):
+                        input_frames = prev_frames[b : b + 1].cuda().bfloat16()
+                        if not self.float_condition:
+                            input_frames = input_frames / 255.0 * 2 - 1
+                        condition_latent += [self.model.encode(input_frames).contiguous()]
+                    condition_latent = torch.cat(condition_latent)
+
+                # Generate video frames
+                latents = generate_world_from_control(
+                    model=self.model,
+                    state_shape=self.model.state_shape,
+                    is_negative_prompt=True,
+                    data_batch=data_batch_i,
+                    guidance=self.guidance,
+                    num_steps=self.num_steps,
+                    seed=(self.seed + i_clip),
+                    condition_latent=condition_latent,
+                    num_input_frames=num_input_frames,
+                    sigma_max=self.sigma_max if x_sigma_max is not None else None,
+                    x_sigma_max=x_sigma_max,
+                    batch_cfg=self.batch_cfg,
+                    patch_batch_size=self.patch_batch_size,
+                )
+                video_float = self._decode_to_float(latents)
+                frames = (video_float * 255).to(torch.uint8)
+
+                new_frames = frames if i_clip == 0 else frames[:, :, self.num_input_frames :]
+                if new_frames.is_cuda:
+                    if self._copy_stream is None:
+                        self._copy_stream = torch.cuda.Stream()
+                    copy_stream = self._copy_stream
+                    copy_stream.wait_stream(torch.cuda.current_stream())
+                    with torch.cuda.stream(copy_stream):
+                        host_frames = torch.empty(new_frames.shape, dtype=new_frames.dtype, pin_memory=True)
+                        host_frames.copy_(new_frames, non_blocking=True)
+                    new_frames.record_stream(copy_stream)
+                    new_frames = host_frames
+                video.append(new_frames)
+                if self.float_condition:
+                    # Condition frames in [-1, 1] without uint8 quantization; -1 matches the black padding of the
+                    # uint8 path
+                    prev_frames = torch.full_like(video_float, -1)
+                    prev_frames[:, :, : self.num_input_frames] = video_float[:, :, -self.num_input_frames :] * 2 - 1
+                else:
+                    prev_frames = torch.zeros_like(frames)
+                    prev_frames[:, :, : self.num_input_frames] = frames[:, :, -self.num_input_frames :]
+        finally:
+            # Stop the prefetch thread before closing the readers it decodes from, also when a clip fails
+            clips.close()
+            clip_stream.close()
+            # Text K/V cached by the cross-attention layers are only valid for this prompt
+            clear_kv_cache(self.model.model)
+        if self._copy_stream is not None:
+            self._copy_stream.synchronize()
+        if self.control_cache is not None:
+            self.control_cache.log_stats()
+        if self.latent_cache is not None:
+            self.latent_cache.log_stats()
+
+        # The clip stream corrects the number of frames once decoding reaches the end of the videos
+        video = torch.cat(video, dim=2)[:, :, : clip_stream.num_frames]
         video = video[0].permute(1, 2, 3, 0).numpy()
         return video
 
@@ -21,15 +21,43 @@ from megatron.core import parallel_state
 from torch import Tensor
 
 from cosmos_transfer1.diffusion.conditioner import VideoConditionerWithCtrl
-from cosmos_transfer1.diffusion.inference.inference_utils import merge_patches_into_video, split_video_into_patches
+from cosmos_transfer1.diffusion.inference.inference_utils import get_patch_geometry
 from cosmos_transfer1.diffusion.model.model_t2w import DiffusionT2WModel, broadcast_condition
 from cosmos_transfer1.diffusion.model.model_v2w import DiffusionV2WModel
 from cosmos_transfer1.diffusion.module.parallel import broadcast, cat_outputs_cp, split_inputs_cp
 from cosmos_transfer1.utils import log, misc
+from cosmos_transfer1.utils.checkpoint import load_checkpoint
 from cosmos_transfer1.utils.lazy_config import instantiate as lazy_instantiate
 
 T = TypeVar("T")
 IS_PREPROCESSED_KEY = "is_preprocessed"
+# Condition fields that enter the network alongside `x` and so need one entry per sample when cond and uncond are
+# stacked along the batch dimension. The rest (latent hint, gt latent, control weight) is shared with batch size 1.
+CFG_BATCHED_CONDITION_KEYS = ("crossattn_emb", "crossattn_mask", "padding_mask", "fps", "condition_video_input_mask")
+
+
+def cat_condition_for_cfg(condition: T, uncondition: T) -> T:
+    """Stack condition and uncondition along the batch dimension for a single classifier-free guidance forward."""
+    condition_kwargs = condition.to_dict()
+    for key in CFG_BATCHED_CONDITION_KEYS:
+        if isinstance(condition_kwargs.get(key), torch.Tensor):
+            condition_kwargs[key] = torch.cat([condition_kwargs[key], getattr(uncondition, key)])
+    return type(condition)(**condition_kwargs)
+
+
+def repeat_condition_for_batch(condition: T, batch_size: int) -> T:
+    """Broadcast a condition of batch size 1 to `batch_size` samples that share it, e.g. stacked upscaler patches.
+
+    The fields are expanded without copying, so the cross-attention K/V of the shared text embedding are computed once.
+    """
+    if batch_size == 1:
+        return condition
+    condition_kwargs = condition.to_dict()
+    for key in CFG_BATCHED_CONDITION_KEYS:
+        value = condition_kwargs.get(key)
+        if isinstance(value, torch.Tensor):
+            condition_kwargs[key] = value.expand(batch_size, *value.shape[1:])
+    return type(condition)(**condition_kwargs)
 
 
 class VideoDiffusionModelWithCtrl(DiffusionV2WModel):
@@ -71,7 +99,7 @@ class VideoDiffusionModelWithCtrl(DiffusionV2WModel):
 
         if checkpoint_path:
             log.info(f"Loading base model checkpoint (local): {checkpoint_path}")
-            state_dict = torch.load(checkpoint_path, map_location=lambda storage, loc: storage, weights_only=False)
+            state_dict = load_checkpoint(checkpoint_path)
             log.success(f"Complete loading base model checkpoint (local): {checkpoint_path}")
 
             if "ema" in state_dict:
@@ -163,6 +191,88 @@ class VideoDiffusionModelWithCtrl(DiffusionV2WModel):
         latent = torch.cat(latent, dim=1)
         return latent
 
+    def denoise_cfg_batched(
+        self,
+        noise_x: Tensor,
+        sigma: Tensor,
+        condition: VideoConditionerWithCtrl,
+        condition_video_augment_sigma_in_inference: float = 0.001,
+        seed: int = 1,
+    ) -> Tuple[Tensor, Tensor]:
+        """Equivalent to `self.denoise` on the condition and on the uncondition, but with a single network forward.
+
+        `condition` is the output of `cat_condition_for_cfg`, with cond and uncond stacked along the batch dimension.
+        The condition-frame augmentation, the latent hint and the control weights are identical for both, so they are
+        computed once and broadcast over the stacked batch.
+
+        Returns:
+            Tuple[Tensor, Tensor]: `x0_pred_replaced` for the condition and for the uncondition.
+        """
+        return self.denoise_batched(
+            noise_x,
+            sigma,
+            condition,
+            num_branches=2,
+            condition_video_augment_sigma_in_inference=condition_video_augment_sigma_in_inference,
+            seed=seed,
+        )
+
+    def denoise_batched(
+        self,
+        noise_x: Tensor,
+        sigma: Tensor,
+        condition: VideoConditionerWithCtrl,
+        num_branches: int = 1,
+        condition_video_augment_sigma_in_inference: float = 0.001,
+        seed: int = 1,
+    ) -> Tuple[Tensor, ...]:
+        """Equivalent to `self.denoise` on every sample of `noise_x` and every condition branch, in one network forward.
+
+        Each sample gets the same condition-frame augmentation noise, as when the samples are denoised one at a time
+        with the same seed (e.g. the spatial patches of the upscaler).
+
+        Args:
+            noise_x (Tensor): Noisy samples [B, C, T, H, W]
+            sigma (Tensor): Noise level of each sample [B]
+            condition (VideoConditionerWithCtrl): `num_branches` conditions (e.g. cond and uncond) stacked along the
+                batch dimension. `gt_latent` holds one entry per sample and is shared by the branches.
+            num_branches (int): Number of conditions stacked in `condition`
+
+        Returns:
+            Tuple[Tensor, ...]: `x0_pred_replaced` [B, C, T, H, W] for each branch.
+        """
+        assert condition.gt_latent is not None, "call self.add_condition_video_indicator_and_video_input_mask first"
+        gt_latent = condition.gt_latent
+        condition, augment_latent = self.augment_conditional_latent_frames(
+            condition,
+            self.config.conditioner.video_cond_bool,
+            gt_latent,
+            condition_video_augment_sigma_in_inference,
+            sigma,
+            seed,
+            shared_noise=True,
+        )
+        condition_video_indicator = condition.condition_video_indicator  # [B, 1, T, 1, 1]
+
+        if parallel_state.get_context_parallel_world_size() > 1:
+            cp_group = parallel_state.get_context_parallel_group()
+            condition_video_indicator = split_inputs_cp(condition_video_indicator, seq_dim=2, cp_group=cp_group)
+            augment_latent = split_inputs_cp(augment_latent, seq_dim=2, cp_group=cp_group)
+            gt_latent = split_inputs_cp(gt_latent, seq_dim=2, cp_group=cp_group)
+
+        new_noise_xt = condition_video_indicator * augment_latent + (1 - condition_video_indicator) * noise_x
+        denoise_pred = DiffusionT2WModel.denoise(
+            self,
+            torch.cat([new_noise_xt] * num_branches),
+            torch.cat([sigma] * num_branches),
+            condition,
+        )
+        x0_pred_replaced = (
+            condition_video_indicator * torch.cat([gt_latent] * num_branches)
+            + (1 - condition_video_indicator) * denoise_pred.x0
+        )
+        return x0_pred_replaced.chunk(num_branches)
+
     def get_x0_fn_from_batch(
         self,
         data_batch: Dict,
@@ -176,6 +286,8 @@ class VideoDiffusionModelWithCtrl(DiffusionV2WModel):
         target_w: int = 160,
         patch_h: int = 88,
         patch_w: int = 160,
+        batch_cfg: bool = False,
+        patch_batch_size: int = 1,
     ) -> Callable:
         """
         Generates a callable function `x0_fn` based on the provided data batch and guidance factor.
@@ -193,6 +305,9 @@ class VideoDiffusionModelWithCtrl(DiffusionV2WModel):
         - target_w (int): final stitched latent width
         - patch_h (int): latent patch height for each network inference
         - patch_w (int): latent patch width for each network inference
+        - batch_cfg (bool): run condition and uncondition in a single network forward stacked along the batch dimension
+        - patch_batch_size (int): max number of spatial patches stacked along the batch dimension per network forward.
+            Halved automatically when a forward runs out of GPU memory
 
         Returns:
         - Callable: A function `x0_fn(noise_x, sigma)` that takes two arguments, `noise_x` and `sigma`, and return x0 predictoin
@@ -247,52 +362,84 @@ class VideoDiffusionModelWithCtrl(DiffusionV2WModel):
         setattr(uncondition, "base_model", self.model.base_model)
         if hasattr(self, "hint_encoders"):
             self.model.net.hint_encoders = self.hint_encoders
-
-        def x0_fn(noise_x: torch.Tensor, sigma: torch.Tensor):
-            w, h = target_w, target_h
-            n_img_w = (w - 1) // patch_w + 1
-            n_img_h = (h - 1) // patch_h + 1
-
-            overlap_size_w = overlap_size_h = 0
-            if n_img_w > 1:
-                overlap_size_w = (n_img_w * patch_w - w) // (n_img_w - 1)
-                assert n_img_w * patch_w - overlap_size_w * (n_img_w - 1) == w
-            if n_img_h > 1:
-                overlap_size_h = (n_img_h * patch_h - h) // (n_img_h - 1)
-                assert n_img_h * patch_h - overlap_size_h * (n_img_h - 1) == h
-
-            batch_images = noise_x
-            batch_sigma = sigma
-            output = []
-            for idx, cur_images in enumerate(batch_images):
-                noise_x = cur_images.unsqueeze(0)
-                sigma = batch_sigma[idx : idx + 1]
-                condition.gt_latent = condition_latent[idx : idx + 1]
-                uncondition.gt_latent = condition_latent[idx : idx + 1]
-                setattr(condition, hint_key, latent_hint[idx : idx + 1])
-                if getattr(uncondition, hint_key) is not None:
-                    setattr(uncondition, hint_key, latent_hint[idx : idx + 1])
-
-                cond_x0 = self.denoise(
+        # Built once so that the stacked text embedding stays the same tensor across steps (see Attention K/V cache).
+        cfg_condition = None
+        if batch_cfg and getattr(uncondition, hint_key) is not None:
+            cfg_condition = cat_condition_for_cfg(condition, uncondition)
+
+        # Patch index maps and blending weights are computed once instead of merging and splitting in every step
+        patch_geometry = get_patch_geometry(target_h, target_w, patch_h, patch_w, device=self.tensor_kwargs["device"])
+        batched_conditions = {}
+
+        def get_batched_conditions(batch_size: int):
+            """Conditions broadcast to `batch_size` patches, built once per size so their tensors stay the same."""
+            if batch_size not in batched_conditions:
+                cond = repeat_condition_for_batch(condition, batch_size)
+                uncond = repeat_condition_for_batch(uncondition, batch_size)
+                batched_conditions[batch_size] = (cond, uncond)
+            return batched_conditions[batch_size]
+
+        def denoise_patches(noise_x: torch.Tensor, sigma: torch.Tensor, start: int, end: int) -> torch.Tensor:
+            hint = latent_hint[start:end]
+            # Stacked patches run cond and uncond in separate forwards, since stacking both would materialize one
+            # copy of the text embedding (and its cross-attention K/V) per patch and branch
+            if cfg_condition is not None and end - start == 1:
+                cfg_condition.gt_latent = condition_latent[start:end]
+                setattr(cfg_condition, hint_key, hint)
+                cond_x0, uncond_x0 = self.denoise_batched(
+                    noise_x,
+                    sigma,
+                    cfg_condition,
+                    num_branches=2,
+                    condition_video_augment_sigma_in_inference=condition_video_augment_sigma_in_inference,
+                    seed=seed,
+                )
+            else:
+                cond, uncond = get_batched_conditions(end - start)
+                cond.gt_latent = uncond.gt_latent = condition_latent[start:end]
+                setattr(cond, hint_key, hint)
+                if getattr(uncond, hint_key) is not None:
+                    setattr(uncond, hint_key, hint)
+                (cond_x0,) = self.denoise_batched(
                     noise_x,
                     sigma,
-                    condition,
+                    cond,
                     condition_video_augment_sigma_in_inference=condition_video_augment_sigma_in_inference,
                     seed=seed,
-                ).x0_pred_replaced
-                uncond_x0 = self.denoise(
+                )
+                (uncond_x0,) = self.denoise_batched(
                     noise_x,
                     sigma,
-                    uncondition,
+                    uncond,
                     condition_video_augment_sigma_in_inference=condition_video_augment_sigma_in_inference,
                     seed=seed,
-                ).x0_pred_replaced
-                x0 = cond_x0 + guidance * (cond_x0 - uncond_x0)
-                output.append(x0)
-            output = rearrange(torch.stack(output), "(n t) b ... -> (b n t) ...", n=n_img_h, t=n_img_w)
-            final_output = merge_patches_into_video(output, overlap_size_h, overlap_size_w, n_img_h, n_img_w)
-            final_output = split_video_into_patches(final_output, patch_h, patch_w)
-            return final_output
+                )
+            return cond_x0 + guidance * (cond_x0 - uncond_x0)
+
+        max_patch_batch_size = max(patch_batch_size, 1)
+
+        def x0_fn(noise_x: torch.Tensor, sigma: torch.Tensor):
+            nonlocal max_patch_batch_size
+            num_samples = noise_x.shape[0]
+            output = []
+            start = 0
+            while start < num_samples:
+                end = min(start + max_patch_batch_size, num_samples)
+                try:
+                    output.append(denoise_patches(noise_x[start:end], sigma[start:end], start, end))
+                except torch.cuda.OutOfMemoryError:
+                    if end - start == 1:
+                        raise
+                    max_patch_batch_size = (end - start) // 2
+                    log.warning(
+                        f"Out of memory with {end - start} stacked patches, retrying with {max_patch_batch_size}"
+                    )
+                    torch.cuda.empty_cache()
+                    continue
+                start = end
+            # Samples are ordered patch-major as produced by the split, merging expects them batch-major
+            output = rearrange(torch.cat(output), "(n b) ... -> (b n) ...", n=patch_geometry.num_patches)
+            return patch_geometry.split(patch_geometry.merge(output))
 
         return x0_fn
 
@@ -314,6 +461,8 @@ class VideoDiffusionModelWithCtrl(DiffusionV2WModel):
         target_w: int = 160,
         patch_h: int = 88,
         patch_w: int = 160,
+        batch_cfg: bool = False,
+        patch_batch_size: int = 1,
     ) -> Tensor:
         """
         Generate samples from the batch. Based on given batch, it will automatically determine whether to generate image or video samples.
@@ -323,6 +472,8 @@ class VideoDiffusionModelWithCtrl(DiffusionV2WModel):
         Args:
             condition_latent (Optional[torch.Tensor]): latent tensor in shape B,C,T,H,W as condition to generate video.
             num_condition_t (Optional[int]): number of condition latent T, if None, will use the whole first half
+            batch_cfg (bool): run condition and uncondition in a single network forward per sampling step
+            patch_batch_size (int): max number of spatial patches stacked along the batch dimension per network forward
         """
         assert patch_h <= target_h and patch_w <= target_w
         if n_sample is None:
@@ -343,6 +494,8 @@ class VideoDiffusionModelWithCtrl(DiffusionV2WModel):
             target_w=target_w,
             patch_h=patch_h,
             patch_w=patch_w,
+            batch_cfg=batch_cfg,
+            patch_batch_size=patch_batch_size,
         )
 
         if sigma_max is None:
@@ -410,7 +563,7 @@ class VideoDiffusionT2VModelWithCtrl(DiffusionT2WModel):
             checkpoint_path = ""
         if checkpoint_path:
             log.info(f"Loading base model checkpoint (local): {checkpoint_path}")
-            state_dict = torch.load(checkpoint_path, map_location=lambda storage, loc: storage, weights_only=False)
+            state_dict = load_checkpoint(checkpoint_path)
             log.success(f"Complete loading base model checkpoint (local): {checkpoint_path}")
 
             if "ema" in state_dict:
@@ -510,6 +663,7 @@ class VideoDiffusionT2VModelWithCtrl(DiffusionT2WModel):
         condition_latent: torch.Tensor = None,
         num_condition_t: Union[int, None] = None,
         condition_video_augment_sigma_in_inference: float = None,
+        batch_cfg: bool = False,
     ) -> Callable:
         """
         Generates a callable function `x0_fn` based on the provided data batch and guidance factor.
@@ -523,6 +677,7 @@ class VideoDiffusionT2VModelWithCtrl(DiffusionT2WModel):
             condition_latent (torch.Tensor): latent tensor in shape B,C,T,H,W as condition to generate video.
         - num_condition_t (int): number of condition latent T, used in inference to decide the condition region and config.conditioner.video_cond_bool.condition_location == "first_n"
         - condition_video_augment_sigma_in_inference (float): sigma for condition video augmentation in inference
+        - batch_cfg (bool): run condition and uncondition in a single network forward stacked along the batch dimension
 
         Returns:
         - Callable: A function `x0_fn(noise_x, sigma)` that takes two arguments, `noise_x` and `sigma`, and return x0 predictoin
@@ -547,8 +702,18 @@ class VideoDiffusionT2VModelWithCtrl(DiffusionT2WModel):
         setattr(uncondition, "base_model", self.model.base_model)
         if hasattr(self, "hint_encoders"):
             self.model.net.hint_encoders = self.hint_encoders
+        cfg_condition = None
+        if batch_cfg and getattr(uncondition, hint_key) is not None:
+            cfg_condition = cat_condition_for_cfg(condition, uncondition)
 
         def x0_fn(noise_x: torch.Tensor, sigma: torch.Tensor) -> torch.Tensor:
+            if cfg_condition is not None:
+                cond_x0, uncond_x0 = self.denoise(
+                    torch.cat([noise_x, noise_x]),
+                    torch.cat([sigma, sigma]),
+                    cfg_condition,
+                ).x0.chunk(2)
+                return cond_x0 + guidance * (cond_x0 - uncond_x0)
             cond_x0 = self.denoise(
                 noise_x,
                 sigma,
@@ -577,6 +742,7 @@ class VideoDiffusionT2VModelWithCtrl(DiffusionT2WModel):
         condition_video_augment_sigma_in_inference: float = None,
         x_sigma_max: Optional[torch.Tensor] = None,
         sigma_max: float | None = None,
+        batch_cfg: bool = False,
         **kwargs,
     ) -> Tensor:
         """
@@ -587,6 +753,7 @@ class VideoDiffusionT2VModelWithCtrl(DiffusionT2WModel):
         Args:
             condition_latent (Optional[torch.Tensor]): latent tensor in shape B,C,T,H,W as condition to generate video.
             num_condition_t (Optional[int]): number of condition latent T, if None, will use the whole first half
+            batch_cfg (bool): run condition and uncondition in a single network forward per sampling step
         """
         if n_sample is None:
             input_key = self.input_data_key
@@ -602,6 +769,7 @@ class VideoDiffusionT2VModelWithCtrl(DiffusionT2WModel):
             condition_latent=condition_latent,
             num_condition_t=num_condition_t,
             condition_video_augment_sigma_in_inference=condition_video_augment_sigma_in_inference,
+            batch_cfg=batch_cfg,
         )
 
         if sigma_max is None:
@@ -49,6 +49,7 @@ class DiffusionV2WModel(DiffusionT2WModel):
         condition_video_augment_sigma_in_inference: float = 0.001,
         sigma: Tensor = None,
         seed: int = 1,
+        shared_noise: bool = False,
     ) -> Union[VideoExtendCondition, Tensor]:
         """Augments the conditional frames with noise during inference.
 
@@ -61,6 +62,8 @@ class DiffusionV2WModel(DiffusionT2WModel):
             condition_video_augment_sigma_in_inference (float): sigma for condition video augmentation in inference
             sigma (Tensor): noise level for the generation region
             seed (int): random seed for reproducibility
+            shared_noise (bool): draw the augmentation noise for one sample and broadcast it over the batch, which
+                matches augmenting the samples one at a time with the same seed
         Returns:
             VideoExtendCondition: updated condition object
                 condition_video_augment_sigma: sigma for the condition region, feed to the network
@@ -85,7 +88,7 @@ class DiffusionV2WModel(DiffusionT2WModel):
         # Now apply the augment_sigma to the gt_latent
 
         noise = misc.arch_invariant_rand(
-            gt_latent.shape,
+            (1,) + tuple(gt_latent.shape[1:]) if shared_noise else gt_latent.shape,
             torch.float32,
             self.tensor_kwargs["device"],
             seed,
@@ -23,6 +23,10 @@ from torch import nn
 from torch.utils.checkpoint import checkpoint
 from transformer_engine.pytorch.attention import DotProductAttention, apply_rotary_pos_emb
 
+# Number of distinct cross-attention contexts (e.g. prompt and negative prompt, each at up to two batch sizes when
+# upscaler patches are stacked along the batch) whose K/V are kept per layer.
+KV_CACHE_SIZE = 4
+
 # ---------------------- Feed Forward Network -----------------------
 
 
@@ -93,12 +97,15 @@ class GPT2FeedForward(FeedForward):
 
         x = self.layer1(x)
 
-        def activation_layer2_forward(x):
-            x = self.activation(x)
-            x = self.layer2(x)
-            return x
+        if self.training and torch.is_grad_enabled():
+            # Recompute the d_ff-wide activation in the backward pass instead of storing it
+            return checkpoint(self.activation_layer2_forward, x, use_reentrant=False)
+        # Nothing is stored for backward at inference, so checkpointing would only add overhead
+        return self.activation_layer2_forward(x)
 
-        x = checkpoint(activation_layer2_forward, x, use_reentrant=False)
+    def activation_layer2_forward(self, x: torch.Tensor) -> torch.Tensor:
+        x = self.activation(x)
+        x = self.layer2(x)
         return x
 
 
@@ -133,6 +140,13 @@ def get_normalization(name: str, channels: int):
         raise ValueError(f"Normalization {name} not found")
 
 
+def clear_kv_cache(module: nn.Module) -> None:
+    """Drop the cached cross-attention K/V of every `Attention` layer in `module`."""
+    for m in module.modules():
+        if isinstance(m, Attention):
+            m.clear_kv_cache()
+
+
 class BaseAttentionOp(nn.Module):
     def __init__(self):
         super().__init__()
@@ -236,6 +250,43 @@ class Attention(nn.Module):
         else:
             raise ValueError(f"Backend {backend} not found")
 
+        # Cross-attention K/V keyed on the context tensor. The context (T5 embedding) is constant over all sampling
+        # steps and clips, so its projections are computed once per generation. Only used when grad is disabled.
+        self.kv_cache_size = KV_CACHE_SIZE
+        self._kv_cache: dict[tuple, tuple[torch.Tensor, torch.Tensor, torch.Tensor]] = {}
+
+    def clear_kv_cache(self) -> None:
+        self._kv_cache = {}
+
+    def _project_kv(self, context: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+        k = self.to_k[0](context)
+        v = self.to_v[0](context)
+        k, v = map(
+            lambda t: rearrange(t, "b ... (n c) -> b ... n c", n=self.heads, c=self.dim_head),
+            (k, v),
+        )
+        return self.to_k[1](k), self.to_v[1](v)
+
+    def _get_cached_kv(self, context: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+        key = (context.data_ptr(), tuple(context.shape), context.stride(), context.dtype, context._version)
+        if key not in self._kv_cache:
+            if len(self._kv_cache) >= self.kv_cache_size:
+                self._kv_cache.pop(next(iter(self._kv_cache)))
+            # A context that is expanded over the batch (stride 0, e.g. one prompt shared by stacked patches) is
+            # projected only once per distinct entry.
+            base_context = context
+            for dim in range(context.ndim - 1):
+                if context.stride(dim) == 0 and context.shape[dim] > 1:
+                    base_context = base_context.narrow(dim, 0, 1)
+            # The context itself is kept alive with the entry so that its memory cannot be reused by another tensor
+            # with the same data_ptr while the entry exists.
+            self._kv_cache[key] = (context, *self._project_kv(base_context))
+        context, k, v = self._kv_cache[key]
+        if k.shape[: context.ndim - 1] != context.shape[:-1]:
+            shape = (*context.shape[:-1], *k.shape[context.ndim - 1 :])
+            k, v = k.expand(shape).contiguous(), v.expand(shape).contiguous()
+        return k, v
+
     def cal_qkv(
         self, x, context=None, mask=None, rope_emb=None, **kwargs
     ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
@@ -253,19 +304,15 @@ class Attention(nn.Module):
         """
         if self.qkv_norm_mode == "per_head":
             q = self.to_q[0](x)
-            context = x if context is None else context
-            k = self.to_k[0](context)
-            v = self.to_v[0](context)
-            q, k, v = map(
-                lambda t: rearrange(t, "b ... (n c) -> b ... n c", n=self.heads, c=self.dim_head),
-                (q, k, v),
-            )
+            q = rearrange(q, "b ... (n c) -> b ... n c", n=self.heads, c=self.dim_head)
         else:
             raise ValueError(f"Normalization mode {self.qkv_norm_mode} not found, only support 'per_head'")
 
         q = self.to_q[1](q)
-        k = self.to_k[1](k)
-        v = self.to_v[1](v)
+        if not self.is_selfattn and context is not None and not torch.is_grad_enabled():
+            k, v = self._get_cached_kv(context)
+        else:
+            k, v = self._project_kv(x if context is None else context)
         if self.is_selfattn and rope_emb is not None:  # only apply to self-attention!
             q = apply_rotary_pos_emb(q, rope_emb, tensor_format=self.qkv_format, fused=True)
             k = apply_rotary_pos_emb(k, rope_emb, tensor_format=self.qkv_format, fused=True)
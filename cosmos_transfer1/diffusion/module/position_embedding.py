@@ -13,6 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import OrderedDict
 from typing import Optional
 
 import torch
@@ -24,22 +25,57 @@ from cosmos_transfer1.diffusion.module.attention import normalize
 from cosmos_transfer1.diffusion.module.parallel import split_inputs_cp
 from cosmos_transfer1.diffusion.module.timm import trunc_normal_
 
+# Number of (shape, fps) entries whose embedding tables are kept per positional embedding module.
+POS_EMB_CACHE_SIZE = 8
+
 
 class VideoPositionEmb(nn.Module):
     def __init__(self):
         super().__init__()
         self.cp_group = None
+        self.cache_size = POS_EMB_CACHE_SIZE
+        self._cache: OrderedDict[tuple, tuple[Optional[torch.Tensor], torch.Tensor]] = OrderedDict()
 
     def enable_context_parallel(self, cp_group: ProcessGroup):
         self.cp_group = cp_group
+        self.clear_cache()
 
     def disable_context_parallel(self):
         self.cp_group = None
+        self.clear_cache()
+
+    def clear_cache(self) -> None:
+        self._cache.clear()
+
+    def _cache_key(self, B_T_H_W_C: torch.Size, fps: Optional[torch.Tensor]) -> tuple:
+        # fps is keyed on its storage like the cross-attention K/V cache; the tensor is kept alive with the entry.
+        fps_key = None if fps is None else (fps.data_ptr(), tuple(fps.shape), fps._version)
+        # Learnable embeddings change when weights are (re)loaded in place, which bumps the parameter versions.
+        param_versions = tuple(p._version for p in self.parameters())
+        return (tuple(B_T_H_W_C), fps_key, param_versions)
 
     def forward(self, x_B_T_H_W_C: torch.Tensor, fps=Optional[torch.Tensor]) -> torch.Tensor:
         """
         It delegates the embedding generation to generate_embeddings function.
+
+        At inference (grad disabled), the tables are cached per input shape and fps. With context parallelism each
+        rank caches only its own slice.
         """
+        if not isinstance(fps, torch.Tensor):
+            fps = None
+        if torch.is_grad_enabled():
+            return self._forward(x_B_T_H_W_C, fps=fps)
+
+        key = self._cache_key(x_B_T_H_W_C.shape, fps)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+        else:
+            if len(self._cache) >= self.cache_size:
+                self._cache.popitem(last=False)
+            self._cache[key] = (fps, self._forward(x_B_T_H_W_C, fps=fps))
+        return self._cache[key][1]
+
+    def _forward(self, x_B_T_H_W_C: torch.Tensor, fps: Optional[torch.Tensor] = None) -> torch.Tensor:
         B_T_H_W_C = x_B_T_H_W_C.shape
         if self.cp_group is not None:
             cp_ranks = get_process_group_ranks(self.cp_group)
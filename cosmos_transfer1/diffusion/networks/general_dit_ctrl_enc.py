@@ -24,6 +24,7 @@ from einops import rearrange
 
 # from megatron.core import parallel_state
 from torch import nn
+from torch.distributed import get_process_group_ranks
 from torchvision import transforms
 
 from cosmos_transfer1.diffusion.conditioner import DataType
@@ -32,6 +33,29 @@ from cosmos_transfer1.diffusion.module.parallel import split_inputs_cp
 from cosmos_transfer1.diffusion.networks.general_dit_video_conditioned import VideoExtendGeneralDIT as GeneralDIT
 
 
+def downsample_control_weight(weight_map: torch.Tensor, T: int, H: int, W: int) -> torch.Tensor:
+    """Downsample a pixel-space control weight map [..., 1, T_pix, H_pix, W_pix] to the token grid [..., 1, T, H, W].
+
+    The first frame maps to the first latent frame and every following group of 8 frames to one latent frame, matching
+    the temporal compression of the tokenizer. Maps already at (T, H, W) are returned as is.
+    """
+    if weight_map.shape[-3:] == (T, H, W):
+        return weight_map
+    assert weight_map.shape[-3] == 8 * (T - 1) + 1, f"Cannot map {weight_map.shape[-3]} frames to {T} latent frames"
+    leading_shape = weight_map.shape[:-4]
+    weight_map = weight_map.reshape(-1, *weight_map.shape[-4:])
+    B = weight_map.shape[0]
+    first_frame = torch.nn.functional.interpolate(
+        weight_map[:, :, :1], size=(1, H, W), mode="trilinear", align_corners=False
+    )
+    # Every group of 8 frames is resized independently, so fold the groups into the batch dimension.
+    next_frames = rearrange(weight_map[:, :, 1:], "b c (k t) h w -> (b k) c t h w", t=8)
+    next_frames = torch.nn.functional.interpolate(next_frames, size=(1, H, W), mode="trilinear", align_corners=False)
+    next_frames = rearrange(next_frames, "(b k) c t h w -> b c (k t) h w", b=B)
+    weight_map = torch.cat([first_frame, next_frames], dim=2)
+    return weight_map.reshape(*leading_shape, *weight_map.shape[1:])
+
+
 class GeneralDITEncoder(GeneralDIT):
     """
     ControlNet Encoder based on GeneralDIT. Heavily borrowed from GeneralDIT with minor modifications.
@@ -175,16 +199,21 @@ class GeneralDITEncoder(GeneralDIT):
                 condition_video_input_mask=condition_video_input_mask_input,
                 **kwargs,
             )
+        # With batched classifier-free guidance, cond and uncond share a hint of batch size 1. It is encoded once and
+        # broadcast over the stacked batch when added to x.
+        hint_padding_mask = padding_mask[:1] if padding_mask is not None else None
         if hasattr(self, "hint_encoders"):  # for multicontrol
             guided_hints = []
             for i in range(hint.shape[1]):
                 self.input_hint_block = self.hint_encoders[i].input_hint_block
                 self.pos_embedder = self.hint_encoders[i].pos_embedder
                 self.x_embedder2 = self.hint_encoders[i].x_embedder2
-                guided_hints += [self.encode_hint(hint[:, i], fps=fps, padding_mask=padding_mask, data_type=data_type)]
+                guided_hints += [
+                    self.encode_hint(hint[:, i], fps=fps, padding_mask=hint_padding_mask, data_type=data_type)
+                ]
         else:
-            guided_hints = self.encode_hint(hint, fps=fps, padding_mask=padding_mask, data_type=data_type)
-            guided_hints = torch.chunk(guided_hints, hint.shape[0] // x.shape[0], dim=3)
+            guided_hints = self.encode_hint(hint, fps=fps, padding_mask=hint_padding_mask, data_type=data_type)
+            guided_hints = torch.chunk(guided_hints, max(hint.shape[0] // x.shape[0], 1), dim=3)
             # Only support multi-control at inference time
             assert len(guided_hints) == 1 or not torch.is_grad_enabled()
 
@@ -256,6 +285,16 @@ class GeneralDITEncoder(GeneralDIT):
             x_B_T_H_W_D, rope_emb_L_1_1_D, extra_pos_emb_B_T_H_W_D_or_T_H_W_B_D = self.prepare_embedded_sequence(
                 x, fps=fps, padding_mask=padding_mask
             )
+            # Spatial-temporal weights [num_controls, B, 1, T, H, W] are brought to the token grid in THWB1 format
+            # once here instead of in every block.
+            weight_map = None
+            if not isinstance(control_weight[i], (float, int)) and control_weight[i].ndim >= 2:
+                _, T, H, W, _ = x_B_T_H_W_D.shape
+                cp_size = 1 if self.cp_group is None else len(get_process_group_ranks(self.cp_group))
+                weight_map = downsample_control_weight(control_weight[i], T * cp_size, H, W)  # [B, 1, T, H, W]
+                if cp_size > 1:
+                    weight_map = split_inputs_cp(weight_map, seq_dim=2, cp_group=self.cp_group)
+                weight_map = weight_map.permute(2, 3, 4, 0, 1)  # [T, H, W, B, 1]
             # logging affline scale information
             affline_scale_log_info = {}
 
@@ -297,37 +336,10 @@ class GeneralDITEncoder(GeneralDIT):
                     guided_hint = None
 
                 gate = control_gate_per_layer[idx]
-                if isinstance(control_weight[i], (float, int)) or control_weight[i].ndim < 2:
+                if weight_map is None:
                     hint_val = zero_blocks[name](x) * control_weight[i] * gate
-                else:  # Spatial-temporal weights [num_controls, B, 1, T, H, W]
-                    control_feat = zero_blocks[name](x)
-                    T, H, W, _, _ = control_feat.shape
-
-                    # Get current feature dimensions
-                    weight_map = control_weight[i]  # [B, 1, T, H, W]
-                    if weight_map.shape[2:5] != (T, H, W):
-                        assert weight_map.shape[2] == 8 * (T - 1) + 1
-                        weight_map_i = [
-                            torch.nn.functional.interpolate(
-                                weight_map[:, :, :1, :, :],
-                                size=(1, H, W),
-                                mode="trilinear",
-                                align_corners=False,
-                            )
-                        ]
-                        for wi in range(1, weight_map.shape[2], 8):
-                            weight_map_i += [
-                                torch.nn.functional.interpolate(
-                                    weight_map[:, :, wi : wi + 8],
-                                    size=(1, H, W),
-                                    mode="trilinear",
-                                    align_corners=False,
-                                )
-                            ]
-                        weight_map = torch.cat(weight_map_i, dim=2)
-                    # Reshape to match THWBD format
-                    weight_map = weight_map.permute(2, 3, 4, 0, 1)  # [T, H, W, B, 1]
-                    hint_val = control_feat * weight_map * gate
+                else:
+                    hint_val = zero_blocks[name](x) * weight_map * gate
                 if name not in outs:
                     outs[name] = hint_val
                 else:
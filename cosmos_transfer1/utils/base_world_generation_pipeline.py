@@ -22,8 +22,9 @@ import numpy as np
 import torch
 
 from cosmos_transfer1.auxiliary.guardrail.common import presets as guardrail_presets
+from cosmos_transfer1.auxiliary.guardrail.common.decision_cache import TextGuardrailCache
 from cosmos_transfer1.checkpoints import GUARDRAIL_CHECKPOINT_PATH, T5_MODEL_CHECKPOINT
-from cosmos_transfer1.utils.t5_text_encoder import CosmosT5TextEncoder
+from cosmos_transfer1.utils.t5_text_encoder import CosmosT5TextEncoder, TextEmbeddingCache
 
 
 class BaseWorldGenerationPipeline(ABC):
@@ -37,6 +38,10 @@ class BaseWorldGenerationPipeline(ABC):
         offload_tokenizer: bool = False,
         offload_text_encoder_model: bool = False,
         offload_guardrail_models: bool = False,
+        text_embedding_cache_dir: str | None = None,
+        stream_text_encoder: bool = False,
+        text_guardrail_cache_dir: str | None = None,
+        guardrail_frame_stride: int = 1,
     ):
         """Initialize base world generation pipeline.
 
@@ -55,6 +60,14 @@ class BaseWorldGenerationPipeline(ABC):
             offload_tokenizer: If True, moves tokenizer to CPU after use
             offload_text_encoder_model: If True, moves T5 encoder to CPU after encoding
             offload_guardrail_models: If True, moves safety models to CPU after checks
+            text_embedding_cache_dir: Directory of the on-disk cache of T5 prompt embeddings. With
+                offload_text_encoder_model, T5 is only loaded when a prompt misses the cache
+            stream_text_encoder: If True, T5 encoder blocks stay in pinned host memory and are streamed to the GPU
+                one block ahead of execution instead of loading the whole encoder onto the GPU
+            text_guardrail_cache_dir: Directory of the on-disk cache of text guardrail decisions. With
+                offload_guardrail_models, the text guardrail models are only loaded when a prompt misses the cache
+            guardrail_frame_stride: The video content safety filter classifies every guardrail_frame_stride-th
+                generated frame
         """
         self.inference_type = inference_type
         self.checkpoint_dir = checkpoint_dir
@@ -67,6 +80,19 @@ class BaseWorldGenerationPipeline(ABC):
         self.offload_tokenizer = offload_tokenizer
         self.offload_text_encoder_model = offload_text_encoder_model
         self.offload_guardrail_models = offload_guardrail_models
+        self.stream_text_encoder = stream_text_encoder
+        self.guardrail_frame_stride = guardrail_frame_stride
+
+        self.text_embedding_cache = (
+            TextEmbeddingCache(text_embedding_cache_dir, os.path.join(checkpoint_dir, T5_MODEL_CHECKPOINT))
+            if text_embedding_cache_dir
+            else None
+        )
+        self.text_guardrail_cache = (
+            TextGuardrailCache(text_guardrail_cache_dir, os.path.join(checkpoint_dir, self.guardrail_dir))
+            if text_guardrail_cache_dir
+            else None
+        )
 
         # Initialize model instances
         self.text_guardrail = None
@@ -119,7 +145,9 @@ class BaseWorldGenerationPipeline(ABC):
         Returns:
             Loaded T5 text encoder model instance
         """
-        self.text_encoder = CosmosT5TextEncoder(cache_dir=os.path.join(self.checkpoint_dir, T5_MODEL_CHECKPOINT))
+        self.text_encoder = CosmosT5TextEncoder(
+            cache_dir=os.path.join(self.checkpoint_dir, T5_MODEL_CHECKPOINT), stream_layers=self.stream_text_encoder
+        )
 
     def _load_text_guardrail(self):
         """Load text safety classifier models.
@@ -131,6 +159,12 @@ class BaseWorldGenerationPipeline(ABC):
             checkpoint_dir=os.path.join(self.checkpoint_dir, self.guardrail_dir)
         )
 
+    def _get_text_guardrail(self):
+        """Return the text guardrail runner, loading it if it was offloaded."""
+        if self.text_guardrail is None:
+            self._load_text_guardrail()
+        return self.text_guardrail
+
     def _load_video_guardrail(self):
         """Load video safety classifier models.
 
@@ -138,7 +172,8 @@ class BaseWorldGenerationPipeline(ABC):
         safety policies. Models are loaded from the specified guardrail directory.
         """
         self.video_guardrail = guardrail_presets.create_video_guardrail_runner(
-            checkpoint_dir=os.path.join(self.checkpoint_dir, self.guardrail_dir)
+            checkpoint_dir=os.path.join(self.checkpoint_dir, self.guardrail_dir),
+            safety_frame_stride=self.guardrail_frame_stride,
         )
 
     def _offload_network(self):
@@ -215,7 +250,8 @@ class BaseWorldGenerationPipeline(ABC):
     def _run_guardrail_on_prompt(self, prompt: str) -> bool:
         """Check if prompt meets safety requirements.
 
-        Validates the input prompt against safety policies using loaded guardrail models.
+        Validates the input prompt against safety policies using loaded guardrail models. Prompts found in the text
+        guardrail cache are not checked again.
 
         Args:
             prompt: Raw text prompt to validate
@@ -223,12 +259,18 @@ class BaseWorldGenerationPipeline(ABC):
         Returns:
             bool: True if prompt passes all safety checks, False otherwise
         """
-        return guardrail_presets.run_text_guardrail(prompt, self.text_guardrail)
+        is_safe = guardrail_presets.run_text_guardrail(
+            prompt, self.text_guardrail, self.text_guardrail_cache, load_guardrail_runner=self._get_text_guardrail
+        )
+        if self.text_guardrail_cache:
+            self.text_guardrail_cache.log_stats()
+        return is_safe
 
     def _run_guardrail_on_prompt_with_offload(self, prompt: str) -> bool:
         """Check prompt safety with memory management.
 
-        Validates prompt safety while handling model loading/offloading to manage memory.
+        Validates prompt safety while handling model loading/offloading to manage memory. With a text guardrail
+        cache, the guardrail models are only loaded if the prompt misses the cache.
 
         Args:
             prompt: Raw text prompt to validate
@@ -236,9 +278,7 @@ class BaseWorldGenerationPipeline(ABC):
         Returns:
             bool: True if prompt passes all safety checks, False otherwise
         """
-        if self.offload_guardrail_models:
-            self._load_text_guardrail()
-
+        # The text guardrail models are loaded on a cache miss by _run_guardrail_on_prompt
         is_safe = self._run_guardrail_on_prompt(prompt)
 
         if self.offload_guardrail_models:
@@ -285,7 +325,8 @@ class BaseWorldGenerationPipeline(ABC):
     ) -> tuple[list[torch.Tensor], list[torch.Tensor]]:
         """Convert text prompts to embeddings.
 
-        Processes text prompts into embedding tensors that condition the generation model.
+        Processes text prompts into embedding tensors that condition the generation model. Prompts found in the
+        text embedding cache are not encoded, and the T5 encoder is loaded on the first prompt that misses it.
 
         Args:
             prompts: List of text prompts to encode
@@ -297,16 +338,27 @@ class BaseWorldGenerationPipeline(ABC):
                 - List of attention masks for each embedding
         """
 
+        max_length = kwargs.get("max_length", 512)
         embeddings = []
         masks = []
         for prompt in prompts:
-            embedding, mask = self.text_encoder.encode_prompts(
-                [prompt],
-                **kwargs,
-            )
+            cached = self.text_embedding_cache.get(prompt, max_length) if self.text_embedding_cache else None
+            if cached is not None:
+                embedding, mask = cached
+            else:
+                if self.text_encoder is None:
+                    self._load_text_encoder_model()
+                embedding, mask = self.text_encoder.encode_prompts(
+                    [prompt],
+                    **kwargs,
+                )
+                if self.text_embedding_cache:
+                    self.text_embedding_cache.put(prompt, max_length, embedding, mask)
             embeddings.append(embedding)
             masks.append(mask)
 
+        if self.text_embedding_cache:
+            self.text_embedding_cache.log_stats()
         return embeddings, masks
 
     def _run_text_embedding_on_prompt_with_offload(
@@ -321,9 +373,10 @@ class BaseWorldGenerationPipeline(ABC):
             Text embedding tensor to condition diffusion model
 
         Note:
-            T5 model is offloaded after encoding if enabled.
+            T5 model is offloaded after encoding if enabled. With a text embedding cache it is only loaded if a
+            prompt misses the cache.
         """
-        if self.offload_text_encoder_model:
+        if self.offload_text_encoder_model and self.text_embedding_cache is None:
             self._load_text_encoder_model()
 
         embeddings, masks = self._run_text_embedding_on_prompt(prompts, **kwargs)
@@ -0,0 +1,108 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Checkpoint loading that avoids materializing multi-GB state dicts in host memory.
+
+`.safetensors` files are memory-mapped by safetensors, and `.pt` files are loaded with `torch.load(mmap=True)`, so
+tensor data is paged in from disk only when it is copied into the model parameters. A `.safetensors` file next to a
+requested `.pt` file (as written by `scripts/convert_checkpoint_to_safetensors.py`) is preferred, unless the `.pt`
+file was modified after it.
+"""
+
+import os
+import resource
+import time
+from typing import Dict
+
+import torch
+
+from cosmos_transfer1.utils import log
+
+SAFETENSORS_SUFFIX = ".safetensors"
+
+
+def get_peak_rss_gb() -> float:
+    """Peak resident set size of this process in GB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024**2  # ru_maxrss is in KB on Linux
+
+
+def safetensors_path(checkpoint_path: str) -> str:
+    """Path of the safetensors version of a `.pt` checkpoint."""
+    return os.path.splitext(checkpoint_path)[0] + SAFETENSORS_SUFFIX
+
+
+def load_checkpoint(checkpoint_path: str, device: str = "cpu") -> Dict:
+    """Load a checkpoint state dict with memory-mapped tensors.
+
+    Args:
+        checkpoint_path (str): Path to a `.pt` or `.safetensors` checkpoint. For a `.pt` path, an existing
+            `.safetensors` file with the same name is loaded instead, unless it is older than the `.pt` file.
+        device (str): Device the tensors are loaded to. With "cpu", tensors stay memory-mapped until they are
+            copied into the model.
+
+    Returns:
+        dict: The checkpoint. `.pt` files may contain nested dicts (e.g. "ema" or "model"), `.safetensors` files
+            always contain a flat state dict.
+    """
+    tic = time.time()
+    converted_path = safetensors_path(checkpoint_path)
+    if not checkpoint_path.endswith(SAFETENSORS_SUFFIX) and os.path.exists(converted_path):
+        if not os.path.exists(checkpoint_path) or os.path.getmtime(converted_path) >= os.path.getmtime(checkpoint_path):
+            log.info(f"Loading {converted_path} instead of {checkpoint_path}")
+            checkpoint_path = converted_path
+        else:
+            log.warning(
+                f"Ignoring {converted_path}, which is older than {checkpoint_path}. Convert the checkpoint again with "
+                "scripts/convert_checkpoint_to_safetensors.py --overwrite"
+            )
+
+    if checkpoint_path.endswith(SAFETENSORS_SUFFIX):
+        from safetensors.torch import load_file
+
+        state_dict = load_file(checkpoint_path, device=device)
+    else:
+        try:
+            state_dict = torch.load(checkpoint_path, map_location=device, mmap=True, weights_only=False)
+        except RuntimeError:  # legacy (non-zipfile) checkpoints cannot be memory-mapped
+            log.warning(f"Checkpoint {checkpoint_path} cannot be memory-mapped, loading it into memory")
+            state_dict = torch.load(checkpoint_path, map_location=device, weights_only=False)
+    log.info(f"Loaded checkpoint {checkpoint_path} in {time.time() - tic:.2f}s (peak RSS {get_peak_rss_gb():.2f} GB)")
+    return state_dict
+
+
+def save_checkpoint_safetensors(state_dict: Dict, checkpoint_path: str) -> None:
+    """Save a flat state dict as safetensors.
+
+    Non-tensor entries are skipped, and tensors that share storage with an earlier entry are copied, since
+    safetensors stores every tensor on its own.
+
+    Args:
+        state_dict (dict): Flat state dict to save
+        checkpoint_path (str): Output path, ending in `.safetensors`
+    """
+    from safetensors.torch import save_file
+
+    tensors = {}
+    storages = set()
+    for key, value in state_dict.items():
+        if not isinstance(value, torch.Tensor):
+            log.warning(f"Skipping non-tensor entry {key} of type {type(value)}")
+            continue
+        storage = value.untyped_storage().data_ptr()
+        if storage in storages:
+            value = value.clone()
+        storages.add(storage)
+        tensors[key] = value.contiguous()
+    save_file(tensors, checkpoint_path)
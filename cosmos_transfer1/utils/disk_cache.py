@@ -0,0 +1,151 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content-addressed on-disk LRU cache shared by the inference caches.
+
+Entries are keyed by a hash of the input file contents and every setting that affects the cached result, so reruns
+with the same inputs hit the cache while any change to the inputs or settings misses it. Subclasses define how
+entries are serialized. The least recently used entries are evicted once a cache grows beyond its size limit.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from cosmos_transfer1.utils import log
+
+HASH_CHUNK_SIZE = 1 << 24
+# Fraction of the size limit eviction brings a cache down to, so that the directory is not rescanned on every write
+EVICT_TARGET_RATIO = 0.9
+
+_file_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's contents, memoized per (path, size, mtime)."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_digests:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha.update(chunk)
+        _file_digests[memo_key] = sha.hexdigest()
+    return _file_digests[memo_key]
+
+
+class DiskCache:
+    """Content-addressed on-disk LRU cache with hit/miss statistics.
+
+    Args:
+        cache_dir (str): Directory that holds the cache entries. It can be shared between runs.
+        max_size_gb (float): Total size of the entries above which the least recently used ones are evicted.
+    """
+
+    name = "Disk"
+
+    def __init__(self, cache_dir: str, max_size_gb: float = 50.0):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_gb * 1024**3)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size_bytes = None  # running total of the entry sizes, None until the directory is first scanned
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def file_digest(path: str) -> str:
+        return file_digest(path)
+
+    @staticmethod
+    def make_key(**fields: Any) -> str:
+        """Hash the given fields into a cache key. Values must be JSON serializable or have a stable `repr`."""
+        return hashlib.sha256(json.dumps(fields, sort_keys=True, default=repr).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + suffix)
+
+    def _read(self, path: str, read: Callable[[str], Any]) -> Optional[Any]:
+        """Return `read(path)` and count a hit, or None and count a miss if the entry does not exist.
+
+        An entry that another process evicts between the lookup and the read is a miss as well, since the cache
+        directory can be shared between processes.
+        """
+        try:
+            os.utime(path)  # mark as recently used
+            value = read(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def _tmp_path(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _evict(self, new_path: Optional[str] = None) -> None:
+        """Add the entry just written at `new_path` to the running total and evict entries if it exceeds the limit.
+
+        The directory is only scanned when the running total is unknown or over the size limit. The least recently
+        used entries are then evicted down to `EVICT_TARGET_RATIO` of the limit. Entries written by other processes
+        sharing the directory are counted at the next scan.
+        """
+        with self._lock:
+            if self._size_bytes is not None and new_path is not None:
+                try:
+                    self._size_bytes += os.path.getsize(new_path)
+                except FileNotFoundError:  # evicted by another process
+                    pass
+            if self._size_bytes is not None and self._size_bytes <= self.max_size_bytes:
+                return
+            entries = []
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:  # evicted by another process
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total_size = sum(size for _, size, _ in entries)
+            if total_size > self.max_size_bytes:
+                target_size = int(self.max_size_bytes * EVICT_TARGET_RATIO)
+                for _, size, path in sorted(entries):
+                    if total_size <= target_size:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total_size -= size
+                    log.debug(f"Evicted {path} from the {self.name.lower()} cache")
+            self._size_bytes = total_size
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        log.info(
+            f"{self.name} cache: {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']:.1%})"
+        )
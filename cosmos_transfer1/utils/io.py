@@ -15,7 +15,7 @@
 
 import json
 from io import BytesIO
-from typing import Dict, List
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 import imageio
 import numpy as np
@@ -87,3 +87,108 @@ def load_from_fileobj(filepath: str, format: str = "mp4", mode: str = "rgb", **k
             video_frames.append(frame)
 
     return np.array(video_frames), video_reader.get_meta_data()
+
+
+class VideoFrameStream:
+    """Decode a video lazily and serve windows of frames without holding the whole video in memory.
+
+    Frames are decoded sequentially and only the frames of the most recently requested window are kept, so
+    overlapping windows (e.g. consecutive clips that share conditioning frames) are decoded once. Requesting a window
+    that starts before the kept frames re-opens the reader.
+
+    Args:
+        filepath (str): Path to the video file.
+        format (str): Format of the video file (default 'mp4').
+        max_frames (int): Maximum number of frames to expose (-1 for all frames).
+        transform (Callable, optional): Function applied to every batch of newly decoded frames [T,H,W,C] before
+            they are kept, e.g. resizing. Must return an array with the same number of frames.
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        format: str = "mp4",
+        max_frames: int = -1,
+        transform: Optional[Callable[[np.ndarray], np.ndarray]] = None,
+    ):
+        self.filepath = filepath
+        self.format = format
+        self.transform = transform
+        self._reader = None
+        self._open()
+
+        meta_data = self._reader.get_meta_data()
+        self.fps = meta_data.get("fps")
+        num_frames = self._reader.count_frames() if hasattr(self._reader, "count_frames") else len(self._reader)
+        self.num_frames = num_frames if max_frames == -1 else min(num_frames, max_frames)
+        if "size" in meta_data:
+            self.frame_size = tuple(meta_data["size"])  # (W, H) of the decoded frames
+        else:
+            frame = self._reader.get_data(0)
+            self.frame_size = (frame.shape[1], frame.shape[0])
+
+    def _open(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+        self._reader = imageio.get_reader(self.filepath, self.format)
+        self._iter = iter(self._reader)
+        self._next_index = 0  # index of the next frame the reader returns
+        self._frames: List[np.ndarray] = []  # kept frames, indices [self._frames_start, self._next_index)
+        self._frames_start = 0
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """Return frames [start, end) as an array [T,H,W,C].
+
+        Indices past the last frame repeat the last frame, so callers can pad the final window.
+        """
+        if end <= start:
+            raise ValueError(f"Empty frame window [{start}, {end})")
+        if self.num_frames == 0:
+            raise ValueError(f"No frames to read in {self.filepath}")
+        first = min(start, self.num_frames - 1)
+        last = min(end, self.num_frames) - 1
+        last = max(last, first)
+
+        if first < self._frames_start:
+            self._open()
+        num_dropped = min(first - self._frames_start, len(self._frames))
+        del self._frames[:num_dropped]
+        self._frames_start += num_dropped
+
+        new_frames = []
+        while self._next_index <= last:
+            try:
+                frame = next(self._iter)
+            except StopIteration:  # the container reported more frames than it holds
+                self.num_frames = self._next_index
+                last = min(last, self.num_frames - 1)
+                break
+            if self._next_index >= first:
+                new_frames.append(frame)
+            else:
+                self._frames_start = self._next_index + 1
+            self._next_index += 1
+        if new_frames:
+            new_frames = np.stack(new_frames)
+            if self.transform is not None:
+                new_frames = self.transform(new_frames)
+            self._frames.extend(new_frames)
+
+        return np.stack([self._frames[min(i, last) - self._frames_start] for i in range(start, end)])
+
+    def iter_windows(self, window: int, stride: int) -> Iterator[Tuple[int, np.ndarray]]:
+        """Yield (start, frames) for windows of `window` frames that start every `stride` frames."""
+        for start in range(0, max(self.num_frames - window + stride, 1), stride):
+            yield start, self.read(start, start + window)
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._frames = []
+
+    def __enter__(self) -> "VideoFrameStream":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
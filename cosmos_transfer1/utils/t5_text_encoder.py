@@ -13,37 +13,127 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import List, Tuple, Union
+import os
+from typing import Dict, List, Optional, Tuple, Union
 
 import torch
 import transformers
 from transformers import T5EncoderModel, T5TokenizerFast
 
 from cosmos_transfer1.utils import log
+from cosmos_transfer1.utils.disk_cache import DiskCache, file_digest
 
 transformers.logging.set_verbosity_error()
 
 
+class LayerStreamer:
+    """Streams the weights of a sequence of modules to the compute device one module ahead of execution.
+
+    The weights stay in (pinned) host memory. Before module i runs, its weights are swapped in and the copy of module
+    i + 1 is started on a side stream, so that it overlaps with the compute of module i. After module i has run, its
+    device copy is released. Only about two modules are resident on the device at any time, and the outputs are the
+    same as with the modules resident on the device since the same kernels run on the same weights.
+
+    Args:
+        modules (torch.nn.ModuleList): Modules that run in order, e.g. the blocks of a transformer.
+        device (str): Device the modules run on.
+    """
+
+    def __init__(self, modules: torch.nn.ModuleList, device: str):
+        self.modules = list(modules)
+        self.device = torch.device(device)
+        self.is_cuda = self.device.type == "cuda"
+        self.copy_stream = torch.cuda.Stream(self.device) if self.is_cuda else None
+        self.host_tensors: List[Dict[str, torch.Tensor]] = []
+        self.device_tensors: Dict[int, Dict[str, torch.Tensor]] = {}
+        self.copy_events: Dict[int, torch.cuda.Event] = {}
+        for i, module in enumerate(self.modules):
+            host = {}
+            for name, tensor in self._named_tensors(module):
+                tensor.data = tensor.data.cpu()
+                if self.is_cuda:
+                    tensor.data = tensor.data.pin_memory()
+                host[name] = tensor.data
+            self.host_tensors.append(host)
+            module.register_forward_pre_hook(self._make_pre_hook(i))
+            module.register_forward_hook(self._make_post_hook(i))
+
+    @staticmethod
+    def _named_tensors(module: torch.nn.Module):
+        yield from module.named_parameters()
+        yield from module.named_buffers()
+
+    def _prefetch(self, i: int) -> None:
+        if i >= len(self.modules) or i in self.device_tensors:
+            return
+        if self.is_cuda:
+            self.copy_stream.wait_stream(torch.cuda.current_stream(self.device))
+            with torch.cuda.stream(self.copy_stream):
+                self.device_tensors[i] = {
+                    name: tensor.to(self.device, non_blocking=True) for name, tensor in self.host_tensors[i].items()
+                }
+                self.copy_events[i] = torch.cuda.Event()
+                self.copy_events[i].record(self.copy_stream)
+        else:
+            self.device_tensors[i] = {name: tensor.to(self.device) for name, tensor in self.host_tensors[i].items()}
+
+    def _make_pre_hook(self, i: int):
+        def hook(module, args):
+            self._prefetch(i)
+            if self.is_cuda:
+                compute_stream = torch.cuda.current_stream(self.device)
+                compute_stream.wait_event(self.copy_events.pop(i))
+                for tensor in self.device_tensors[i].values():
+                    # Tensors allocated on the copy stream must not be reused before the compute stream is done
+                    tensor.record_stream(compute_stream)
+            for name, tensor in self._named_tensors(module):
+                tensor.data = self.device_tensors[i][name]
+            self._prefetch(i + 1)
+
+        return hook
+
+    def _make_post_hook(self, i: int):
+        def hook(module, args, output):
+            for name, tensor in self._named_tensors(module):
+                tensor.data = self.host_tensors[i][name]
+            del self.device_tensors[i]
+
+        return hook
+
+
 class CosmosT5TextEncoder(torch.nn.Module):
     """Handles T5 text encoding operations."""
 
-    def __init__(self, model_name: str = "google-t5/t5-11b", device: str = "cuda", cache_dir: str = "~/.cache"):
+    def __init__(
+        self,
+        model_name: str = "google-t5/t5-11b",
+        device: str = "cuda",
+        cache_dir: str = "~/.cache",
+        stream_layers: bool = False,
+    ):
         """Initializes the T5 tokenizer and encoder.
 
         Args:
             model_name: The name of the T5 model to use.
             device: The device to use for computations.
+            stream_layers: If True, the encoder blocks stay in pinned host memory and are streamed to the device one
+                block ahead of execution, so that only about two blocks occupy device memory.
         """
         super().__init__()
         try:
             self.tokenizer = T5TokenizerFast.from_pretrained(cache_dir, cache_dir=cache_dir)
-            self.text_encoder = T5EncoderModel.from_pretrained(cache_dir, cache_dir=cache_dir).to(device)
+            self.text_encoder = T5EncoderModel.from_pretrained(cache_dir, cache_dir=cache_dir)
         except Exception as e:
             log.warning(f"Failed to load T5 model using cache_dir '{cache_dir}', falling back to default location: {e}")
             self.tokenizer = T5TokenizerFast.from_pretrained(model_name)
-            self.text_encoder = T5EncoderModel.from_pretrained(model_name).to(device)
+            self.text_encoder = T5EncoderModel.from_pretrained(model_name)
         self.text_encoder.eval()
         self.device = device
+        self.layer_streamer = None
+        if stream_layers:
+            self.layer_streamer = stream_encoder_layers(self.text_encoder, device)
+        else:
+            self.text_encoder.to(device)
 
     @torch.inference_mode()
     def encode_prompts(
@@ -106,3 +196,70 @@ class CosmosT5TextEncoder(torch.nn.Module):
             encoded_text[batch_id][lengths[batch_id] :] = 0
 
         return encoded_text, attn_mask
+
+
+def stream_encoder_layers(text_encoder: T5EncoderModel, device: str) -> LayerStreamer:
+    """Move a T5 encoder to `device` except for its blocks, which are streamed from host memory by a LayerStreamer."""
+    blocks = text_encoder.encoder.block
+    text_encoder.encoder.block = torch.nn.ModuleList()
+    text_encoder.to(device)
+    text_encoder.encoder.block = blocks
+    return LayerStreamer(blocks, device)
+
+
+class TextEmbeddingCache(DiskCache):
+    """On-disk cache of T5 prompt embeddings and attention masks, keyed by prompt, encoder checkpoint and max_length.
+
+    Embeddings are stored in bfloat16, the precision the diffusion model consumes them in.
+
+    Args:
+        cache_dir (str): Directory that holds the cache entries. It can be shared between runs.
+        encoder_dir (str): Directory of the T5 checkpoint. Its config files and the names, sizes and modification
+            times of its weight files identify the encoder, hashing the weights themselves would take longer than
+            encoding.
+        max_size_gb (float): Total size of the entries above which the least recently used ones are evicted.
+    """
+
+    name = "Text embedding"
+
+    def __init__(self, cache_dir: str, encoder_dir: str, max_size_gb: float = 10.0):
+        super().__init__(cache_dir, max_size_gb=max_size_gb)
+        self.encoder_fingerprint = self._fingerprint(encoder_dir)
+
+    @staticmethod
+    def _fingerprint(encoder_dir: str) -> str:
+        fields = {"encoder_dir": os.path.normpath(encoder_dir)}
+        for root, _, files in os.walk(encoder_dir):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                rel_path = os.path.relpath(path, encoder_dir)
+                if name.endswith(".json"):
+                    fields[rel_path] = file_digest(path)
+                else:
+                    # The checkpoint is a plain directory, a re-downloaded or retrained file of the same size changes
+                    # only its modification time
+                    stat = os.stat(path)
+                    fields[rel_path] = (stat.st_size, stat.st_mtime_ns)
+        return DiskCache.make_key(**fields)
+
+    def _key(self, prompt: str, max_length: int) -> str:
+        return self.make_key(prompt=prompt, encoder=self.encoder_fingerprint, max_length=max_length)
+
+    def get(
+        self, prompt: str, max_length: int = 512, device: str = "cuda"
+    ) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+        """Return the cached (embedding, mask) of `prompt` on `device`, or None on a miss."""
+        path = self._path(self._key(prompt, max_length), ".pt")
+        # An entry evicted by another process while it is read is a miss, the caller then encodes the prompt
+        entry = self._read(path, lambda path: torch.load(path, map_location=device, weights_only=True))
+        if entry is None:
+            return None
+        return entry["embedding"], entry["mask"]
+
+    def put(self, prompt: str, max_length: int, embedding: torch.Tensor, mask: torch.Tensor) -> None:
+        """Store the embedding [1, max_length, C] and attention mask [1, max_length] of `prompt`."""
+        path = self._path(self._key(prompt, max_length), ".pt")
+        tmp_path = self._tmp_path(path)
+        torch.save({"embedding": embedding.detach().to("cpu", torch.bfloat16), "mask": mask.detach().cpu()}, tmp_path)
+        os.replace(tmp_path, path)
+        self._evict(path)
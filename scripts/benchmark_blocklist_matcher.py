@@ -0,0 +1,139 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Check and benchmark the indexed blocklist matcher against the per-phrase blocklist scan.
+
+`Blocklist` matches prompts against its exact match blocklist with `WholeWordBlocklistIndex`. This script builds a
+regression corpus of prompts of 50 to 500 words, containing blocklisted phrases verbatim, with one character edits,
+with changed case and spacing, or none at all, checks that the index returns the same decisions and messages as
+`Blocklist.check_against_whole_word_blocklist`, and reports the time per prompt of both.
+
+The exact match blocklist of `--checkpoint_dir` is used if it exists, otherwise a synthetic blocklist.
+
+Usage:
+
+    PYTHONPATH=$(pwd) python scripts/benchmark_blocklist_matcher.py --num_prompts 100
+
+"""
+
+import argparse
+import os
+import random
+import string
+import time
+
+from cosmos_transfer1.auxiliary.guardrail.blocklist.blocklist import DEFAULT_CHECKPOINT_DIR, Blocklist
+from cosmos_transfer1.auxiliary.guardrail.blocklist.matcher import WholeWordBlocklistIndex
+from cosmos_transfer1.auxiliary.guardrail.blocklist.utils import read_keyword_list_from_dir
+from cosmos_transfer1.utils import log
+
+PROMPT_LENGTHS = [50, 100, 200, 500]
+
+
+def random_word(rng: random.Random, min_len: int = 2, max_len: int = 10) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_len, max_len)))
+
+
+def load_blocklist(args, rng: random.Random) -> list[str]:
+    exact_match_dir = os.path.join(args.checkpoint_dir, "exact_match")
+    if os.path.isdir(exact_match_dir):
+        return read_keyword_list_from_dir(exact_match_dir)
+    log.warning(f"No blocklist found in {exact_match_dir}, using a synthetic blocklist")
+    return [" ".join(random_word(rng, 3, 12) for _ in range(rng.randint(1, 3))) for _ in range(args.blocklist_size)]
+
+
+def edit_phrase(rng: random.Random, phrase: str) -> str:
+    """Apply a one character substitution, deletion or insertion."""
+    if not phrase:
+        return phrase
+    chars = list(phrase)
+    i = rng.randrange(len(chars))
+    edit = rng.choice(["substitute", "delete", "insert"])
+    if edit == "substitute":
+        chars[i] = rng.choice(string.ascii_lowercase)
+    elif edit == "delete":
+        del chars[i]
+    else:
+        chars.insert(i, rng.choice(string.ascii_lowercase))
+    return "".join(chars)
+
+
+def make_prompt(rng: random.Random, blocklist: list[str], num_words: int) -> str:
+    words = [random_word(rng) for _ in range(num_words)]
+    kind = rng.choice(["clean", "verbatim", "edited", "variant"])
+    if kind != "clean" and blocklist:
+        phrase = rng.choice(blocklist)
+        if kind == "edited":
+            phrase = edit_phrase(rng, phrase)
+        elif kind == "variant":
+            phrase = rng.choice([phrase.upper(), phrase.replace(" ", "  "), f"{phrase},", f"({phrase})"])
+        words.insert(rng.randrange(len(words) + 1), phrase)
+    return rng.choice([" ", " ", "\n", ", "]).join(words)
+
+
+def timed(fn, prompts: list[str]) -> tuple[list[tuple[bool, str]], float]:
+    tic = time.perf_counter()
+    results = [fn(prompt) for prompt in prompts]
+    return results, (time.perf_counter() - tic) / len(prompts) * 1000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check and benchmark the indexed blocklist matcher")
+    parser.add_argument(
+        "--checkpoint_dir", type=str, default=DEFAULT_CHECKPOINT_DIR, help="Path to the Blocklist checkpoint folder"
+    )
+    parser.add_argument("--blocklist_size", type=int, default=1000, help="Number of phrases of a synthetic blocklist")
+    parser.add_argument("--num_prompts", type=int, default=50, help="Number of prompts per prompt length")
+    parser.add_argument("--partial_match_min_chars", type=int, default=6, help="Min phrase length for partial match")
+    parser.add_argument("--partial_match_letter_count", type=float, default=0.4, help="Partial match tolerance")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    return parser.parse_args()
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    blocklist = load_blocklist(args, rng)
+
+    tic = time.perf_counter()
+    index = WholeWordBlocklistIndex(blocklist, args.partial_match_min_chars, args.partial_match_letter_count)
+    log.info(f"Indexed {len(blocklist)} blocklist phrases in {(time.perf_counter() - tic) * 1000:.1f} ms")
+
+    def reference(prompt: str) -> tuple[bool, str]:
+        return Blocklist.check_against_whole_word_blocklist(
+            prompt, blocklist, args.partial_match_min_chars, args.partial_match_letter_count
+        )
+
+    num_mismatches = 0
+    for num_words in PROMPT_LENGTHS:
+        prompts = [make_prompt(rng, blocklist, num_words) for _ in range(args.num_prompts)]
+        expected, reference_ms = timed(reference, prompts)
+        actual, index_ms = timed(index.match, prompts)
+        mismatches = [prompt for prompt, a, e in zip(prompts, actual, expected) if a != e]
+        num_mismatches += len(mismatches)
+        log.info(
+            f"{num_words} words: {sum(blocked for blocked, _ in expected)}/{len(prompts)} blocked, "
+            f"{len(mismatches)} mismatches, {index_ms:.3f} ms vs {reference_ms:.3f} ms per prompt "
+            f"({reference_ms / index_ms:.1f}x)"
+        )
+        for prompt in mismatches[:3]:
+            log.warning(f"Mismatch on prompt: {prompt!r}")
+
+    if num_mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,87 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Micro-benchmark of the GPT2FeedForward inference path with and without activation checkpointing.
+
+At inference, `GPT2FeedForward` calls its layers directly. This script compares the per-block latency of that path
+with the previous behaviour of wrapping the activation and second layer in `torch.utils.checkpoint`, and checks
+that both produce the same output.
+
+Usage:
+
+    PYTHONPATH=$(pwd) python scripts/benchmark_gpt2_feedforward.py --d_model 512 --num_tokens 4096
+
+"""
+
+import argparse
+import time
+
+import torch
+from torch.utils.checkpoint import checkpoint
+
+from cosmos_transfer1.diffusion.module.attention import GPT2FeedForward
+from cosmos_transfer1.utils import log
+
+
+def checkpointed_forward(ffn: GPT2FeedForward, x: torch.Tensor) -> torch.Tensor:
+    x = ffn.layer1(x)
+    return checkpoint(ffn.activation_layer2_forward, x, use_reentrant=False)
+
+
+def benchmark(fn, x: torch.Tensor, num_warmup: int, num_iters: int) -> float:
+    """Average latency of `fn(x)` in ms."""
+    for _ in range(num_warmup):
+        fn(x)
+    if x.is_cuda:
+        torch.cuda.synchronize()
+    tic = time.perf_counter()
+    for _ in range(num_iters):
+        fn(x)
+    if x.is_cuda:
+        torch.cuda.synchronize()
+    return (time.perf_counter() - tic) / num_iters * 1000
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark GPT2FeedForward with and without checkpointing")
+    parser.add_argument("--d_model", type=int, default=512, help="Model dimension")
+    parser.add_argument("--mlp_ratio", type=float, default=4.0, help="Ratio of the hidden dimension to d_model")
+    parser.add_argument("--num_tokens", type=int, default=4096, help="Number of tokens per forward")
+    parser.add_argument("--num_warmup", type=int, default=5, help="Number of warmup iterations")
+    parser.add_argument("--num_iters", type=int, default=50, help="Number of timed iterations")
+    parser.add_argument("--device", type=str, default="cpu", help="Device to run on")
+    return parser.parse_args()
+
+
+@torch.no_grad()
+def main(args):
+    torch.manual_seed(0)
+    ffn = GPT2FeedForward(args.d_model, int(args.d_model * args.mlp_ratio), dropout=0.0).to(args.device).eval()
+    x = torch.randn(args.num_tokens, 1, args.d_model, device=args.device)
+
+    if not torch.equal(ffn(x), checkpointed_forward(ffn, x)):
+        log.warning("Outputs of the direct and checkpointed paths differ")
+    direct_ms = benchmark(ffn, x, args.num_warmup, args.num_iters)
+    checkpointed_ms = benchmark(lambda x: checkpointed_forward(ffn, x), x, args.num_warmup, args.num_iters)
+    log.info(
+        f"GPT2FeedForward d_model={args.d_model} tokens={args.num_tokens} on {args.device}: "
+        f"direct {direct_ms:.3f} ms, checkpointed {checkpointed_ms:.3f} ms "
+        f"({checkpointed_ms / direct_ms:.2f}x)"
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
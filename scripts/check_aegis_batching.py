@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Check and benchmark the batched Aegis moderation against per-prompt generation.
+
+`Aegis.filter_aegis_output_batch` scores left-padded batches of prompts in one forward and only generates the
+moderation output of prompts whose first output token is not "safe". This script compares its decisions and messages
+with generating the full moderation output of each prompt on its own, and reports the time per prompt of both.
+
+Usage:
+
+    PYTHONPATH=$(pwd) python scripts/check_aegis_batching.py --prompts_file prompts.txt
+
+"""
+
+import argparse
+import time
+
+from cosmos_transfer1.auxiliary.guardrail.aegis.aegis import DEFAULT_CHECKPOINT_DIR, Aegis
+from cosmos_transfer1.utils import log
+
+DEFAULT_PROMPTS = [
+    "A robot arm picks up a red cube from a table and places it in a box.",
+    "A car drives down a rainy city street at night, its headlights reflecting on the wet asphalt.",
+    "A drone flies over a forest at sunrise.",
+    "A person explains step by step how to build a bomb at home.",
+    "A crowd attacks and beats a man lying on the ground until he stops moving.",
+    "Two people chat in a cafe while it snows outside.",
+]
+
+
+def reference_filter(aegis: Aegis, prompt: str) -> tuple[bool, str]:
+    """Generate the full moderation output of one prompt, as before batching."""
+    moderation_output = aegis._generate([aegis.get_moderation_prompt(prompt)])[0]
+    if "unsafe" in moderation_output.lower():
+        return False, aegis.get_aegis_block_message(moderation_output)
+    return True, ""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check and benchmark the batched Aegis moderation")
+    parser.add_argument("--prompts_file", type=str, default=None, help="Text file with one prompt per line")
+    parser.add_argument("--batch_size", type=int, default=16, help="Maximum number of prompts per forward")
+    parser.add_argument(
+        "--checkpoint_dir", type=str, default=DEFAULT_CHECKPOINT_DIR, help="Path to the Aegis checkpoint folder"
+    )
+    return parser.parse_args()
+
+
+def main(args):
+    prompts = DEFAULT_PROMPTS
+    if args.prompts_file:
+        with open(args.prompts_file, "r") as f:
+            prompts = [line.strip() for line in f if line.strip()]
+    aegis = Aegis(checkpoint_dir=args.checkpoint_dir)
+    aegis.filter_aegis_output_batch(prompts[:1])  # warmup
+
+    tic = time.perf_counter()
+    expected = [reference_filter(aegis, prompt) for prompt in prompts]
+    reference_ms = (time.perf_counter() - tic) / len(prompts) * 1000
+    tic = time.perf_counter()
+    actual = aegis.filter_aegis_output_batch(prompts, batch_size=args.batch_size)
+    batched_ms = (time.perf_counter() - tic) / len(prompts) * 1000
+
+    mismatches = [(prompt, a, e) for prompt, a, e in zip(prompts, actual, expected) if a != e]
+    log.info(
+        f"{sum(not is_safe for is_safe, _ in expected)}/{len(prompts)} prompts unsafe, {len(mismatches)} mismatches, "
+        f"{batched_ms:.1f} ms vs {reference_ms:.1f} ms per prompt ({reference_ms / batched_ms:.1f}x)"
+    )
+    for prompt, a, e in mismatches:
+        log.warning(f"Mismatch on prompt {prompt!r}: batched {a}, per-prompt {e}")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,183 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Check the batched face blur postprocessing against the per-frame implementation on CPU.
+
+`RetinaFaceFilter` filters the detections of a batch of frames with `filter_detected_boxes_batch` and pixelates them
+with `pixelate_faces`. This script compares both on synthetic detections with the per-frame `filter_detected_boxes`
+(with both the torchvision and the `py_cpu_nms` NMS) and the per-box `pixelate_face`, and reports the time of both.
+
+Usage:
+
+    PYTHONPATH=$(pwd) python scripts/check_face_blur_batching.py
+
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from cosmos_transfer1.auxiliary.guardrail.face_blur_filter import retinaface_utils
+from cosmos_transfer1.auxiliary.guardrail.face_blur_filter.blur_utils import pixelate_face, pixelate_faces
+from cosmos_transfer1.auxiliary.guardrail.face_blur_filter.face_blur_filter import KEEP_TOP_K, NMS_THRESHOLD, TOP_K
+from cosmos_transfer1.auxiliary.guardrail.face_blur_filter.retinaface_utils import (
+    filter_detected_boxes,
+    filter_detected_boxes_batch,
+)
+from cosmos_transfer1.utils import log
+
+CONFIDENCE_THRESHOLD = 0.7
+
+
+def make_detections(args) -> tuple[torch.Tensor, torch.Tensor]:
+    """Boxes jittered around a few faces per frame, as RetinaFace predicts for neighboring priors."""
+    centers = torch.rand(args.num_frames, args.num_faces, 1, 2) * torch.tensor([args.width, args.height])
+    sizes = 20 + torch.rand(args.num_frames, args.num_faces, 1, 2) * 100
+    num_priors = args.num_priors // args.num_faces
+    centers = centers + torch.randn(args.num_frames, args.num_faces, num_priors, 2) * sizes * 0.1
+    sizes = sizes * (1 + torch.randn(args.num_frames, args.num_faces, num_priors, 2) * 0.1)
+    boxes = torch.cat((centers - sizes / 2, centers + sizes / 2), dim=-1).flatten(1, 2)
+    scores = torch.rand(boxes.shape[:2])
+    return boxes, scores
+
+
+def reference_filter(boxes: torch.Tensor, scores: torch.Tensor) -> list[np.ndarray]:
+    return [
+        filter_detected_boxes(
+            boxes[i].numpy(),
+            scores[i].numpy(),
+            confidence_threshold=CONFIDENCE_THRESHOLD,
+            nms_threshold=NMS_THRESHOLD,
+            top_k=TOP_K,
+            keep_top_k=KEEP_TOP_K,
+        )
+        for i in range(boxes.shape[0])
+    ]
+
+
+def batched_filter(boxes: torch.Tensor, scores: torch.Tensor) -> list[np.ndarray]:
+    frame_idx, kept_boxes = filter_detected_boxes_batch(
+        boxes,
+        scores,
+        confidence_threshold=CONFIDENCE_THRESHOLD,
+        nms_threshold=NMS_THRESHOLD,
+        top_k=TOP_K,
+        keep_top_k=KEEP_TOP_K,
+    )
+    return [kept_boxes[frame_idx == i].numpy() for i in range(boxes.shape[0])]
+
+
+def reference_pixelate(frames: np.ndarray, boxes: list[np.ndarray]) -> np.ndarray:
+    for frame, frame_boxes in zip(frames, boxes):
+        max_h, max_w = frame.shape[:2]
+        for x1, y1, x2, y2 in frame_boxes:
+            face_roi = frame[max(y1, 0) : min(y2, max_h), max(x1, 0) : min(x2, max_w)]
+            frame[max(y1, 0) : min(y2, max_h), max(x1, 0) : min(x2, max_w)] = pixelate_face(face_roi)
+    return frames
+
+
+def make_face_regions(args) -> list[np.ndarray]:
+    """Non-overlapping face regions of random size, one per cell of a grid, partly outside the frame at the borders."""
+    cell = 128
+    boxes = []
+    for _ in range(args.num_frames):
+        x1 = np.arange(-cell // 4, args.width, cell)
+        y1 = np.arange(-cell // 4, args.height, cell)
+        x1, y1 = [c.ravel() for c in np.meshgrid(x1, y1)]
+        w, h = np.random.randint(20, cell, size=(2, len(x1)))
+        boxes.append(np.stack((x1, y1, x1 + w, y1 + h), axis=1))
+    return boxes
+
+
+def timed(fn, *args, num_iters: int):
+    fn(*args)  # warmup
+    tic = time.perf_counter()
+    for _ in range(num_iters):
+        out = fn(*args)
+    return out, (time.perf_counter() - tic) / num_iters * 1000
+
+
+def check_filter(args, use_torchvision: bool) -> bool:
+    boxes, scores = make_detections(args)
+    nms = retinaface_utils.nms
+    if not use_torchvision:
+        retinaface_utils.nms = None
+    try:
+        actual, batched_ms = timed(batched_filter, boxes, scores, num_iters=args.num_iters)
+    finally:
+        retinaface_utils.nms = nms
+    expected, reference_ms = timed(reference_filter, boxes, scores, num_iters=args.num_iters)
+    is_equal = all(np.array_equal(a, e) for a, e in zip(actual, expected))
+    log.info(
+        f"NMS ({'torchvision' if use_torchvision else 'py_cpu_nms'}) of {args.num_frames} frames: "
+        f"{sum(len(e) for e in expected)} boxes kept, {'equal' if is_equal else 'DIFFERENT'} "
+        f"({batched_ms:.2f} ms vs {reference_ms:.2f} ms)"
+    )
+    return is_equal
+
+
+def check_pixelate(args) -> bool:
+    frames = np.random.randint(0, 256, size=(args.num_frames, args.height, args.width, 3), dtype=np.uint8)
+    boxes = make_face_regions(args)
+    frame_idx = torch.cat([torch.full((len(b),), i) for i, b in enumerate(boxes)])
+    boxes_tensor = torch.from_numpy(np.concatenate(boxes))
+
+    expected, reference_ms = timed(lambda: reference_pixelate(frames.copy(), boxes), num_iters=args.num_iters)
+    actual, batched_ms = timed(
+        lambda: pixelate_faces(torch.from_numpy(frames.copy()), frame_idx, boxes_tensor).numpy(),
+        num_iters=args.num_iters,
+    )
+    diff = np.abs(actual.astype(np.int32) - expected.astype(np.int32))
+    is_close = diff.max() <= args.max_pixel_diff
+    log.info(
+        f"Pixelation of {len(boxes_tensor)} faces: max abs diff {diff.max()}, {(diff > 0).mean() * 100:.3f}% of "
+        f"pixels differ ({batched_ms:.2f} ms vs {reference_ms:.2f} ms)"
+    )
+    return is_close
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check the batched face blur postprocessing on CPU")
+    parser.add_argument("--num_frames", type=int, default=8, help="Number of frames")
+    parser.add_argument("--height", type=int, default=704, help="Frame height")
+    parser.add_argument("--width", type=int, default=1280, help="Frame width")
+    parser.add_argument("--num_faces", type=int, default=8, help="Number of faces per frame")
+    parser.add_argument("--num_priors", type=int, default=8000, help="Number of detections per frame")
+    parser.add_argument(
+        "--max_pixel_diff",
+        type=int,
+        default=1,
+        help="Max allowed difference of a pixel value to cv2, which resizes uint8 images in fixed point",
+    )
+    parser.add_argument("--num_iters", type=int, default=3, help="Number of timed iterations")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    return parser.parse_args()
+
+
+def main(args):
+    torch.manual_seed(args.seed)
+    np.random.seed(args.seed)
+    results = [check_filter(args, use_torchvision=False), check_pixelate(args)]
+    if retinaface_utils.nms is not None:
+        results.append(check_filter(args, use_torchvision=True))
+    if not all(results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
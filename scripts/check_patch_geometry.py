@@ -0,0 +1,134 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Check the gather/scatter-add patch split and merge against the original loop implementations.
+
+`split_video_into_patches` and `merge_patches_into_video` use a cached `PatchGeometry`. This script compares them on
+CPU with the slicing / double-loop implementations they replaced, for the upscaler latent and pixel layouts, and
+reports the time of both.
+
+Usage:
+
+    PYTHONPATH=$(pwd) python scripts/check_patch_geometry.py
+
+"""
+
+import argparse
+import time
+
+import torch
+from einops import rearrange
+
+from cosmos_transfer1.diffusion.inference.inference_utils import merge_patches_into_video, split_video_into_patches
+from cosmos_transfer1.utils import log
+
+# (H, W, patch_h, patch_w) of single-patch, tiled and overlapping latent layouts, and of overlapping pixel patches
+LAYOUTS = [(88, 160, 88, 160), (264, 480, 88, 160), (200, 300, 88, 160), (1056, 1920, 704, 1280)]
+
+
+def reference_split(tensor, patch_h, patch_w):
+    h, w = tensor.shape[-2:]
+    n_img_w = (w - 1) // patch_w + 1
+    n_img_h = (h - 1) // patch_h + 1
+    overlap_size_h = overlap_size_w = 0
+    if n_img_w > 1:
+        overlap_size_w = (n_img_w * patch_w - w) // (n_img_w - 1)
+    if n_img_h > 1:
+        overlap_size_h = (n_img_h * patch_h - h) // (n_img_h - 1)
+    p_h = patch_h - overlap_size_h
+    p_w = patch_w - overlap_size_w
+
+    patches = []
+    for i in range(n_img_h):
+        for j in range(n_img_w):
+            patches += [tensor[:, :, :, p_h * i : (p_h * i + patch_h), p_w * j : (p_w * j + patch_w)]]
+    return torch.cat(patches), overlap_size_h, overlap_size_w, n_img_h, n_img_w
+
+
+def reference_merge(imgs, overlap_size_h, overlap_size_w, n_img_h, n_img_w):
+    b, c, t, h, w = imgs.shape
+    imgs = rearrange(imgs, "(b m n) c t h w -> m n b c t h w", m=n_img_h, n=n_img_w)
+    H = n_img_h * h - (n_img_h - 1) * overlap_size_h
+    W = n_img_w * w - (n_img_w - 1) * overlap_size_w
+    img_sum = torch.zeros((b // (n_img_h * n_img_w), c, t, H, W)).to(imgs)
+    mask_sum = torch.zeros((H, W)).to(imgs)
+
+    y, x = torch.meshgrid(
+        torch.minimum(torch.arange(h), h - torch.arange(h)) / (overlap_size_h + 1e-6),
+        torch.minimum(torch.arange(w), w - torch.arange(w)) / (overlap_size_w + 1e-6),
+        indexing="ij",
+    )
+    mask_ij = (torch.clamp(y, 0.01, 1) * torch.clamp(x, 0.01, 1)).to(imgs)
+
+    for i in range(n_img_h):
+        for j in range(n_img_w):
+            h_start = i * (h - overlap_size_h)
+            w_start = j * (w - overlap_size_w)
+            img_sum[:, :, :, h_start : h_start + h, w_start : w_start + w] += imgs[i, j] * mask_ij[None, None, None]
+            mask_sum[h_start : h_start + h, w_start : w_start + w] += mask_ij
+    return img_sum / (mask_sum[None, None, None, :, :] + 1e-6)
+
+
+def timed(fn, *args, num_iters: int):
+    fn(*args)  # warmup, builds the cached geometry
+    tic = time.perf_counter()
+    for _ in range(num_iters):
+        out = fn(*args)
+    return out, (time.perf_counter() - tic) / num_iters * 1000
+
+
+def check_layout(H: int, W: int, patch_h: int, patch_w: int, args) -> bool:
+    video = torch.randn(args.batch_size, args.channels, args.frames, H, W)
+    expected_patches, overlap_size_h, overlap_size_w, n_img_h, n_img_w = reference_split(video, patch_h, patch_w)
+    patches, split_ms = timed(split_video_into_patches, video, patch_h, patch_w, num_iters=args.num_iters)
+    split_ok = torch.equal(patches, expected_patches)
+
+    # Merging expects the patches batch-major
+    patches = rearrange(patches, "(n b) ... -> (b n) ...", b=args.batch_size)
+    merge_args = (patches, overlap_size_h, overlap_size_w, n_img_h, n_img_w)
+    expected = reference_merge(*merge_args)
+    merged, merge_ms = timed(merge_patches_into_video, *merge_args, num_iters=args.num_iters)
+    max_diff = (merged - expected).abs().max().item()
+    merge_ok = torch.allclose(merged, expected, rtol=1e-5, atol=1e-5)
+
+    _, reference_split_ms = timed(reference_split, video, patch_h, patch_w, num_iters=args.num_iters)
+    _, reference_merge_ms = timed(reference_merge, *merge_args, num_iters=args.num_iters)
+    log.info(
+        f"{H}x{W} in {n_img_h}x{n_img_w} patches of {patch_h}x{patch_w}: "
+        f"split {'equal' if split_ok else 'DIFFERENT'} ({split_ms:.2f} ms vs {reference_split_ms:.2f} ms), "
+        f"merge max abs diff {max_diff:.2e} ({merge_ms:.2f} ms vs {reference_merge_ms:.2f} ms)"
+    )
+    return split_ok and merge_ok
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check PatchGeometry split/merge against the loop implementations")
+    parser.add_argument("--batch_size", type=int, default=2, help="Batch size of the video")
+    parser.add_argument("--channels", type=int, default=3, help="Number of channels")
+    parser.add_argument("--frames", type=int, default=2, help="Number of frames")
+    parser.add_argument("--num_iters", type=int, default=3, help="Number of timed iterations")
+    return parser.parse_args()
+
+
+def main(args):
+    torch.manual_seed(0)
+    results = [check_layout(*layout, args) for layout in LAYOUTS]
+    if not all(results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
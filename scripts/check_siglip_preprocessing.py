@@ -0,0 +1,124 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Check the torch SigLIP preprocessing of the video content safety filter against the SigLIP image processor.
+
+`VideoContentSafetyFilter` encodes batches of frames with `SigLIPEncoder.encode_frames`, which resizes them with an
+antialiased bicubic `F.interpolate` instead of PIL. This script encodes sampled frames of the given videos both with
+`encode_frames` and with the image processor path of `encode_image`, and reports the largest embedding difference,
+the lowest cosine similarity and the frames whose safety class changes.
+
+Usage:
+
+    PYTHONPATH=$(pwd) python scripts/check_siglip_preprocessing.py --input_dir assets
+
+"""
+
+import argparse
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from cosmos_transfer1.auxiliary.guardrail.common.io_utils import get_video_filepaths, read_video
+from cosmos_transfer1.auxiliary.guardrail.video_content_safety_filter.video_content_safety_filter import (
+    CLASS_IDX_TO_NAME,
+    DEFAULT_CHECKPOINT_DIR,
+    VideoContentSafetyFilter,
+)
+from cosmos_transfer1.utils import log
+
+
+def classify(video_filter: VideoContentSafetyFilter, image_embs: torch.Tensor) -> list[str]:
+    predicted_classes = video_filter.model.network(image_embs).argmax(dim=-1).tolist()
+    return [CLASS_IDX_TO_NAME.get(predicted_class, "Safe") for predicted_class in predicted_classes]
+
+
+@torch.inference_mode()
+def check_video(video_filter: VideoContentSafetyFilter, filepath: str, args) -> tuple[float, float, int, int]:
+    """Return the max abs embedding difference, min cosine similarity, number of frames and of changed classes."""
+    frames = read_video(filepath).frames[:: args.frame_stride][: args.max_frames]
+    encoder = video_filter.encoder
+
+    tic = time.perf_counter()
+    expected = torch.cat([encoder.encode_image(Image.fromarray(frame)) for frame in frames])
+    reference_ms = (time.perf_counter() - tic) / len(frames) * 1000
+    tic = time.perf_counter()
+    frames_tensor = torch.from_numpy(np.ascontiguousarray(frames)).to(encoder.device)
+    actual = torch.cat(
+        [encoder.encode_frames(frames_tensor[i : i + args.batch_size]) for i in range(0, len(frames), args.batch_size)]
+    )
+    batched_ms = (time.perf_counter() - tic) / len(frames) * 1000
+
+    max_diff = (actual - expected).abs().max().item()
+    min_cosine = torch.nn.functional.cosine_similarity(actual, expected, dim=-1).min().item()
+    changed = [
+        (i * args.frame_stride, e, a)
+        for i, (e, a) in enumerate(zip(classify(video_filter, expected), classify(video_filter, actual)))
+        if e != a
+    ]
+    log.info(
+        f"{filepath}: {len(frames)} frames, max abs embedding diff {max_diff:.2e}, min cosine similarity "
+        f"{min_cosine:.6f}, {len(changed)} changed classes ({batched_ms:.2f} ms vs {reference_ms:.2f} ms per frame)"
+    )
+    for frame_number, expected_class, actual_class in changed:
+        log.warning(f"Frame {frame_number}: {actual_class} with encode_frames, {expected_class} with the processor")
+    return max_diff, min_cosine, len(frames), len(changed)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check the torch SigLIP preprocessing against the image processor")
+    parser.add_argument("--input_dir", type=str, required=True, help="Path containing input videos")
+    parser.add_argument(
+        "--checkpoint_dir",
+        type=str,
+        default=DEFAULT_CHECKPOINT_DIR,
+        help="Path to the Video Content Safety Filter checkpoint folder",
+    )
+    parser.add_argument("--frame_stride", type=int, default=12, help="Check every frame_stride-th frame")
+    parser.add_argument("--max_frames", type=int, default=64, help="Maximum number of frames checked per video")
+    parser.add_argument("--batch_size", type=int, default=16, help="Number of frames encoded per forward")
+    parser.add_argument(
+        "--min_cosine_similarity",
+        type=float,
+        default=0.99,
+        help="Lowest allowed cosine similarity of the embeddings of a frame",
+    )
+    return parser.parse_args()
+
+
+def main(args):
+    filepaths = get_video_filepaths(args.input_dir)
+    if not filepaths:
+        raise ValueError(f"No video files found in directory: {args.input_dir}")
+    video_filter = VideoContentSafetyFilter(checkpoint_dir=args.checkpoint_dir, batch_size=args.batch_size)
+
+    results = [check_video(video_filter, filepath, args) for filepath in filepaths]
+    max_diff = max(result[0] for result in results)
+    min_cosine = min(result[1] for result in results)
+    num_frames = sum(result[2] for result in results)
+    num_changed = sum(result[3] for result in results)
+    log.info(
+        f"{num_frames} frames of {len(filepaths)} videos: max abs embedding diff {max_diff:.2e}, min cosine "
+        f"similarity {min_cosine:.6f}, {num_changed} changed classes"
+    )
+    if num_changed or min_cosine < args.min_cosine_similarity:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
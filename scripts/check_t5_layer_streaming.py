@@ -0,0 +1,77 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Check that the layer-streamed T5 encoder matches the resident encoder bit for bit.
+
+A randomly initialized T5 encoder with a tiny config is run once with all weights on the device and once with its
+blocks streamed by `stream_encoder_layers`. Runs on CPU, and additionally on the GPU if one is available.
+
+Usage:
+
+    PYTHONPATH=$(pwd) python scripts/check_t5_layer_streaming.py
+
+"""
+
+import argparse
+import copy
+
+import torch
+from transformers import T5Config, T5EncoderModel
+
+from cosmos_transfer1.utils import log
+from cosmos_transfer1.utils.t5_text_encoder import stream_encoder_layers
+
+
+@torch.inference_mode()
+def check_device(device: str, args) -> bool:
+    torch.manual_seed(args.seed)
+    config = T5Config(
+        vocab_size=128, d_model=64, d_kv=16, d_ff=128, num_layers=args.num_layers, num_heads=4, dropout_rate=0.0
+    )
+    resident = T5EncoderModel(config).eval()
+    streamed = copy.deepcopy(resident)
+    resident.to(device)
+    stream_encoder_layers(streamed, device)
+
+    input_ids = torch.randint(0, config.vocab_size, (args.batch_size, args.seq_len), device=device)
+    attn_mask = torch.ones_like(input_ids)
+    attn_mask[:, args.seq_len // 2 :] = 0
+    expected = resident(input_ids=input_ids, attention_mask=attn_mask).last_hidden_state
+    actual = streamed(input_ids=input_ids, attention_mask=attn_mask).last_hidden_state
+
+    is_equal = torch.equal(expected, actual)
+    log.info(f"{device}: outputs {'are' if is_equal else 'are NOT'} bit-identical")
+    return is_equal
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check the layer-streamed T5 encoder against the resident encoder")
+    parser.add_argument("--num_layers", type=int, default=4, help="Number of encoder blocks")
+    parser.add_argument("--batch_size", type=int, default=2, help="Number of prompts")
+    parser.add_argument("--seq_len", type=int, default=16, help="Number of tokens per prompt")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    return parser.parse_args()
+
+
+def main(args):
+    devices = ["cpu"] + (["cuda"] if torch.cuda.is_available() else [])
+    results = [check_device(device, args) for device in devices]
+    if not all(results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)
@@ -0,0 +1,120 @@
+# SPDX-FileCopyrightText: Copyright (c) 2025 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+""" Convert `.pt` model checkpoints to safetensors.
+
+The converted file is written next to the original with a `.safetensors` suffix, and the inference loaders pick it up
+automatically instead of the `.pt` file. Safetensors files are memory-mapped on load, so startup neither unpickles nor
+copies the whole checkpoint in host memory.
+
+Checkpoints that hold an "ema" or "model" state dict are flattened to the weights the base model loader would use
+(EMA weights first). Entries that are dropped on the way, other top-level keys and non-tensor values, are logged.
+
+With `--checkpoint_dir`, only the diffusion and ControlNet checkpoints in `cosmos_transfer1.checkpoints`, which are
+loaded by `load_checkpoint`, are converted. Guardrail and other auxiliary `.pt` files are left alone.
+
+Usage:
+
+    PYTHONPATH=$(pwd) python scripts/convert_checkpoint_to_safetensors.py --checkpoint_dir checkpoints/nvidia/Cosmos-Transfer1-7B
+
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import torch
+
+from cosmos_transfer1 import checkpoints
+from cosmos_transfer1.utils import log
+from cosmos_transfer1.utils.checkpoint import get_peak_rss_gb, safetensors_path, save_checkpoint_safetensors
+
+
+# Checkpoints served by `load_checkpoint`, relative to the checkpoints directory
+MODEL_CHECKPOINT_PATHS = sorted(
+    value
+    for name, value in vars(checkpoints).items()
+    if name.endswith("_CHECKPOINT_PATH") and isinstance(value, str) and value.endswith(".pt")
+)
+
+
+def flatten_state_dict(state_dict: dict, checkpoint_path: str) -> dict:
+    """Return the flat model state dict of a checkpoint, as selected by `load_base_model`."""
+    for key in ("ema", "model"):
+        if key in state_dict:
+            dropped = sorted(str(k) for k in state_dict if k != key)
+            if dropped:
+                log.warning(f"Converting only the {key} weights of {checkpoint_path}, dropping {dropped}")
+            flat = state_dict[key]
+            return {k.replace("-", "."): v for k, v in flat.items()} if key == "ema" else flat
+    return state_dict
+
+
+def find_model_checkpoints(checkpoint_dir: str) -> list[str]:
+    """Paths of the diffusion and ControlNet checkpoints under `checkpoint_dir`."""
+    paths = glob.glob(os.path.join(checkpoint_dir, "**", "*.pt"), recursive=True)
+    return sorted(
+        path
+        for path in paths
+        if any(os.path.normpath(path).endswith(os.path.normpath(rel_path)) for rel_path in MODEL_CHECKPOINT_PATHS)
+    )
+
+
+def convert_checkpoint(checkpoint_path: str, overwrite: bool = False) -> None:
+    output_path = safetensors_path(checkpoint_path)
+    if os.path.exists(output_path) and not overwrite:
+        log.warning(f"{output_path} EXISTS, skipping conversion...")
+        return
+    tic = time.time()
+    state_dict = torch.load(checkpoint_path, map_location="cpu", mmap=True, weights_only=False)
+    if not isinstance(state_dict, dict):
+        log.warning(f"{checkpoint_path} is not a state dict, skipping conversion...")
+        return
+    state_dict = flatten_state_dict(state_dict, checkpoint_path)
+    non_tensor_keys = [key for key, value in state_dict.items() if not isinstance(value, torch.Tensor)]
+    if non_tensor_keys:
+        log.warning(f"{checkpoint_path} has {len(non_tensor_keys)} non-tensor entries, which safetensors cannot store")
+    save_checkpoint_safetensors(state_dict, output_path)
+    log.info(f"Converted {checkpoint_path} to {output_path} in {time.time() - tic:.2f}s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert .pt model checkpoints to safetensors")
+    parser.add_argument("checkpoints", nargs="*", help="Paths of .pt checkpoints to convert")
+    parser.add_argument(
+        "--checkpoint_dir",
+        type=str,
+        default=None,
+        help="Convert the diffusion and ControlNet checkpoints under this directory",
+    )
+    parser.add_argument("--overwrite", action="store_true", help="Overwrite existing .safetensors files")
+    return parser.parse_args()
+
+
+def main(args):
+    checkpoint_paths = list(args.checkpoints)
+    if args.checkpoint_dir:
+        checkpoint_paths += find_model_checkpoints(args.checkpoint_dir)
+    if not checkpoint_paths:
+        raise ValueError("No checkpoints given. Pass checkpoint paths or --checkpoint_dir.")
+    for checkpoint_path in checkpoint_paths:
+        convert_checkpoint(checkpoint_path, overwrite=args.overwrite)
+    log.info(f"Peak RSS {get_peak_rss_gb():.2f} GB")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args)